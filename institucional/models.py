@@ -1,5 +1,5 @@
 from django.db import models
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
 from django.dispatch import receiver
 from library.models import Livro
 from django.contrib.auth.models import User
@@ -147,6 +147,13 @@ class EstatisticasBiblioteca(models.Model):
 
 @receiver(post_save, sender=Livro)
 def atualizar_estatisticas_livros(sender, instance, **kwargs):
+    recalcular_total_livros()
+
+def recalcular_total_livros():
+    """
+        recalcula o total de livros nas estatísticas. Também usada por
+        cargas em lote (bulk_create), que não disparam post_save.
+    """
     estatisticas, created = EstatisticasBiblioteca.objects.get_or_create(id=1)
     total_livros = Livro.objects.count()
     estatisticas.atualizar_estatisticas(
@@ -158,6 +165,13 @@ def atualizar_estatisticas_livros(sender, instance, **kwargs):
 
 @receiver(post_save, sender=User)
 def atualizar_estatisticas_usuarios(sender, instance, **kwargs):
+    recalcular_total_usuarios()
+
+def recalcular_total_usuarios():
+    """
+        recalcula o total de usuários nas estatísticas. Também usada pelo
+        provisionamento em lote, que não dispara post_save.
+    """
     estatisticas, created = EstatisticasBiblioteca.objects.get_or_create(id=1)
     total_usuarios = User.objects.count()
     estatisticas.atualizar_estatisticas(
@@ -177,3 +191,53 @@ def atualizar_estatisticas_categorias(sender, instance, **kwargs):
         categorias=total_categorias,
         usuarios=estatisticas.total_usuarios
     )
+
+
+# Campos de imagem com contagem de referências dos blobs (library.midia).
+CAMPOS_MIDIA = {
+    SobreNos: ('banner',),
+    NossaHistoria: ('imagem',),
+    MembrosEquipe: ('foto',),
+    NossosValores: ('imagem',),
+}
+
+
+@receiver(post_init, sender=SobreNos)
+@receiver(post_init, sender=NossaHistoria)
+@receiver(post_init, sender=MembrosEquipe)
+@receiver(post_init, sender=NossosValores)
+def registrar_midia_carregada(sender, instance, **kwargs):
+    from library.midia import registrar_midia_carregada
+    registrar_midia_carregada(instance, CAMPOS_MIDIA[sender])
+
+
+@receiver(pre_save, sender=SobreNos)
+@receiver(pre_save, sender=NossaHistoria)
+@receiver(pre_save, sender=MembrosEquipe)
+@receiver(pre_save, sender=NossosValores)
+def guardar_midia_anterior(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    from library.midia import guardar_midia_anterior
+    guardar_midia_anterior(sender, instance, CAMPOS_MIDIA[sender], update_fields)
+
+
+@receiver(post_save, sender=SobreNos)
+@receiver(post_save, sender=NossaHistoria)
+@receiver(post_save, sender=MembrosEquipe)
+@receiver(post_save, sender=NossosValores)
+def contar_referencias_midia(sender, instance, raw=False, **kwargs):
+    """Atualiza a contagem de referências dos blobs da imagem nova e da anterior."""
+    if raw:
+        return
+    from library.midia import atualizar_referencias
+    atualizar_referencias(instance, CAMPOS_MIDIA[sender])
+
+
+@receiver(post_delete, sender=SobreNos)
+@receiver(post_delete, sender=NossaHistoria)
+@receiver(post_delete, sender=MembrosEquipe)
+@receiver(post_delete, sender=NossosValores)
+def liberar_midia(sender, instance, **kwargs):
+    from library.midia import liberar_referencias
+    liberar_referencias(instance, CAMPOS_MIDIA[sender])
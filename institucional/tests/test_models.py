@@ -58,7 +58,7 @@ class NossaHistoriaModelTest(TestCase):
     def test_criacao_nossa_historia(self):
         """Testa a criação de uma instância de NossaHistoria"""
         self.assertEqual(self.historia.descricao, "Nossa história começa em 2020...")
-        self.assertTrue(self.historia.imagem.name.startswith('historia/'))
+        self.assertTrue(self.historia.imagem.name.startswith('blobs/'))
     
     def test_verbose_names(self):
         """Testa os nomes verbose do modelo"""
@@ -80,7 +80,7 @@ class MembrosEquipeModelTest(TestCase):
         """Testa a criação de um membro da equipe"""
         self.assertEqual(self.membro.nome, "João Silva")
         self.assertEqual(self.membro.cargo, "Desenvolvedor")
-        self.assertTrue(self.membro.foto.name.startswith('equipe/'))
+        self.assertTrue(self.membro.foto.name.startswith('blobs/'))
     
     def test_criacao_membro_sem_foto(self):
         """Testa a criação de um membro da equipe sem foto"""
@@ -124,7 +124,7 @@ class NossosValoresModelTest(TestCase):
         """Testa a criação de um valor"""
         self.assertEqual(self.valor.valor, "Inovação")
         self.assertEqual(self.valor.descricao, "Valorizamos a inovação constante")
-        self.assertTrue(self.valor.imagem.name.startswith('valores/'))
+        self.assertTrue(self.valor.imagem.name.startswith('blobs/'))
     
     def test_criacao_valor_sem_imagem_descricao(self):
         """Testa a criação de um valor sem imagem e descrição"""
@@ -239,7 +239,7 @@ class SobreNosModelTest(TestCase):
     def test_criacao_sobre_nos(self):
         """Testa a criação de uma instância de SobreNos"""
         self.assertEqual(self.sobre_nos.descricao, "Descrição sobre nós")
-        self.assertTrue(self.sobre_nos.banner.name.startswith('banners/'))
+        self.assertTrue(self.sobre_nos.banner.name.startswith('blobs/'))
         self.assertEqual(self.sobre_nos.nossa_historia, self.historia)
         self.assertEqual(self.sobre_nos.estatisticas_biblioteca, self.estatisticas)
     
@@ -0,0 +1,102 @@
+"""
+Feed de alterações do catálogo (``/livros/changes/?since=<token>``).
+
+A sequência de alterações é o par ``(atualizado_em, id)``: livros criados ou
+editados vêm da própria tabela de livros (índice em ``atualizado_em, id``) e
+livros excluídos, dos tombstones de ``LivroRemovido`` (índice em
+``removido_em, livro_id``). As duas sequências são percorridas por keyset e
+intercaladas; o token de continuação é a posição do último item entregue.
+
+Alterações mais recentes que ``LIVROS_CHANGES_MARGEM_SEGUNDOS`` ficam para a
+próxima página: ``atualizado_em`` é definido no ``save``, antes do commit, e
+uma transação ainda aberta poderia gravar uma posição anterior à já entregue.
+Tokens mais antigos que a retenção dos tombstones
+(``LIVROS_CHANGES_RETENCAO_DIAS``) exigem uma sincronização completa.
+"""
+import base64
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Livro, LivroRemovido
+
+EPOCA = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSSEGUNDO = timedelta(microseconds=1)
+INICIO = (EPOCA, 0)
+
+
+class TokenInvalido(ValueError):
+    pass
+
+
+def codificar_token(posicao):
+    momento, livro_id = posicao
+    bruto = f'{(momento - EPOCA) // MICROSSEGUNDO}.{livro_id}'
+    return base64.urlsafe_b64encode(bruto.encode('ascii')).decode('ascii').rstrip('=')
+
+
+def decodificar_token(token):
+    """Posição ``(momento, livro_id)`` do token; vazio ou ausente é o início."""
+    if not token:
+        return INICIO
+    try:
+        bruto = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode('ascii')
+        micros, livro_id = (int(parte) for parte in bruto.split('.'))
+        return EPOCA + micros * MICROSSEGUNDO, livro_id
+    except (ValueError, UnicodeDecodeError, OverflowError):
+        raise TokenInvalido(token)
+
+
+def _apos(campo_momento, campo_id, posicao):
+    # O >= isolado permite ao banco percorrer o índice a partir da posição.
+    momento, livro_id = posicao
+    return Q(**{f'{campo_momento}__gte': momento}) & (
+        Q(**{f'{campo_momento}__gt': momento}) | Q(**{f'{campo_id}__gt': livro_id})
+    )
+
+
+def token_expirado(posicao):
+    """Indica se tombstones posteriores à posição já podem ter sido purgados."""
+    retencao = timedelta(days=settings.LIVROS_CHANGES_RETENCAO_DIAS)
+    return posicao != INICIO and posicao[0] < timezone.now() - retencao
+
+
+def alteracoes(posicao, limite, queryset=None):
+    """
+        Até ``limite`` alterações após ``posicao``, em ordem de sequência.
+        Retorna ``(itens, proxima_posicao, mais)``, com itens
+        ``('alterado', livro)`` ou ``('removido', livro_id)``.
+    """
+    queryset = Livro.objects.all() if queryset is None else queryset
+    corte = timezone.now() - timedelta(seconds=settings.LIVROS_CHANGES_MARGEM_SEGUNDOS)
+
+    livros = list(
+        queryset.filter(_apos('atualizado_em', 'id', posicao), atualizado_em__lte=corte)
+        .order_by('atualizado_em', 'id')[:limite + 1]
+    )
+    # Partindo do início, o cliente ainda não tem livros: não há o que remover.
+    removidos = [] if posicao == INICIO else list(
+        LivroRemovido.objects
+        .filter(_apos('removido_em', 'livro_id', posicao), removido_em__lte=corte)
+        .order_by('removido_em', 'livro_id')
+        .values_list('removido_em', 'livro_id')[:limite + 1]
+    )
+
+    sequencia = sorted(
+        [((livro.atualizado_em, livro.id), 'alterado', livro) for livro in livros]
+        + [((momento, livro_id), 'removido', livro_id) for momento, livro_id in removidos],
+        key=lambda item: item[0],
+    )
+    mais = len(sequencia) > limite
+    sequencia = sequencia[:limite]
+    proxima = sequencia[-1][0] if sequencia else posicao
+    return [(tipo, valor) for _, tipo, valor in sequencia], proxima, mais
+
+
+def purgar_tombstones():
+    """Remove os tombstones mais antigos que a retenção."""
+    limite = timezone.now() - timedelta(days=settings.LIVROS_CHANGES_RETENCAO_DIAS)
+    removidos, _ = LivroRemovido.objects.filter(removido_em__lt=limite).delete()
+    return removidos
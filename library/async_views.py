@@ -0,0 +1,58 @@
+from theka.async_views import (
+    caminho_rapido,
+    list_assincrono,
+    resposta_json,
+    retrieve_assincrono,
+    view_assincrona,
+)
+from .autocomplete import indice_atual, limite_sugestoes
+from .models import Livro
+from .serializers import LivroSerializer
+from .views import LivroViewSet
+
+# O serializer lê genero.nome e editora.nome; o select_related evita
+# queries adicionais, que não são permitidas fora do ORM assíncrono.
+livros_queryset = Livro.objects.select_related('genero', 'editora')
+
+livros_list = list_assincrono(LivroViewSet, livros_queryset)
+livros_retrieve = retrieve_assincrono(LivroViewSet, livros_queryset)
+
+
+@view_assincrona(LivroViewSet, 'novidades')
+async def livros_novidades(request):
+    """
+        Retorna os livros mais recentes.
+    """
+    if not caminho_rapido(request):
+        return None
+    ultimos_livros = [livro async for livro in livros_queryset.order_by('-criado_em')[:5]]
+    serializer = LivroSerializer(ultimos_livros, many=True, context={'request': request})
+    return resposta_json(serializer.data)
+
+
+@view_assincrona(LivroViewSet, 'destaque_mes')
+async def livros_destaque_mes(request):
+    """
+        Retorna um livro em destaque do mês.
+    """
+    if not caminho_rapido(request):
+        return None
+    livro_destaque = await livros_queryset.order_by('-criado_em').afirst()
+    if livro_destaque is None:
+        return None
+    serializer = LivroSerializer(livro_destaque, context={'request': request})
+    return resposta_json(serializer.data)
+
+
+@view_assincrona(LivroViewSet, 'autocomplete')
+async def livros_autocomplete(request):
+    """
+        Sugestões de título e autor do índice em memória. Se o índice do
+        processo precisar ser (re)montado, delega à view síncrona.
+    """
+    if not caminho_rapido(request, ('q', 'limite')):
+        return None
+    indice = indice_atual()
+    if indice is None:
+        return None
+    return resposta_json(indice.buscar(request.GET.get('q', ''), limite_sugestoes(request.GET.get('limite'))))
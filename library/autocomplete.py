@@ -0,0 +1,277 @@
+"""
+Sugestões de título e autor para a caixa de busca (``/livros/autocomplete/``).
+
+O índice fica em memória: uma lista ordenada de chaves sem acento, uma por
+início de palavra de cada título e de cada autor distinto ("o senhor dos
+aneis", "senhor dos aneis", "dos aneis", "aneis"). A busca por prefixo é um
+``bisect`` seguido de uma varredura curta, sem tocar no banco.
+
+O índice é montado na subida do servidor (``aquecer``, chamado pelo wsgi/asgi)
+ou no primeiro uso, e os sinais de ``Livro`` o atualizam no próprio processo.
+Os demais processos percebem a mudança por um contador de geração no cache e,
+na próxima consulta, aplicam os livros alterados e removidos desde a última
+verificação (consultas pelos índices de ``atualizado_em`` e dos tombstones),
+sem reconstruir o índice. Como o contador não chega a outros processos com um
+cache local (LocMem) e pode ser expulso, cada processo também faz essa
+verificação a cada ``LIVROS_AUTOCOMPLETE_VERIFICAR_SEGUNDOS``.
+"""
+import bisect
+import logging
+import re
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.utils import timezone
+
+from theka.metrics import registrar_acesso_cache
+from .models import Livro, LivroRemovido
+from .similaridade import dobrar_acentos
+
+logger = logging.getLogger(__name__)
+
+CHAVE_GERACAO = 'livros-autocomplete:geracao'
+TITULO = 'titulo'
+AUTOR = 'autor'
+# Sufixos indexados por texto: palavras além disso não iniciam sugestões.
+MAX_PALAVRAS = 8
+# Entradas examinadas por consulta, antes da ordenação final.
+FATOR_VARREDURA = 8
+_PALAVRA_RE = re.compile(r'\w+')
+
+
+def normalizar(texto):
+    """Palavras sem acento e em minúsculas, separadas por um espaço."""
+    return ' '.join(_PALAVRA_RE.findall(dobrar_acentos(texto or '')))
+
+
+def chaves(texto):
+    """``[(chave, posicao)]`` com o texto a partir de cada início de palavra."""
+    palavras = normalizar(texto).split(' ')
+    return [(' '.join(palavras[i:]), i) for i in range(min(len(palavras), MAX_PALAVRAS)) if palavras[i]]
+
+
+class IndicePrefixos:
+    """
+        Entradas ``(chave, posicao, tipo, texto, livro_id)`` ordenadas.
+        Autores aparecem uma vez por nome, com a contagem de livros em
+        ``autores``; títulos, uma vez por livro.
+
+        As alterações montam uma nova lista e trocam a referência, então as
+        consultas concorrentes nunca veem a lista pela metade.
+    """
+
+    def __init__(self, livros=()):
+        self.livros = {}
+        self.autores = {}
+        entradas = []
+        for livro_id, titulo, autor in livros:
+            entradas.extend(self._registrar(livro_id, titulo, autor))
+        entradas.sort()
+        self.entradas = entradas
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.livros)
+
+    def _registrar(self, livro_id, titulo, autor):
+        self.livros[livro_id] = (titulo, autor)
+        novas = [(chave, posicao, TITULO, titulo, livro_id) for chave, posicao in chaves(titulo)]
+        if autor:
+            self.autores[autor] = self.autores.get(autor, 0) + 1
+            if self.autores[autor] == 1:
+                novas.extend((chave, posicao, AUTOR, autor, None) for chave, posicao in chaves(autor))
+        return novas
+
+    def _desregistrar(self, livro_id):
+        titulo, autor = self.livros.pop(livro_id)
+        antigas = [(chave, posicao, TITULO, titulo, livro_id) for chave, posicao in chaves(titulo)]
+        if autor:
+            self.autores[autor] -= 1
+            if not self.autores[autor]:
+                del self.autores[autor]
+                antigas.extend((chave, posicao, AUTOR, autor, None) for chave, posicao in chaves(autor))
+        return antigas
+
+    def atualizar(self, livro_id, titulo, autor):
+        with self._lock:
+            if self.livros.get(livro_id) == (titulo, autor):
+                return
+            antigas = self._desregistrar(livro_id) if livro_id in self.livros else []
+            novas = self._registrar(livro_id, titulo, autor)
+            self._trocar(antigas, novas)
+
+    def remover(self, livro_id):
+        with self._lock:
+            if livro_id in self.livros:
+                self._trocar(self._desregistrar(livro_id), [])
+
+    def _trocar(self, antigas, novas):
+        entradas = list(self.entradas)
+        for entrada in antigas:
+            i = bisect.bisect_left(entradas, entrada)
+            if i < len(entradas) and entradas[i] == entrada:
+                del entradas[i]
+        for entrada in novas:
+            bisect.insort(entradas, entrada)
+        self.entradas = entradas
+
+    def buscar(self, termo, limite):
+        """
+            Até ``limite`` sugestões para o prefixo ``termo``. Textos que
+            começam pelo termo vêm antes dos que só têm uma palavra começando
+            por ele; dentro de cada grupo, em ordem alfabética.
+        """
+        prefixo = normalizar(termo)
+        if not prefixo:
+            return []
+        entradas = self.entradas
+        inicio = bisect.bisect_left(entradas, (prefixo,))
+        candidatos = {}
+        for entrada in entradas[inicio:inicio + limite * FATOR_VARREDURA]:
+            chave, posicao, tipo, texto, livro_id = entrada
+            if not chave.startswith(prefixo):
+                break
+            identificador = (tipo, livro_id if tipo == TITULO else texto)
+            if identificador not in candidatos or posicao < candidatos[identificador][1]:
+                candidatos[identificador] = entrada
+        melhores = sorted(candidatos.values(), key=lambda entrada: (entrada[1] > 0, entrada[0], entrada[2]))
+        return [
+            {'tipo': tipo, 'texto': texto, 'livro_id': livro_id} if tipo == TITULO
+            else {'tipo': tipo, 'texto': texto}
+            for _, _, tipo, texto, livro_id in melhores[:limite]
+        ]
+
+
+class _Estado:
+    indice = None
+    geracao = None
+    # Alterações com atualizado_em/removido_em até aqui já estão no índice.
+    cursor = None
+    verificado_em = 0.0
+
+
+_estado = _Estado()
+_lock = threading.Lock()
+
+
+def _corte():
+    # Transações ainda abertas podem commitar alterações com horário anterior a
+    # agora; as mais antigas que a margem do feed de alterações já estão visíveis.
+    return timezone.now() - timedelta(seconds=settings.LIVROS_CHANGES_MARGEM_SEGUNDOS)
+
+
+def construir_indice():
+    livros = Livro.objects.order_by().values_list('id', 'titulo', 'autor')
+    return IndicePrefixos(livros.iterator(chunk_size=2000))
+
+
+def aplicar_alteracoes(indice, cursor):
+    """Aplica ao índice os livros alterados e removidos depois de ``cursor``; retorna o novo cursor."""
+    corte = _corte()
+    alterados = Livro.objects.filter(atualizado_em__gt=cursor).order_by().values_list('id', 'titulo', 'autor')
+    for livro_id, titulo, autor in alterados.iterator(chunk_size=2000):
+        indice.atualizar(livro_id, titulo, autor)
+    for livro_id in LivroRemovido.objects.filter(removido_em__gt=cursor).values_list('livro_id', flat=True):
+        indice.remover(livro_id)
+    return max(cursor, corte)
+
+
+def _vencido():
+    return time.monotonic() - _estado.verificado_em >= settings.LIVROS_AUTOCOMPLETE_VERIFICAR_SEGUNDOS
+
+
+def obter_indice():
+    """
+        Índice do processo, montado na primeira consulta. Quando outro processo
+        altera os livros (mudança de geração no cache) ou a cada
+        ``LIVROS_AUTOCOMPLETE_VERIFICAR_SEGUNDOS``, recebe só as alterações
+        desde o cursor, sem varrer de novo todos os livros.
+    """
+    geracao = cache.get(CHAVE_GERACAO, 0)
+    if _estado.indice is not None and _estado.geracao == geracao and not _vencido():
+        registrar_acesso_cache('livros_autocomplete', hit=True)
+        return _estado.indice
+    registrar_acesso_cache('livros_autocomplete', hit=False)
+    with _lock:
+        if _estado.indice is None:
+            cursor = _corte()
+            _estado.indice = construir_indice()
+            _estado.geracao = geracao
+            _estado.cursor = cursor
+            _estado.verificado_em = time.monotonic()
+        elif _estado.geracao != geracao or _vencido():
+            _estado.cursor = aplicar_alteracoes(_estado.indice, _estado.cursor)
+            _estado.geracao = geracao
+            _estado.verificado_em = time.monotonic()
+        return _estado.indice
+
+
+def indice_atual():
+    """Índice do processo se estiver em dia com a geração do cache e com o banco, ou ``None``."""
+    if _estado.indice is not None and _estado.geracao == cache.get(CHAVE_GERACAO, 0) and not _vencido():
+        return _estado.indice
+    return None
+
+
+def limite_sugestoes(valor):
+    """Converte o parâmetro ``limite`` da query, com o padrão e o máximo das settings."""
+    limite = int(valor) if valor and valor.isdigit() and int(valor) > 0 else settings.LIVROS_AUTOCOMPLETE_LIMITE
+    return min(limite, settings.LIVROS_AUTOCOMPLETE_LIMITE_MAX)
+
+
+def sugerir(termo, limite=None):
+    return obter_indice().buscar(termo, limite_sugestoes(limite))
+
+
+def _avancar_geracao():
+    """
+        Incrementa a geração e retorna True se nenhum outro processo a
+        alterou desde a última leitura deste (o índice local continua válido).
+    """
+    cache.add(CHAVE_GERACAO, 0, None)
+    try:
+        geracao = cache.incr(CHAVE_GERACAO)
+    except ValueError:  # chave expulsa do cache entre o add e o incr
+        cache.set(CHAVE_GERACAO, 1, None)
+        geracao = 1
+    em_dia = _estado.geracao is not None and geracao == _estado.geracao + 1
+    if em_dia:
+        _estado.geracao = geracao
+    return em_dia
+
+
+def livro_salvo(livro_id, titulo, autor):
+    with _lock:
+        indice = _estado.indice
+        if _avancar_geracao() and indice is not None:
+            indice.atualizar(livro_id, titulo, autor)
+
+
+def livro_removido(livro_id):
+    with _lock:
+        indice = _estado.indice
+        if _avancar_geracao() and indice is not None:
+            indice.remover(livro_id)
+
+
+def aquecer():
+    """Monta o índice na subida do servidor, se habilitado."""
+    if not settings.LIVROS_AUTOCOMPLETE_AQUECER:
+        return
+    try:
+        obter_indice()
+    except DatabaseError:
+        # Banco ainda sem migrações, por exemplo: o índice é montado no primeiro uso.
+        logger.warning('Índice de autocomplete não montado na subida.', exc_info=True)
+
+
+def reiniciar():
+    with _lock:
+        _estado.indice = None
+        _estado.geracao = None
+        _estado.cursor = None
+        _estado.verificado_em = 0.0
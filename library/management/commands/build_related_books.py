@@ -0,0 +1,24 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from library.similaridade import construir_indice
+
+
+class Command(BaseCommand):
+    help = (
+        'Calcula os vetores TF-IDF de todos os livros e grava os K vizinhos mais '
+        'similares de cada um (LivroRelacionado). Reexecute periodicamente para '
+        'atualizar vocabulário e IDF; entre execuções o comando update_related_books '
+        'processa a fila de livros alterados.'
+    )
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        indice = construir_indice()
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(indice.ids)} livros, {len(indice.vocabulario)} termos, '
+            f'K={settings.LIVROS_RELACIONADOS_K}, em {time.perf_counter() - inicio:.1f}s. '
+            f'Artefato: {settings.LIVROS_RELACIONADOS_ARQUIVO}'
+        ))
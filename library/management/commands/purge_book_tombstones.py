@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from library.alteracoes import purgar_tombstones
+
+
+class Command(BaseCommand):
+    help = 'Remove os registros de livros excluídos mais antigos que LIVROS_CHANGES_RETENCAO_DIAS.'
+
+    def handle(self, *args, **options):
+        removidos = purgar_tombstones()
+        self.stdout.write(self.style.SUCCESS(f'{removidos} registros de livros excluídos removidos.'))
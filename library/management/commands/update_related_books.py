@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from library.similaridade import processar_pendentes
+
+
+class Command(BaseCommand):
+    help = (
+        'Processa a fila de livros alterados: vetoriza só os livros enfileirados, '
+        'recalcula os vizinhos afetados e grava o artefato atualizado. Sem '
+        '--continuo, para quando a fila esvaziar. Execute um único processo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=None,
+                            help='Itens da fila por lote (padrão: LIVROS_RELACIONADOS_LOTE).')
+        parser.add_argument('--continuo', action='store_true',
+                            help='Continua consultando a fila indefinidamente.')
+        parser.add_argument('--intervalo', type=float, default=5.0,
+                            help='Segundos de espera com a fila vazia no modo contínuo.')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processados = processar_pendentes(options['lote'])
+            total += processados
+            if processados:
+                self.stdout.write(f'Lote: {processados} itens da fila processados.')
+                continue
+            if not options['continuo']:
+                break
+            time.sleep(options['intervalo'])
+
+        self.stdout.write(self.style.SUCCESS(f'{total} itens da fila processados.'))
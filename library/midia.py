@@ -0,0 +1,113 @@
+"""
+Contagem de referências dos blobs de mídia (``theka.storage``).
+
+Os campos de imagem de ``library`` e ``institucional`` registram, por sinais,
+quantas linhas usam cada blob em ``ArquivoMidia``. Quando a contagem chega a
+zero (imagem trocada ou objeto excluído), o registro e o arquivo são
+removidos depois do commit. Blobs reaproveitados há menos de
+``MEDIA_BLOB_CARENCIA_SEGUNDOS`` são preservados: um upload idêntico pode estar
+a caminho de referenciá-los; o ``gc_media`` cuida deles depois. A conferência
+e a remoção são um passo só (ver ``ArmazenamentoPorConteudo.apagar_se_antigo``).
+
+Cada instância guarda os nomes de mídia com que foi carregada; o valor gravado
+no banco só é consultado no save quando algum desses nomes mudou.
+
+Só os nomes endereçados por conteúdo são contados; arquivos antigos, gravados
+por nome, não têm registro e nunca são removidos por aqui.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+
+from theka.storage import eh_blob
+from theka.writer import apos_commit
+from .models import ArquivoMidia
+
+logger = logging.getLogger(__name__)
+
+
+def nomes_de_midia(instancia, campos):
+    return {getattr(instancia, campo).name for campo in campos if getattr(instancia, campo)}
+
+
+def nomes_carregados(instance, campos):
+    # Campos adiados (.only/.defer) ficam de fora: lê-los faria uma consulta.
+    return {
+        campo: getattr(instance.__dict__[campo], 'name', instance.__dict__[campo]) or ''
+        for campo in campos if campo in instance.__dict__
+    }
+
+
+def registrar_midia_carregada(instance, campos):
+    """Guarda os nomes de mídia com que a instância foi criada ou carregada (post_init)."""
+    instance._midia_carregada = nomes_carregados(instance, campos)
+
+
+def guardar_midia_anterior(sender, instance, campos, update_fields=None):
+    """
+        Guarda os nomes gravados no banco antes do save. O SELECT por pk só é
+        feito quando algum campo de mídia mudou desde o carregamento.
+    """
+    if update_fields is not None and not set(campos) & set(update_fields):
+        instance._midia_anterior = None
+        return
+    if instance.pk is None:
+        instance._midia_anterior = set()
+        return
+    carregados = getattr(instance, '_midia_carregada', {})
+    if (not instance._state.adding and len(carregados) == len(campos)
+            and nomes_carregados(instance, campos) == carregados):
+        instance._midia_anterior = None
+        return
+    anteriores = sender.objects.filter(pk=instance.pk).values_list(*campos).first()
+    instance._midia_anterior = {nome for nome in anteriores or () if nome}
+
+
+def atualizar_referencias(instance, campos):
+    anteriores = getattr(instance, '_midia_anterior', None)
+    if anteriores is None:
+        return
+    atuais = nomes_de_midia(instance, campos)
+    ajustar_referencias(adicionar=atuais - anteriores, remover=anteriores - atuais)
+    instance._midia_anterior = atuais
+    registrar_midia_carregada(instance, campos)
+
+
+def liberar_referencias(instance, campos):
+    ajustar_referencias(remover=nomes_de_midia(instance, campos))
+
+
+def ajustar_referencias(adicionar=(), remover=()):
+    adicionar = [nome for nome in adicionar if eh_blob(nome)]
+    remover = [nome for nome in remover if eh_blob(nome)]
+    if not adicionar and not remover:
+        return
+    with transaction.atomic():
+        if adicionar:
+            ArquivoMidia.objects.bulk_create(
+                [ArquivoMidia(nome=nome, referencias=0) for nome in adicionar], ignore_conflicts=True,
+            )
+            ArquivoMidia.objects.filter(nome__in=adicionar).update(referencias=F('referencias') + 1)
+        if remover:
+            ArquivoMidia.objects.filter(nome__in=remover, referencias__gt=0).update(
+                referencias=F('referencias') - 1,
+            )
+            apos_commit(lambda: apagar_sem_referencias(remover))
+
+
+def apagar_sem_referencias(nomes):
+    """Remove os blobs de ``nomes`` que ficaram sem referências."""
+    carencia = time.time() - settings.MEDIA_BLOB_CARENCIA_SEGUNDOS
+    for nome in nomes:
+        with transaction.atomic():
+            apagados, _ = ArquivoMidia.objects.filter(nome=nome, referencias=0).delete()
+        if not apagados:
+            continue
+        try:
+            default_storage.apagar_se_antigo(nome, carencia)
+        except OSError:
+            logger.warning('Não foi possível remover o blob %s.', nome, exc_info=True)
@@ -1,9 +1,14 @@
+from django.conf import settings
 from django.db import models
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from datetime import datetime
 import re
 from .utils import validar_isbn10, validar_isbn13
+from theka.writer import apos_commit
 from django.core.validators import MinValueValidator
 
 class Genero(models.Model):
@@ -94,6 +99,8 @@ class Livro(models.Model):
         ordering = ['-criado_em']
         verbose_name = "Livro"
         verbose_name_plural = "Livros"
+        # Sequência de alterações do feed /livros/changes/.
+        indexes = [models.Index(fields=['atualizado_em', 'id'])]
 
     def __str__(self):
         return f"{self.titulo} ({self.autor})"
@@ -140,3 +147,184 @@ class Livro(models.Model):
 
         if errors:
             raise ValidationError(errors)
+
+
+class LivroRelacionado(models.Model):
+    """
+        modelo para representar um vizinho pré-calculado de um livro (top-K
+        por similaridade de cosseno dos vetores TF-IDF, ver library.similaridade).
+    """
+    livro = models.ForeignKey(Livro, on_delete=models.CASCADE, related_name='vizinhos')
+    relacionado = models.ForeignKey(Livro, on_delete=models.CASCADE, related_name='+')
+    posicao = models.PositiveSmallIntegerField()
+    similaridade = models.FloatField()
+
+    class Meta:
+        ordering = ['livro', 'posicao']
+        verbose_name = "Livro Relacionado"
+        verbose_name_plural = "Livros Relacionados"
+        constraints = [
+            models.UniqueConstraint(fields=['livro', 'posicao'], name='livro_relacionado_posicao_unica'),
+        ]
+        indexes = [models.Index(fields=['relacionado'])]
+
+    def __str__(self):
+        return f"{self.livro_id} -> {self.relacionado_id} ({self.similaridade:.3f})"
+
+
+class LivroRelacionadoPendente(models.Model):
+    """
+        modelo para representar um livro na fila de recálculo dos vizinhos.
+        Os sinais de Livro apenas enfileiram; o comando
+        ``update_related_books`` processa (ver library.similaridade).
+    """
+    livro_id = models.BigIntegerField()
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Livro Relacionado Pendente"
+        verbose_name_plural = "Livros Relacionados Pendentes"
+
+    def __str__(self):
+        return f"{self.livro_id} pendente desde {self.criado_em:%Y-%m-%d %H:%M:%S}"
+
+
+class LivroRemovido(models.Model):
+    """
+        modelo para registrar a exclusão de um livro (tombstone), para que o
+        feed /livros/changes/ informe as remoções aos clientes.
+    """
+    livro_id = models.BigIntegerField(unique=True)
+    removido_em = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['removido_em', 'livro_id']
+        verbose_name = "Livro Removido"
+        verbose_name_plural = "Livros Removidos"
+        indexes = [models.Index(fields=['removido_em', 'livro_id'])]
+
+    def __str__(self):
+        return f"{self.livro_id} removido em {self.removido_em:%Y-%m-%d %H:%M:%S}"
+
+
+class ArquivoMidia(models.Model):
+    """
+        modelo para contar as referências a um blob de mídia endereçado por
+        conteúdo (ver theka.storage e library.midia).
+    """
+    nome = models.CharField(max_length=255, unique=True)
+    referencias = models.PositiveIntegerField(default=0)
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Arquivo de Mídia"
+        verbose_name_plural = "Arquivos de Mídia"
+
+    def __str__(self):
+        return f"{self.nome} ({self.referencias} referências)"
+
+
+@receiver(post_save, sender=Livro)
+def enfileirar_relacionados(sender, instance, raw=False, **kwargs):
+    """Enfileira o livro salvo para o recálculo dos vizinhos (update_related_books)."""
+    if raw or not settings.LIVROS_RELACIONADOS_INCREMENTAL:
+        return
+    from .similaridade import enfileirar
+    enfileirar([instance.pk])
+
+
+@receiver(pre_delete, sender=Livro)
+def enfileirar_afetados_relacionados(sender, instance, **kwargs):
+    # O CASCADE apaga as linhas que apontam para o livro; enfileira antes quem as tinha.
+    if not settings.LIVROS_RELACIONADOS_INCREMENTAL:
+        return
+    from .similaridade import enfileirar
+    enfileirar([
+        instance.pk,
+        *LivroRelacionado.objects.filter(relacionado=instance).values_list('livro_id', flat=True),
+    ])
+
+
+@receiver(post_save, sender=Livro)
+def atualizar_autocomplete(sender, instance, raw=False, **kwargs):
+    """Atualiza, após o commit, as sugestões de título e autor do livro salvo."""
+    if raw:
+        return
+    from .autocomplete import livro_salvo
+    apos_commit(lambda: livro_salvo(instance.pk, instance.titulo, instance.autor))
+
+
+@receiver(post_delete, sender=Livro)
+def remover_autocomplete(sender, instance, **kwargs):
+    from .autocomplete import livro_removido
+    livro_id = instance.pk
+    apos_commit(lambda: livro_removido(livro_id))
+
+
+@receiver(post_delete, sender=Livro)
+def registrar_remocao(sender, instance, origin=None, **kwargs):
+    """Grava o tombstone do livro excluído diretamente (instância ou queryset de Livro)."""
+    if isinstance(origin, (Genero, Editora)):
+        return  # registrado em lote por registrar_remocoes_em_cascata
+    LivroRemovido.objects.bulk_create([LivroRemovido(livro_id=instance.pk)], ignore_conflicts=True)
+
+
+@receiver(pre_delete, sender=Genero)
+@receiver(pre_delete, sender=Editora)
+def registrar_remocoes_em_cascata(sender, instance, **kwargs):
+    """Grava de uma vez os tombstones dos livros que o CASCADE vai excluir."""
+    agora = timezone.now()
+    ids = instance.livros.values_list('id', flat=True)
+    LivroRemovido.objects.bulk_create(
+        [LivroRemovido(livro_id=livro_id, removido_em=agora) for livro_id in ids.iterator()],
+        batch_size=1000, ignore_conflicts=True,
+    )
+
+
+@receiver(pre_save, sender=Genero)
+@receiver(pre_save, sender=Editora)
+def guardar_nome_anterior(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    instance._nome_anterior = sender.objects.filter(pk=instance.pk).values_list('nome', flat=True).first()
+
+
+@receiver(post_save, sender=Genero)
+@receiver(post_save, sender=Editora)
+def marcar_livros_renomeados(sender, instance, created=False, raw=False, **kwargs):
+    """
+        O nome do gênero e da editora faz parte do payload do livro: ao
+        renomeá-los, os livros entram de novo no feed /livros/changes/.
+    """
+    if raw or created or getattr(instance, '_nome_anterior', instance.nome) == instance.nome:
+        return
+    instance.livros.update(atualizado_em=timezone.now())
+
+
+@receiver(post_init, sender=Livro)
+def registrar_capa_carregada(sender, instance, **kwargs):
+    from .midia import registrar_midia_carregada
+    registrar_midia_carregada(instance, ('capa',))
+
+
+@receiver(pre_save, sender=Livro)
+def guardar_capa_anterior(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    from .midia import guardar_midia_anterior
+    guardar_midia_anterior(sender, instance, ('capa',), update_fields)
+
+
+@receiver(post_save, sender=Livro)
+def contar_referencias_capa(sender, instance, raw=False, **kwargs):
+    """Atualiza a contagem de referências dos blobs da capa nova e da anterior."""
+    if raw:
+        return
+    from .midia import atualizar_referencias
+    atualizar_referencias(instance, ('capa',))
+
+
+@receiver(post_delete, sender=Livro)
+def liberar_capa(sender, instance, **kwargs):
+    from .midia import liberar_referencias
+    liberar_referencias(instance, ('capa',))
@@ -0,0 +1,370 @@
+"""
+Livros relacionados por similaridade de conteúdo.
+
+Cada livro vira um vetor TF-IDF (tf sublinear, normalizado em L2) sobre os
+termos de ``titulo`` e ``resumo`` e sobre marcadores de ``autor``, ``genero``
+e ``editora``. A similaridade é o cosseno (produto interno dos vetores
+normalizados) e os ``K`` vizinhos mais próximos de cada livro são gravados em
+``LivroRelacionado``. Assim o endpoint ``/livros/{id}/relacionados/`` é uma
+única consulta indexada e os processos web nunca carregam o índice.
+
+Os vetores ficam numa matriz esparsa (CSR, só os termos presentes em cada
+livro) e as similaridades de um bloco de linhas são somadas termo a termo pelo
+índice invertido (CSC), percorrendo apenas os livros que compartilham termos.
+Junto dos vetores o artefato guarda, por livro, a quantidade de vizinhos e a
+similaridade do K-ésimo, usadas para decidir quem é afetado por uma alteração.
+
+``construir_indice`` (comando ``build_related_books``) faz o cálculo completo
+e grava o artefato em ``LIVROS_RELACIONADOS_ARQUIVO``. Os sinais de ``Livro``
+apenas enfileiram os ids em ``LivroRelacionadoPendente``, dentro da transação
+da requisição; ``processar_pendentes`` (comando ``update_related_books``)
+vetoriza só os livros enfileirados, recalcula os vizinhos das linhas afetadas
+e grava o artefato atualizado. O vocabulário e o IDF ficam fixos até a
+próxima construção completa.
+"""
+import logging
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+
+from .models import Livro, LivroRelacionado, LivroRelacionadoPendente
+
+logger = logging.getLogger(__name__)
+
+CAMPOS = ('id', 'titulo', 'resumo', 'autor', 'genero_id', 'editora_id')
+STOPWORDS = frozenset(
+    'a o as os um uma uns umas de do da dos das em no na nos nas por para com sem '
+    'e ou que se ao aos à às pelo pela pelos pelas seu sua seus suas ele ela eles '
+    'elas mais mas como quando onde entre sobre até após também muito já não sim '
+    'é são foi ser ter há este esta isso isto esse essa aquele aquela'.split()
+)
+_PALAVRA_RE = re.compile(r'\w+')
+TAMANHO_BLOCO = 1024
+# Linhas pontuadas de uma vez: cada bloco ocupa BLOCO_SIMILARIDADE x livros floats.
+BLOCO_SIMILARIDADE = 256
+
+
+def dobrar_acentos(texto):
+    return unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii').lower()
+
+
+def palavras(texto):
+    return [
+        palavra for palavra in _PALAVRA_RE.findall(dobrar_acentos(texto or ''))
+        if len(palavra) > 2 and palavra not in STOPWORDS and not palavra.isdigit()
+    ]
+
+
+def termos_livro(livro):
+    """Contagem de termos do livro (dict de ``CAMPOS``), com pesos por campo."""
+    termos = Counter(palavras(livro['resumo']))
+    for palavra in palavras(livro['titulo']):
+        termos[palavra] += 2
+    autor = '_'.join(palavras(livro['autor']))
+    if autor:
+        termos[f'autor:{autor}'] += 3
+    termos[f'genero:{livro["genero_id"]}'] += 2
+    termos[f'editora:{livro["editora_id"]}'] += 1
+    return termos
+
+
+class IndiceSimilaridade:
+    """Vocabulário, IDF e vetores TF-IDF esparsos (CSR, uma linha por livro)."""
+
+    def __init__(self, vocabulario, idf, ids, indptr, colunas, pesos, limiar=None, total=None):
+        self.vocabulario = vocabulario
+        self.idf = idf
+        self.ids = ids
+        self.indptr = indptr
+        self.colunas = colunas
+        self.pesos = pesos
+        # Similaridade do K-ésimo vizinho gravado e quantidade de vizinhos.
+        self.limiar = np.zeros(len(ids), dtype=np.float32) if limiar is None else limiar
+        self.total = np.zeros(len(ids), dtype=np.int16) if total is None else total
+        self.posicoes = {livro_id: i for i, livro_id in enumerate(ids.tolist())}
+        self._invertido = None
+
+    @classmethod
+    def construir(cls, livros, max_termos):
+        contagens = [termos_livro(livro) for livro in livros]
+        frequencia_documentos = Counter(termo for termos in contagens for termo in termos)
+        # Os termos mais frequentes entre documentos cobrem a maior parte das
+        # similaridades; os raros (vistos em um só livro) não ligam ninguém.
+        escolhidos = [termo for termo, df in frequencia_documentos.most_common(max_termos) if df > 1]
+        vocabulario = {termo: i for i, termo in enumerate(escolhidos)}
+        total = len(livros)
+        idf = np.array(
+            [math.log((1 + total) / (1 + frequencia_documentos[termo])) + 1 for termo in escolhidos],
+            dtype=np.float32,
+        )
+        indice = cls(vocabulario, idf, *cls._montar([], []))
+        indice.aplicar({livro['id']: indice.vetorizar(termos) for livro, termos in zip(livros, contagens)})
+        return indice
+
+    @staticmethod
+    def _montar(ids, vetores):
+        """``(ids, indptr, colunas, pesos)`` a partir de uma lista de vetores esparsos."""
+        indptr = np.zeros(len(vetores) + 1, dtype=np.int64)
+        np.cumsum([len(colunas) for colunas, _ in vetores], out=indptr[1:])
+        return (
+            np.array(ids, dtype=np.int64),
+            indptr,
+            np.concatenate([colunas for colunas, _ in vetores] or [np.zeros(0, dtype=np.int32)]),
+            np.concatenate([pesos for _, pesos in vetores] or [np.zeros(0, dtype=np.float32)]),
+        )
+
+    def vetorizar(self, termos):
+        """Vetor esparso ``(colunas, pesos)`` de uma contagem de termos."""
+        presentes = sorted(
+            (self.vocabulario[termo], 1 + math.log(tf)) for termo, tf in termos.items()
+            if termo in self.vocabulario
+        )
+        colunas = np.array([coluna for coluna, _ in presentes], dtype=np.int32)
+        pesos = np.array([tf for _, tf in presentes], dtype=np.float32) * self.idf[colunas]
+        norma = np.linalg.norm(pesos)
+        if norma > 0:
+            pesos /= norma
+        return colunas, pesos
+
+    def vetor(self, livro_id):
+        linha = self.posicoes[livro_id]
+        inicio, fim = self.indptr[linha], self.indptr[linha + 1]
+        return self.colunas[inicio:fim], self.pesos[inicio:fim]
+
+    def aplicar(self, vetores, removidos=()):
+        """
+            Substitui os vetores dos livros de ``vetores`` (``{livro_id: vetor}``),
+            acrescenta os novos e remove os ``removidos``. Os livros alterados
+            vão para o fim da matriz, com limiar e total zerados.
+        """
+        mantidas = ~np.isin(self.ids, list(set(vetores) | set(removidos)))
+        entradas = np.repeat(mantidas, np.diff(self.indptr))
+        ids, indptr, colunas, pesos = self._montar(list(vetores), list(vetores.values()))
+        self.ids = np.concatenate([self.ids[mantidas], ids])
+        self.indptr = np.concatenate([[0], np.cumsum(np.diff(self.indptr)[mantidas]), indptr[1:] + entradas.sum()])
+        self.colunas = np.concatenate([self.colunas[entradas], colunas])
+        self.pesos = np.concatenate([self.pesos[entradas], pesos])
+        self.limiar = np.concatenate([self.limiar[mantidas], np.zeros(len(vetores), dtype=np.float32)])
+        self.total = np.concatenate([self.total[mantidas], np.zeros(len(vetores), dtype=np.int16)])
+        self.posicoes = {livro_id: i for i, livro_id in enumerate(self.ids.tolist())}
+        self._invertido = None
+
+    def invertido(self):
+        """Índice invertido (CSC): para cada termo, os livros que o contêm e os pesos."""
+        if self._invertido is None:
+            linhas = np.repeat(np.arange(len(self.ids), dtype=np.int64), np.diff(self.indptr))
+            ordem = np.argsort(self.colunas, kind='stable')
+            ponteiros = np.zeros(len(self.vocabulario) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.colunas, minlength=len(self.vocabulario)), out=ponteiros[1:])
+            self._invertido = (ponteiros, linhas[ordem], self.pesos[ordem])
+        return self._invertido
+
+    def similaridades(self, linhas):
+        """Matriz ``len(linhas) x livros`` com o cosseno de cada linha dada contra todas."""
+        ponteiros, livros_termo, pesos_termo = self.invertido()
+        resultado = np.zeros((len(linhas), len(self.ids)), dtype=np.float32)
+        tamanhos = self.indptr[np.array(linhas, dtype=np.int64) + 1] - self.indptr[linhas]
+        if not tamanhos.sum():
+            return resultado
+        locais = np.repeat(np.arange(len(linhas)), tamanhos)
+        entradas = np.concatenate([np.arange(self.indptr[i], self.indptr[i + 1]) for i in linhas])
+        colunas = self.colunas[entradas]
+        ordem = np.argsort(colunas, kind='stable')
+        locais, colunas, pesos = locais[ordem], colunas[ordem], self.pesos[entradas][ordem]
+        termos, inicios = np.unique(colunas, return_index=True)
+        for termo, inicio, fim in zip(termos.tolist(), inicios.tolist(), [*inicios[1:].tolist(), len(colunas)]):
+            alvo = slice(ponteiros[termo], ponteiros[termo + 1])
+            resultado[np.ix_(locais[inicio:fim], livros_termo[alvo])] += np.outer(pesos[inicio:fim], pesos_termo[alvo])
+        return resultado
+
+    def vizinhos(self, livro_ids, k):
+        """
+            ``{livro_id: [(relacionado_id, similaridade), ...]}`` com os top-K;
+            atualiza o limiar e o total de vizinhos das linhas calculadas.
+        """
+        resultado = {}
+        livro_ids = [livro_id for livro_id in livro_ids if livro_id in self.posicoes]
+        k = min(k, len(self.ids) - 1)
+        for inicio in range(0, len(livro_ids), BLOCO_SIMILARIDADE):
+            bloco = livro_ids[inicio:inicio + BLOCO_SIMILARIDADE]
+            linhas = [self.posicoes[livro_id] for livro_id in bloco]
+            if k <= 0:
+                resultado.update({livro_id: [] for livro_id in bloco})
+                continue
+            similaridades = self.similaridades(linhas)
+            similaridades[np.arange(len(linhas)), linhas] = -1  # o próprio livro
+            candidatos = np.argpartition(-similaridades, k - 1, axis=1)[:, :k]
+            for n, livro_id in enumerate(bloco):
+                ordem = candidatos[n][np.argsort(-similaridades[n, candidatos[n]])]
+                resultado[livro_id] = [
+                    (int(self.ids[j]), float(similaridades[n, j]))
+                    for j in ordem if similaridades[n, j] > 0
+                ]
+        for livro_id, lista in resultado.items():
+            linha = self.posicoes[livro_id]
+            self.total[linha] = len(lista)
+            self.limiar[linha] = lista[-1][1] if lista else 0.0
+        return resultado
+
+    def salvar(self, caminho):
+        caminho = Path(caminho)
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        temporario = caminho.with_name(caminho.name + '.tmp.npz')
+        np.savez(
+            temporario,
+            vocabulario=np.array(list(self.vocabulario), dtype=str),
+            idf=self.idf,
+            ids=self.ids,
+            indptr=self.indptr,
+            colunas=self.colunas,
+            pesos=self.pesos,
+            limiar=self.limiar,
+            total=self.total,
+        )
+        os.replace(temporario, caminho)
+
+    @classmethod
+    def carregar(cls, caminho):
+        with np.load(caminho) as dados:
+            return cls(
+                {termo: i for i, termo in enumerate(dados['vocabulario'].tolist())},
+                dados['idf'], dados['ids'], dados['indptr'], dados['colunas'], dados['pesos'],
+                dados['limiar'], dados['total'],
+            )
+
+
+def gravar_vizinhos(vizinhos):
+    """Substitui, numa transação, as linhas de ``LivroRelacionado`` dos livros dados."""
+    with transaction.atomic():
+        LivroRelacionado.objects.filter(livro_id__in=list(vizinhos)).delete()
+        LivroRelacionado.objects.bulk_create(
+            [
+                LivroRelacionado(livro_id=livro_id, relacionado_id=relacionado_id,
+                                 posicao=posicao, similaridade=similaridade)
+                for livro_id, lista in vizinhos.items()
+                for posicao, (relacionado_id, similaridade) in enumerate(lista)
+            ],
+            batch_size=1000,
+        )
+
+
+_indice = {}
+_lock = threading.Lock()
+
+
+def _versao(caminho):
+    return (str(caminho), os.stat(caminho).st_mtime_ns)
+
+
+def _salvar(indice):
+    caminho = settings.LIVROS_RELACIONADOS_ARQUIVO
+    indice.salvar(caminho)
+    _indice['indice'], _indice['versao'] = indice, _versao(caminho)
+
+
+def construir_indice():
+    """
+        Cálculo completo: vetoriza todos os livros e grava todos os vizinhos.
+        O cálculo roda fora de transação; cada bloco de ``TAMANHO_BLOCO``
+        livros é gravado numa transação curta (com ``transaction_mode=IMMEDIATE``
+        uma transação longa seguraria o lock de escrita do SQLite durante
+        toda a reconstrução). Linhas de livros excluídos saem pelo CASCADE.
+    """
+    with _lock:
+        # A construção completa cobre o que estava na fila até aqui.
+        ultimo_pendente = LivroRelacionadoPendente.objects.aggregate(ultimo=Max('id'))['ultimo']
+        livros = list(Livro.objects.order_by('id').values(*CAMPOS))
+        indice = IndiceSimilaridade.construir(livros, settings.LIVROS_RELACIONADOS_MAX_TERMOS)
+        for inicio in range(0, len(livros), TAMANHO_BLOCO):
+            ids = [livro['id'] for livro in livros[inicio:inicio + TAMANHO_BLOCO]]
+            gravar_vizinhos(indice.vizinhos(ids, settings.LIVROS_RELACIONADOS_K))
+        _salvar(indice)
+        if ultimo_pendente is not None:
+            LivroRelacionadoPendente.objects.filter(id__lte=ultimo_pendente).delete()
+    return indice
+
+
+def obter_indice():
+    """Índice do processo, recarregado quando o artefato é reconstruído."""
+    caminho = settings.LIVROS_RELACIONADOS_ARQUIVO
+    try:
+        versao = _versao(caminho)
+    except FileNotFoundError:
+        return None
+    if _indice.get('versao') != versao:
+        try:
+            _indice['indice'] = IndiceSimilaridade.carregar(caminho)
+        except KeyError:
+            logger.warning('Artefato de livros relacionados em formato antigo; use build_related_books.')
+            return None
+        _indice['versao'] = versao
+    return _indice['indice']
+
+
+def enfileirar(livro_ids):
+    """Enfileira livros para o recálculo dos vizinhos (na transação corrente)."""
+    LivroRelacionadoPendente.objects.bulk_create(
+        [LivroRelacionadoPendente(livro_id=livro_id) for livro_id in livro_ids],
+    )
+
+
+def processar_pendentes(lote=None):
+    """
+        Processa um lote da fila de recálculo. Vetoriza apenas os livros
+        enfileirados e recalcula os vizinhos das linhas afetadas: os próprios
+        livros, quem os tinha como vizinho e quem passa a tê-los acima do seu
+        K-ésimo (pelo limiar guardado no artefato). O artefato é gravado antes
+        de consumir a fila, então uma falha no meio só repete o lote.
+        Retorna a quantidade de itens da fila consumidos.
+    """
+    lote = lote or settings.LIVROS_RELACIONADOS_LOTE
+    k = settings.LIVROS_RELACIONADOS_K
+    with _lock:
+        pendentes = list(LivroRelacionadoPendente.objects.order_by('id').values_list('id', 'livro_id')[:lote])
+        if not pendentes:
+            return 0
+        indice = obter_indice()
+        if indice is None:
+            logger.info('Índice de livros relacionados ainda não construído; use build_related_books.')
+            return 0
+        enfileirados = {livro_id for _, livro_id in pendentes}
+        vetores = {
+            livro['id']: indice.vetorizar(termos_livro(livro))
+            for livro in Livro.objects.filter(id__in=enfileirados).values(*CAMPOS)
+        }
+        removidos = enfileirados - set(vetores)
+        # Livros salvos sem mudar o vetor (capa, páginas...) não mudam a vizinhança dos outros.
+        alterados = [
+            livro_id for livro_id, (colunas, pesos) in vetores.items()
+            if livro_id not in indice.posicoes
+            or not all(np.array_equal(a, b) for a, b in zip((colunas, pesos), indice.vetor(livro_id)))
+        ]
+        afetados = set(enfileirados)
+        if alterados:
+            afetados.update(
+                LivroRelacionado.objects.filter(relacionado_id__in=alterados).values_list('livro_id', flat=True)
+            )
+        indice.aplicar({livro_id: vetores[livro_id] for livro_id in alterados}, removidos)
+
+        for inicio in range(0, len(alterados), BLOCO_SIMILARIDADE):
+            linhas = [indice.posicoes[livro_id] for livro_id in alterados[inicio:inicio + BLOCO_SIMILARIDADE]]
+            melhores = indice.similaridades(linhas).max(axis=0)
+            melhores[linhas] = 0
+            candidatos = (melhores > 0) & ((indice.total < k) | (melhores > indice.limiar))
+            afetados.update(indice.ids[candidatos].tolist())
+
+        vizinhos = indice.vizinhos(sorted(afetados), k)
+        _salvar(indice)
+        with transaction.atomic():
+            gravar_vizinhos(vizinhos)
+            LivroRelacionadoPendente.objects.filter(id__in=[pk for pk, _ in pendentes]).delete()
+    return len(pendentes)
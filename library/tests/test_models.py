@@ -2,7 +2,16 @@
 from django.test import TestCase
 from django.core.exceptions import ValidationError
 from django.db.utils import IntegrityError
-from library.models import Genero, Editora, Livro
+from django.core.files.uploadedfile import SimpleUploadedFile
+from library.models import ArquivoMidia, Genero, Editora, Livro
+from institucional.models import MembrosEquipe
+import hashlib
+import os
+import tempfile
+import time
+from unittest import mock
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from datetime import datetime
 import re
 
@@ -503,4 +512,121 @@ class ModelIntegrationTest(TestCase):
         
         self.assertEqual(Livro.objects.count(), 1)
         genero.delete()
-        self.assertEqual(Livro.objects.count(), 0)
\ No newline at end of file
+        self.assertEqual(Livro.objects.count(), 0)
+
+class MidiaPorConteudoTest(TestCase):
+    """Testes para o armazenamento endereçado por conteúdo e a contagem de referências"""
+
+    def setUp(self):
+        self.diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.diretorio.cleanup)
+        override = self.settings(MEDIA_ROOT=self.diretorio.name, MEDIA_BLOB_CARENCIA_SEGUNDOS=0)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.genero = Genero.objects.create(nome="Fantasia")
+        self.editora = Editora.objects.create(nome="Editora Teste")
+
+    def criar_livro(self, capa, isbn):
+        return Livro.objects.create(
+            titulo='Livro', autor='Autor', genero=self.genero, editora=self.editora, resumo='Resumo',
+            isbn=isbn, numero_paginas=100, ano_publicacao=2000, capa=capa,
+        )
+
+    def imagem(self, conteudo, nome='capa.JPG'):
+        return SimpleUploadedFile(nome, conteudo, content_type='image/jpeg')
+
+    def blobs(self):
+        return sorted(
+            os.path.relpath(os.path.join(raiz, nome), self.diretorio.name)
+            for raiz, _, nomes in os.walk(self.diretorio.name) for nome in nomes
+        )
+
+    def referencias(self, nome):
+        return ArquivoMidia.objects.filter(nome=nome).values_list('referencias', flat=True).first()
+
+    def consultas_da_capa(self, consultas):
+        return [
+            q['sql'] for q in consultas.captured_queries
+            if q['sql'].startswith('SELECT "library_livro"."capa"')
+        ]
+
+    def test_nome_pelo_hash_do_conteudo(self):
+        """Testa que o arquivo é gravado pelo SHA-256 do conteúdo"""
+        livro = self.criar_livro(self.imagem(b'capa azul'), '9780000000001')
+        digest = hashlib.sha256(b'capa azul').hexdigest()
+        self.assertEqual(livro.capa.name, f'blobs/{digest[:2]}/{digest[2:4]}/{digest}.jpg')
+        self.assertEqual(self.blobs(), [livro.capa.name])
+
+    def test_upload_identico_entre_modelos(self):
+        """Testa que uploads idênticos em modelos diferentes compartilham o blob"""
+        livro = self.criar_livro(self.imagem(b'mesma imagem'), '9780000000001')
+        outro = self.criar_livro(self.imagem(b'mesma imagem', 'outra.jpg'), '9780000000002')
+        membro = MembrosEquipe.objects.create(nome='Ana', cargo='Curadora', foto=self.imagem(b'mesma imagem'))
+        self.assertEqual({livro.capa.name, outro.capa.name, membro.foto.name}, {livro.capa.name})
+        self.assertEqual(self.blobs(), [livro.capa.name])
+        self.assertEqual(self.referencias(livro.capa.name), 3)
+
+    def test_troca_e_exclusao_liberam_o_blob(self):
+        """Testa que o blob é apagado quando a última referência sai"""
+        with self.captureOnCommitCallbacks(execute=True):
+            livro = self.criar_livro(self.imagem(b'antiga'), '9780000000001')
+            outro = self.criar_livro(self.imagem(b'antiga'), '9780000000002')
+        antiga = livro.capa.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            livro.capa = self.imagem(b'nova')
+            livro.save()
+        self.assertEqual(self.referencias(antiga), 1)
+        self.assertIn(antiga, self.blobs())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            outro.delete()
+        self.assertIsNone(self.referencias(antiga))
+        self.assertEqual(self.blobs(), [livro.capa.name])
+
+    def test_save_sem_troca_nao_altera_contagem(self):
+        """Testa que salvar sem trocar a imagem mantém a contagem"""
+        livro = self.criar_livro(self.imagem(b'capa'), '9780000000001')
+        livro.titulo = 'Outro título'
+        livro.save()
+        livro.save(update_fields=['titulo'])
+        self.assertEqual(self.referencias(livro.capa.name), 1)
+
+    def test_save_sem_troca_nao_consulta_a_imagem_anterior(self):
+        """Testa que o save só busca a imagem gravada quando o campo mudou"""
+        criado = self.criar_livro(self.imagem(b'capa'), '9780000000001')
+        livro = Livro.objects.get(pk=criado.pk)
+        livro.titulo = 'Outro título'
+        with CaptureQueriesContext(connection) as consultas:
+            livro.save()
+        self.assertFalse(self.consultas_da_capa(consultas))
+
+        livro.capa = self.imagem(b'capa nova')
+        with CaptureQueriesContext(connection) as consultas:
+            livro.save()
+        self.assertTrue(self.consultas_da_capa(consultas))
+        self.assertEqual(self.referencias(criado.capa.name), 0)
+        self.assertEqual(self.referencias(livro.capa.name), 1)
+
+    def test_reaproveitamento_durante_a_remocao(self):
+        """Testa que um upload idêntico concorrente à remoção não fica sem arquivo"""
+        livro = self.criar_livro(self.imagem(b'capa'), '9780000000001')
+        nome = livro.capa.name
+        armazenamento = Livro._meta.get_field('capa').storage
+        reaproveitado = []
+        getmtime = os.path.getmtime
+
+        def reaproveitar_no_meio(caminho):
+            # Outro processo tenta reaproveitar o blob entre a conferência e a remoção.
+            reaproveitado.append(armazenamento._reaproveitar(nome))
+            return getmtime(caminho)
+
+        with mock.patch('theka.storage.os.path.getmtime', reaproveitar_no_meio):
+            self.assertTrue(armazenamento.apagar_se_antigo(nome, time.time() + 1))
+        # O blob já tinha saído do lugar: quem reaproveitava instala uma cópia nova.
+        self.assertEqual(reaproveitado, [False])
+
+        outro = self.criar_livro(self.imagem(b'capa'), '9780000000002')
+        self.assertTrue(os.path.exists(armazenamento.path(outro.capa.name)))
+        self.assertFalse(armazenamento.apagar_se_antigo(outro.capa.name, time.time() - 60))
+        self.assertTrue(os.path.exists(armazenamento.path(outro.capa.name)))
@@ -6,6 +6,21 @@ from rest_framework import status
 from library.models import Livro, Genero, Editora
 from library.serializers import LivroSerializer, GeneroSerializer, EditoraSerializer
 import json
+from unittest import mock
+import os
+import tempfile
+from io import StringIO
+from django.core.management import call_command
+from django.core.cache import cache
+from library import autocomplete, similaridade
+from library.alteracoes import codificar_token
+from library.models import LivroRelacionadoPendente, LivroRemovido
+from django.conf import settings
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from datetime import timedelta
 
 class LivroViewSetTest(APITestCase):
     """Testes para LivroViewSet"""
@@ -452,4 +467,349 @@ class FilterTest(APITestCase):
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['results']), 1)
-        self.assertEqual(response.data['results'][0]['titulo'], 'Python para Iniciantes')
\ No newline at end of file
+        self.assertEqual(response.data['results'][0]['titulo'], 'Python para Iniciantes')
+
+class LivrosRelacionadosTest(APITestCase):
+    """Testes para os livros relacionados pré-calculados"""
+
+    def setUp(self):
+        self.diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.diretorio.cleanup)
+        override = self.settings(
+            LIVROS_RELACIONADOS_ARQUIVO=os.path.join(self.diretorio.name, 'livros.npz'),
+            LIVROS_RELACIONADOS_K=2,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.fantasia = Genero.objects.create(nome="Fantasia")
+        self.tecnologia = Genero.objects.create(nome="Tecnologia")
+        self.editora = Editora.objects.create(nome="Editora Teste")
+        self.anel = self.criar('O Senhor dos Anéis', 'J. R. R. Tolkien', self.fantasia,
+                               'Uma jornada épica para destruir o anel do poder na Terra Média.')
+        self.hobbit = self.criar('O Hobbit', 'J. R. R. Tolkien', self.fantasia,
+                                 'Bilbo parte numa jornada épica com anões até a Montanha Solitária.')
+        self.python = self.criar('Python Fluente', 'Luciano Ramalho', self.tecnologia,
+                                 'Programação Python idiomática com exemplos práticos de código.')
+        self.django = self.criar('Django na Prática', 'Ana Souza', self.tecnologia,
+                                 'Programação web com Django e Python com exemplos práticos.')
+        call_command('build_related_books', stdout=StringIO())
+
+    def criar(self, titulo, autor, genero, resumo):
+        return Livro.objects.create(
+            titulo=titulo, autor=autor, genero=genero, editora=self.editora, resumo=resumo,
+            isbn=f'978{Livro.objects.count():010d}', numero_paginas=100, ano_publicacao=2000,
+        )
+
+    def relacionados(self, livro):
+        response = self.client.get(reverse('livro-relacionados', args=[livro.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.data]
+
+    def test_relacionados_por_similaridade(self):
+        """Testa que o vizinho mais próximo é o livro mais parecido"""
+        self.assertEqual(self.relacionados(self.anel)[0], self.hobbit.id)
+        self.assertEqual(self.relacionados(self.python)[0], self.django.id)
+
+    def test_relacionados_em_uma_consulta(self):
+        """Testa que o endpoint é uma única consulta na tabela de vizinhos"""
+        with self.assertNumQueries(1):
+            self.client.get(reverse('livro-relacionados', args=[self.anel.id]))
+
+    def test_livro_inexistente(self):
+        """Testa 404 para livro inexistente"""
+        response = self.client.get(reverse('livro-relacionados', args=[9999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def atualizar(self):
+        call_command('update_related_books', stdout=StringIO())
+
+    def test_atualizacao_incremental(self):
+        """Testa que um livro novo entra nos vizinhos dos livros afetados"""
+        silmarillion = self.criar('O Silmarillion', 'J. R. R. Tolkien', self.fantasia,
+                                  'Os dias antigos da Terra Média e a jornada dos elfos.')
+        self.atualizar()
+        self.assertIn(self.anel.id, self.relacionados(silmarillion))
+        self.assertIn(silmarillion.id, self.relacionados(self.hobbit))
+        self.assertEqual(self.relacionados(self.python)[0], self.django.id)
+
+        silmarillion.delete()
+        self.atualizar()
+        self.assertNotIn(silmarillion.id, self.relacionados(self.hobbit))
+        self.assertEqual(len(self.relacionados(self.hobbit)), 2)
+        self.assertFalse(LivroRelacionadoPendente.objects.exists())
+
+    def test_salvar_apenas_enfileira(self):
+        """Testa que salvar um livro não recalcula nada na requisição, só enfileira"""
+        with self.captureOnCommitCallbacks(execute=True):
+            silmarillion = self.criar('O Silmarillion', 'J. R. R. Tolkien', self.fantasia,
+                                      'Os dias antigos da Terra Média e a jornada dos elfos.')
+        self.assertEqual(self.relacionados(silmarillion), [])
+        self.assertEqual(
+            list(LivroRelacionadoPendente.objects.values_list('livro_id', flat=True)), [silmarillion.id],
+        )
+        self.assertNotIn(silmarillion.id, similaridade._indice.get('indice').posicoes)
+
+        self.atualizar()
+        # O artefato gravado já tem o livro novo, sem reconstrução completa.
+        persistido = similaridade.IndiceSimilaridade.carregar(settings.LIVROS_RELACIONADOS_ARQUIVO)
+        self.assertIn(silmarillion.id, persistido.posicoes)
+        self.assertEqual(persistido.total[persistido.posicoes[silmarillion.id]], 2)
+
+    def test_construcao_calcula_fora_de_transacao(self):
+        """Testa que a reconstrução só abre transações curtas, para gravar cada bloco"""
+        nivel = len(connection.atomic_blocks)
+        niveis = []
+        vizinhos = similaridade.IndiceSimilaridade.vizinhos
+
+        def registrar_nivel(indice, *args):
+            niveis.append(len(connection.atomic_blocks))
+            return vizinhos(indice, *args)
+
+        with mock.patch.object(similaridade.IndiceSimilaridade, 'vizinhos', registrar_nivel):
+            call_command('build_related_books', stdout=StringIO())
+        self.assertEqual(niveis, [nivel])
+        self.assertEqual(self.relacionados(self.anel)[0], self.hobbit.id)
+
+    def test_edicao_sem_mudar_o_texto(self):
+        """Testa que editar só a capa/páginas não reordena os vizinhos dos outros"""
+        antes = {livro.id: self.relacionados(livro) for livro in (self.anel, self.python)}
+        self.python.numero_paginas = 300
+        self.python.save()
+        self.atualizar()
+        self.assertEqual({livro.id: self.relacionados(livro) for livro in (self.anel, self.python)}, antes)
+
+
+class AutocompleteTest(APITestCase):
+    """Testes para as sugestões de título e autor do índice em memória"""
+
+    def setUp(self):
+        autocomplete.reiniciar()
+        self.addCleanup(autocomplete.reiniciar)
+        self.genero = Genero.objects.create(nome="Fantasia")
+        self.editora = Editora.objects.create(nome="Editora Teste")
+        self.anel = self.criar('O Senhor dos Anéis', 'J. R. R. Tolkien')
+        self.hobbit = self.criar('O Hobbit', 'J. R. R. Tolkien')
+        self.cronicas = self.criar('As Crônicas de Nárnia', 'C. S. Lewis')
+
+    def criar(self, titulo, autor):
+        return Livro.objects.create(
+            titulo=titulo, autor=autor, genero=self.genero, editora=self.editora,
+            isbn=f'978{Livro.objects.count():010d}', numero_paginas=100, ano_publicacao=2000,
+        )
+
+    def sugestoes(self, q, **params):
+        response = self.client.get(reverse('livro-autocomplete'), {'q': q, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(item['tipo'], item['texto']) for item in response.data]
+
+    def test_prefixo_sem_acento(self):
+        """Testa que o prefixo casa com títulos e autores ignorando acentos e caixa"""
+        self.assertEqual(self.sugestoes('narn'), [('titulo', 'As Crônicas de Nárnia')])
+        self.assertEqual(self.sugestoes('CRÔNI'), [('titulo', 'As Crônicas de Nárnia')])
+        self.assertEqual(self.sugestoes('tolk'), [('autor', 'J. R. R. Tolkien')])
+
+    def test_inicio_do_texto_primeiro(self):
+        """Testa que quem começa pelo termo vem antes de quem só tem uma palavra com ele"""
+        self.criar('Senhora', 'Machado de Assis')
+        self.assertEqual(
+            self.sugestoes('senhor'),
+            [('titulo', 'Senhora'), ('titulo', 'O Senhor dos Anéis')],
+        )
+        self.assertEqual(len(self.sugestoes('o', limite=1)), 1)
+
+    def test_sem_consultas_ao_banco(self):
+        """Testa que, com o índice montado, a consulta não toca no banco"""
+        self.sugestoes('hob')
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('livro-autocomplete'), {'q': 'hob'})
+        self.assertEqual(response.data, [{'tipo': 'titulo', 'texto': 'O Hobbit', 'livro_id': self.hobbit.id}])
+
+    def test_sinais_atualizam_o_indice(self):
+        """Testa que criar, editar e excluir livros atualiza o índice sem reconstrução"""
+        self.sugestoes('hob')
+        indice = autocomplete.obter_indice()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.criar('Duna', 'Frank Herbert')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hobbit.titulo = 'O Hobbit: Lá e de Volta Outra Vez'
+            self.hobbit.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.anel.delete()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.sugestoes('dun'), [('titulo', 'Duna')])
+            self.assertEqual(self.sugestoes('volta'), [('titulo', 'O Hobbit: Lá e de Volta Outra Vez')])
+            self.assertEqual(self.sugestoes('senhor'), [])
+            # O autor continua sugerido enquanto tiver algum livro.
+            self.assertEqual(self.sugestoes('tolk'), [('autor', 'J. R. R. Tolkien')])
+        self.assertIs(autocomplete.obter_indice(), indice)
+
+    def test_outro_processo_invalida_o_indice(self):
+        """Testa que uma mudança de geração no cache aplica só as alterações, sem reconstruir"""
+        self.sugestoes('hob')
+        indice = autocomplete.obter_indice()
+        cache.set(autocomplete.CHAVE_GERACAO, cache.get(autocomplete.CHAVE_GERACAO, 0) + 1, None)
+        Livro.objects.filter(pk=self.hobbit.pk).update(titulo='Hobbit Anotado', atualizado_em=timezone.now())
+        with mock.patch.object(autocomplete, 'construir_indice', side_effect=AssertionError('reconstruído')):
+            self.assertEqual(self.sugestoes('hob'), [('titulo', 'Hobbit Anotado')])
+        self.assertIs(autocomplete.obter_indice(), indice)
+
+    @override_settings(LIVROS_AUTOCOMPLETE_VERIFICAR_SEGUNDOS=0, LIVROS_CHANGES_MARGEM_SEGUNDOS=0)
+    def test_alteracoes_de_outro_processo_sem_cache_compartilhado(self):
+        """Testa que o índice confere o banco mesmo sem mudança de geração no cache"""
+        self.sugestoes('hob')
+        # Escritas de outro processo: sem sinais neste processo e sem tocar na geração.
+        Livro.objects.bulk_create([Livro(
+            titulo='Duna', autor='Frank Herbert', genero=self.genero, editora=self.editora,
+            isbn='9780000000099', numero_paginas=100, ano_publicacao=2000,
+        )])
+        LivroRemovido.objects.create(livro_id=self.hobbit.pk)
+        self.assertEqual(self.sugestoes('dun'), [('titulo', 'Duna')])
+        self.assertEqual(self.sugestoes('hob'), [])
+
+    def test_termo_vazio(self):
+        """Testa que sem termo não há sugestões"""
+        self.assertEqual(self.sugestoes(''), [])
+        self.assertEqual(self.sugestoes('  '), [])
+
+
+@override_settings(LIVROS_CHANGES_MARGEM_SEGUNDOS=0)
+class LivrosChangesTest(APITestCase):
+    """Testes para o feed de alterações do catálogo"""
+
+    def setUp(self):
+        self.fantasia = Genero.objects.create(nome="Fantasia")
+        self.terror = Genero.objects.create(nome="Terror")
+        self.editora = Editora.objects.create(nome="Editora Teste")
+        self.livros = [self.criar(f'Livro {i}', self.fantasia) for i in range(4)]
+
+    def criar(self, titulo, genero):
+        return Livro.objects.create(
+            titulo=titulo, autor='Autor', genero=genero, editora=self.editora, resumo='Resumo',
+            isbn=f'978{Livro.objects.count() + LivroRemovido.objects.count():010d}', numero_paginas=100, ano_publicacao=2000,
+        )
+
+    def feed(self, since=None, **params):
+        if since is not None:
+            params['since'] = since
+        response = self.client.get(reverse('livro-changes'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def sincronizar(self, since=None):
+        """Percorre os lotes até o fim; retorna (ids alterados, ids removidos, token)."""
+        alterados, removidos = [], []
+        while True:
+            dados = self.feed(since, limite=3)
+            alterados += [livro['id'] for livro in dados['alterados']]
+            removidos += dados['removidos']
+            since = dados['proximo']
+            if not dados['mais']:
+                return alterados, removidos, since
+
+    def test_sincronizacao_completa_em_lotes(self):
+        """Testa que, sem token, o feed entrega todo o catálogo em ordem de alteração"""
+        dados = self.feed(limite=3)
+        self.assertEqual(len(dados['alterados']), 3)
+        self.assertTrue(dados['mais'])
+        alterados, removidos, token = self.sincronizar()
+        self.assertEqual(alterados, [livro.id for livro in self.livros])
+        self.assertEqual(removidos, [])
+        self.assertEqual(self.feed(token), {'alterados': [], 'removidos': [], 'proximo': token, 'mais': False})
+
+    def test_somente_alteracoes_desde_o_token(self):
+        """Testa edições, exclusão pelo viewset e livros novos após o token"""
+        *_, token = self.sincronizar()
+        self.livros[1].titulo = 'Livro Editado'
+        self.livros[1].save()
+        response = self.client.delete(reverse('livro-detail', args=[self.livros[2].id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        novo = self.criar('Livro Novo', self.fantasia)
+
+        alterados, removidos, _ = self.sincronizar(token)
+        self.assertEqual(alterados, [self.livros[1].id, novo.id])
+        self.assertEqual(removidos, [self.livros[2].id])
+
+    def test_remocao_em_cascata(self):
+        """Testa que excluir gênero registra os livros removidos em cascata numa só query"""
+        assombrados = [self.criar('Casa Assombrada', self.terror), self.criar('Noite Escura', self.terror)]
+        *_, token = self.sincronizar()
+        with CaptureQueriesContext(connection) as contexto:
+            self.terror.delete()
+        inserts = [q for q in contexto.captured_queries
+                   if q['sql'].startswith('INSERT') and 'library_livroremovido' in q['sql']]
+        self.assertEqual(len(inserts), 1)
+        _, removidos, _ = self.sincronizar(token)
+        self.assertEqual(sorted(removidos), sorted(livro.id for livro in assombrados))
+
+    def test_renomear_editora_reenvia_livros(self):
+        """Testa que renomear a editora recoloca os livros dela no feed"""
+        *_, token = self.sincronizar()
+        self.editora.nome = 'Editora Renomeada'
+        self.editora.save()
+        alterados, _, _ = self.sincronizar(token)
+        self.assertEqual(sorted(alterados), sorted(livro.id for livro in self.livros))
+        self.assertEqual(self.feed(token)['alterados'][0]['editora'], 'Editora Renomeada')
+
+    def test_token_invalido_e_expirado(self):
+        """Testa 400 para token inválido e 410 para token além da retenção"""
+        response = self.client.get(reverse('livro-changes'), {'since': 'nao-e-um-token'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        antigo = codificar_token((timezone.now() - timedelta(days=365), 1))
+        response = self.client.get(reverse('livro-changes'), {'since': antigo})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+    def test_purge_book_tombstones(self):
+        """Testa a remoção dos registros de exclusão além da retenção"""
+        LivroRemovido.objects.create(livro_id=999, removido_em=timezone.now() - timedelta(days=365))
+        LivroRemovido.objects.create(livro_id=998)
+        call_command('purge_book_tombstones', stdout=StringIO())
+        self.assertEqual(list(LivroRemovido.objects.values_list('livro_id', flat=True)), [998])
+
+
+class RecuperacaoEmLoteTest(APITestCase):
+    """Testes para a recuperação em lote por ?ids="""
+
+    def setUp(self):
+        self.genero = Genero.objects.create(nome="Fantasia")
+        self.editora = Editora.objects.create(nome="Editora Teste")
+        self.livros = [
+            Livro.objects.create(
+                titulo=f'Livro {i}', autor='Autor', genero=self.genero, editora=self.editora,
+                resumo='Resumo', isbn=f'978{i:010d}', numero_paginas=100, ano_publicacao=2000,
+            )
+            for i in range(3)
+        ]
+
+    def test_ordem_pedida_e_ausentes(self):
+        """Testa que os livros vêm na ordem pedida, com os ids inexistentes em ausentes"""
+        a, b, c = (livro.id for livro in self.livros)
+        response = self.client.get(reverse('livro-list'), {'ids': f'{c},999,{a},{c}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([livro['id'] for livro in response.data['resultados']], [c, a])
+        self.assertEqual(response.data['resultados'][0]['genero'], 'Fantasia')
+        self.assertEqual(response.data['ausentes'], [999])
+
+    def test_uma_consulta(self):
+        """Testa que o lote é uma única consulta, já com gênero e editora"""
+        ids = ','.join(str(livro.id) for livro in self.livros)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('livro-list'), {'ids': ids})
+        self.assertEqual(len(response.data['resultados']), 3)
+
+    def test_generos_e_editoras(self):
+        """Testa o lote nos viewsets de gêneros e editoras"""
+        response = self.client.get(reverse('genero-list'), {'ids': f'{self.genero.id},999'})
+        self.assertEqual([genero['nome'] for genero in response.data['resultados']], ['Fantasia'])
+        self.assertEqual(response.data['ausentes'], [999])
+        response = self.client.get(reverse('editora-list'), {'ids': str(self.editora.id)})
+        self.assertEqual([editora['nome'] for editora in response.data['resultados']], ['Editora Teste'])
+
+    @override_settings(BATCH_IDS_MAX=2)
+    def test_limite_e_ids_invalidos(self):
+        """Testa 400 acima do limite de ids e para ids não numéricos"""
+        response = self.client.get(reverse('livro-list'), {'ids': '1,2,3'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('livro-list'), {'ids': '1,abc'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -4,7 +4,8 @@ from django.shortcuts import render
 from django.shortcuts import render
 from rest_framework import permissions, viewsets, status, filters
 from rest_framework.decorators import action
-from .models import Livro, Genero, Editora
+from .models import Livro, Genero, Editora, LivroRelacionado
+from django.shortcuts import get_object_or_404
 from rest_framework.response import Response
 from .serializers import LivroSerializer, GeneroSerializer, EditoraSerializer
 from django_filters.rest_framework import DjangoFilterBackend
@@ -18,10 +19,16 @@ from .models import Livro
 from .serializers import LivroSerializer
 from .pagination import StandardResultsSetPagination
 from .filters import LivroFilter
+from theka.lote_ids import PARAMETRO_IDS, RecuperacaoEmLoteMixin
+from theka.writer import EscritaSerializadaMixin
+from .alteracoes import TokenInvalido, alteracoes, codificar_token, decodificar_token, token_expirado
+from .autocomplete import sugerir
+from django.conf import settings
 
-class LivroViewSet(viewsets.ModelViewSet):
+class LivroViewSet(EscritaSerializadaMixin, RecuperacaoEmLoteMixin, viewsets.ModelViewSet):
     queryset = Livro.objects.all()
     serializer_class = LivroSerializer
+    lote_select_related = ('genero', 'editora')
     
     # CORREÇÃO: Configuração segura de filtros
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
@@ -91,13 +98,71 @@ class LivroViewSet(viewsets.ModelViewSet):
         livro_destaque = Livro.objects.all().order_by('-criado_em').first()
         serializer = self.get_serializer(livro_destaque)
         return Response(serializer.data)
+
+    @action(detail=True, methods=['get'], url_path='relacionados', url_name='relacionados')
+    def relacionados(self, request, pk=None):
+        """
+            Retorna os livros mais parecidos com este, da tabela de vizinhos
+            pré-calculada (ver library.similaridade).
+        """
+        vizinhos = list(
+            LivroRelacionado.objects.filter(livro_id=pk)
+            .select_related('relacionado__genero', 'relacionado__editora')
+            .order_by('posicao')
+        )
+        if not vizinhos:
+            get_object_or_404(Livro, pk=pk)
+        return Response([
+            {**self.get_serializer(vizinho.relacionado).data, 'similaridade': round(vizinho.similaridade, 4)}
+            for vizinho in vizinhos
+        ])
+
+    @action(detail=False, methods=['get'], url_path='autocomplete', url_name='autocomplete')
+    def autocomplete(self, request):
+        """
+            Sugestões de título e autor para o prefixo ``q``, servidas do
+            índice em memória (ver library.autocomplete), sem consultar o banco.
+            ``limite`` define quantas sugestões retornar.
+        """
+        return Response(sugerir(request.query_params.get('q', ''), request.query_params.get('limite')))
+
+    @action(detail=False, methods=['get'], url_path='changes', url_name='changes')
+    def changes(self, request):
+        """
+            Livros alterados e removidos desde o token ``since``, em lotes de
+            até ``limite``. ``proximo`` é o token da próxima chamada e ``mais``
+            indica se já há outro lote disponível. Sem ``since``, percorre o
+            catálogo inteiro (sincronização completa).
+        """
+        try:
+            posicao = decodificar_token(request.query_params.get('since'))
+        except TokenInvalido:
+            return Response({'since': 'Token inválido.'}, status=status.HTTP_400_BAD_REQUEST)
+        if token_expirado(posicao):
+            return Response(
+                {'detail': 'Token anterior à retenção das remoções; refaça a sincronização completa.'},
+                status=status.HTTP_410_GONE,
+            )
+
+        limite = request.query_params.get('limite', '')
+        limite = min(int(limite) if limite.isdigit() and int(limite) > 0 else settings.LIVROS_CHANGES_LOTE,
+                     settings.LIVROS_CHANGES_LOTE_MAX)
+        itens, proxima, mais = alteracoes(
+            posicao, limite, Livro.objects.select_related('genero', 'editora'),
+        )
+        return Response({
+            'alterados': self.get_serializer([valor for tipo, valor in itens if tipo == 'alterado'], many=True).data,
+            'removidos': [valor for tipo, valor in itens if tipo == 'removido'],
+            'proximo': codificar_token(proxima),
+            'mais': mais,
+        })
     
-class GeneroViewSet(viewsets.ModelViewSet):
+class GeneroViewSet(RecuperacaoEmLoteMixin, viewsets.ModelViewSet):
     queryset = Genero.objects.all()
     serializer_class = GeneroSerializer
     http_method_names = ['get', 'post', 'put', 'patch', 'delete']
 
-class EditoraViewSet(viewsets.ModelViewSet):
+class EditoraViewSet(RecuperacaoEmLoteMixin, viewsets.ModelViewSet):
     queryset = Editora.objects.all()
     serializer_class = EditoraSerializer
     http_method_names = ['get', 'post', 'put', 'patch', 'delete']
@@ -123,6 +188,8 @@ class EditoraViewSet(viewsets.ModelViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
     
     def list(self, request, *args, **kwargs):
+        if PARAMETRO_IDS in request.query_params:
+            return self.recuperar_em_lote(request)
         queryset = self.filter_queryset(self.get_queryset())
         page = self.paginate_queryset(queryset)
         if page is not None:
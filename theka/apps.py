@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+class ThekaConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'theka'
+
+    def ready(self):
+        from .db import configurar_sqlite
+
+        connection_created.connect(configurar_sqlite, dispatch_uid='theka.configurar_sqlite')
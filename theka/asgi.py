@@ -12,5 +12,12 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'theka.settings')
+# Ativa as rotas de leitura assíncronas (theka/urls_asgi.py).
+os.environ.setdefault('THEKA_ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
+
+# Monta na subida os índices em memória servidos sem acesso ao banco.
+from library.autocomplete import aquecer  # noqa: E402
+
+aquecer()
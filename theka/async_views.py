@@ -0,0 +1,131 @@
+"""
+Views assíncronas de leitura servidas pelo ``theka/asgi.py``.
+
+Sob ASGI, um ``ModelViewSet`` síncrono ocupa uma thread durante toda a
+requisição. As views daqui atendem o caminho comum das leituras (GET anônimo,
+JSON, paginação simples) com o ORM assíncrono e os mesmos serializers e
+paginadores dos viewsets, produzindo o mesmo payload. Qualquer caso fora desse
+caminho (outros métodos, filtros, busca, token, página inválida, 404,
+API navegável) é delegado à view síncrona original, resolvida em ``theka.urls``.
+"""
+import math
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.urls import resolve
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+URLCONF_SINCRONO = 'theka.urls'
+
+_renderer = JSONRenderer()
+
+
+async def delegar(request):
+    """Executa a view síncrona equivalente à URL requisitada."""
+    match = resolve(request.path_info, urlconf=URLCONF_SINCRONO)
+    request.resolver_match = match
+    return await sync_to_async(match.func)(request, *match.args, **match.kwargs)
+
+
+def resposta_json(data):
+    """Renderiza como o ``JSONRenderer`` do DRF, byte a byte."""
+    return HttpResponse(_renderer.render(data), content_type='application/json')
+
+
+def caminho_rapido(request, parametros=()):
+    """
+        Indica se a requisição pode ser atendida pela view assíncrona:
+        GET sem autenticação, resposta JSON e só parâmetros conhecidos.
+    """
+    return (
+        request.method == 'GET'
+        and 'HTTP_AUTHORIZATION' not in request.META
+        and 'text/html' not in request.META.get('HTTP_ACCEPT', '')
+        and set(request.GET) <= set(parametros)
+    )
+
+
+def view_assincrona(viewset, action):
+    """
+        Decorador que marca a view com o viewset e a action de origem
+        (rótulos de métricas e roteamento da réplica) e aplica o
+        fallback para a view síncrona.
+    """
+    def decorador(func):
+        async def view(request, *args, **kwargs):
+            response = await func(request, *args, **kwargs)
+            if response is None:
+                return await delegar(request)
+            return response
+
+        view.cls = viewset
+        view.actions = {'get': action}
+        view.__name__ = func.__name__
+        view.__doc__ = func.__doc__
+        return view
+    return decorador
+
+
+def list_assincrono(viewset, queryset=None):
+    """Cria a view assíncrona de ``list`` para o viewset."""
+    queryset = viewset.queryset if queryset is None else queryset
+    paginacao = viewset.pagination_class
+
+    @view_assincrona(viewset, 'list')
+    async def listar(request):
+        parametros = (paginacao.page_query_param, paginacao.page_size_query_param) if paginacao else ()
+        if not caminho_rapido(request, parametros):
+            return None
+
+        contexto = {'request': request}
+        if paginacao is None:
+            objetos = [obj async for obj in queryset.all()]
+            return resposta_json(viewset.serializer_class(objetos, many=True, context=contexto).data)
+
+        paginador = paginacao()
+        tamanho = paginador.get_page_size(Request(request))
+        numero = request.GET.get(paginador.page_query_param, '1')
+        if not numero.isdigit() or int(numero) < 1:
+            return None
+        numero = int(numero)
+
+        total = await queryset.acount()
+        paginas = max(1, math.ceil(total / tamanho))
+        if numero > paginas:
+            return None
+
+        inicio = (numero - 1) * tamanho
+        objetos = [obj async for obj in queryset.all()[inicio:inicio + tamanho]]
+        url = request.build_absolute_uri()
+        anterior = None
+        if numero > 1:
+            anterior = (remove_query_param(url, paginador.page_query_param) if numero == 2
+                        else replace_query_param(url, paginador.page_query_param, numero - 1))
+        proxima = replace_query_param(url, paginador.page_query_param, numero + 1) if numero < paginas else None
+
+        return resposta_json({
+            'count': total,
+            'next': proxima,
+            'previous': anterior,
+            'results': viewset.serializer_class(objetos, many=True, context=contexto).data,
+        })
+
+    return listar
+
+
+def retrieve_assincrono(viewset, queryset=None):
+    """Cria a view assíncrona de ``retrieve`` para o viewset."""
+    queryset = viewset.queryset if queryset is None else queryset
+
+    @view_assincrona(viewset, 'retrieve')
+    async def detalhar(request, pk):
+        if not caminho_rapido(request) or not pk.isdigit():
+            return None
+        instancia = await queryset.filter(pk=pk).afirst()
+        if instancia is None:
+            return None
+        return resposta_json(viewset.serializer_class(instancia, context={'request': request}).data)
+
+    return detalhar
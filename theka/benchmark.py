@@ -0,0 +1,72 @@
+"""
+Utilitários compartilhados pelos comandos de benchmark.
+"""
+import io
+import sys
+import time
+
+from django.db import connections
+
+
+def percentil(valores, p):
+    """Percentil ``p`` (0-100) pelo método do vizinho mais próximo."""
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    indice = min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))
+    return valores[indice]
+
+
+def environ_wsgi(caminho, query='', metodo='GET', corpo=b'', content_type='application/json'):
+    """Monta um environ WSGI mínimo para chamar o handler em processo."""
+    return {
+        'REQUEST_METHOD': metodo,
+        'PATH_INFO': caminho,
+        'QUERY_STRING': query,
+        'SCRIPT_NAME': '',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'REMOTE_ADDR': '127.0.0.1',
+        'HTTP_HOST': 'localhost',
+        'HTTP_ACCEPT': 'application/json',
+        'CONTENT_TYPE': content_type if corpo else '',
+        'CONTENT_LENGTH': str(len(corpo)),
+        'wsgi.input': io.BytesIO(corpo),
+        'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http',
+    }
+
+
+def requisitar_wsgi(app, caminho, query='', metodo='GET', corpo=b''):
+    """Executa a requisição no handler WSGI e retorna ``(latencia, status)``."""
+    status = []
+    inicio = time.perf_counter()
+    resposta = app(environ_wsgi(caminho, query, metodo, corpo), lambda s, h, exc_info=None: status.append(s))
+    b''.join(resposta)
+    resposta.close()
+    return time.perf_counter() - inicio, int(status[0].split(' ', 1)[0])
+
+
+class CapturaQueries:
+    """
+        Context manager que registra o SQL executado em todas as conexões
+        (inclusive a réplica), via ``execute_wrapper``.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self._wrappers = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrappers = [conexao.execute_wrapper(self) for conexao in connections.all()]
+        for wrapper in self._wrappers:
+            wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        for wrapper in reversed(self._wrappers):
+            wrapper.__exit__(*exc_info)
@@ -0,0 +1,50 @@
+"""
+Ajustes de conexão para o SQLite em produção.
+
+``configurar_sqlite`` é ligado ao sinal ``connection_created`` (ver
+``theka.apps``) e aplica os PRAGMAs de ``SQLITE_PRAGMAS`` a cada conexão nova.
+Como ``CONN_MAX_AGE`` mantém as conexões abertas entre requisições, o custo
+dessa configuração é pago uma vez por conexão e não por requisição.
+"""
+import re
+
+from django.conf import settings
+
+# PRAGMAs aceitos e a ordem em que são aplicados. journal_mode vem primeiro
+# porque mmap_size e synchronous dependem do modo de journal ativo.
+PRAGMAS_SUPORTADOS = (
+    'journal_mode',
+    'synchronous',
+    'busy_timeout',
+    'mmap_size',
+    'cache_size',
+    'temp_store',
+)
+_VALOR_RE = re.compile(r'^-?[A-Za-z0-9_]+$')
+
+
+def aplicar_pragmas(cursor, pragmas):
+    """
+        Executa os PRAGMAs informados em um cursor DB-API do SQLite.
+        Os valores não podem ser parametrizados, por isso são validados
+        antes de serem interpolados.
+    """
+    for nome in PRAGMAS_SUPORTADOS:
+        valor = pragmas.get(nome)
+        if valor is None or valor == '':
+            continue
+        valor = str(valor)
+        if not _VALOR_RE.match(valor):
+            raise ValueError(f'Valor inválido para PRAGMA {nome}: {valor!r}')
+        cursor.execute(f'PRAGMA {nome} = {valor}')
+
+
+def configurar_sqlite(sender, connection, **kwargs):
+    """Receptor de ``connection_created`` que aplica ``SQLITE_PRAGMAS``."""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', None)
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        aplicar_pragmas(cursor, pragmas)
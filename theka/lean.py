@@ -0,0 +1,58 @@
+"""
+Faixa enxuta de middlewares para as rotas da API.
+
+As rotas da API autenticam com JWT e nunca usam sessão, mensagens ou CSRF
+(o DRF já isenta suas views de CSRF). As subclasses abaixo mantêm o
+comportamento original apenas para os caminhos em ``FULL_STACK_PATH_PREFIXES``
+(o ``/admin/``) e simplesmente repassam a requisição nos demais, evitando
+carregar sessão, armazenar mensagens e processar CSRF a cada chamada da API.
+
+Clickjacking (``XFrameOptionsMiddleware``) e ``SecurityMiddleware`` ficam fora
+da faixa: rotas HTML fora do ``/admin/``, como o ``/docs/`` e a API navegável,
+precisam dos cabeçalhos, e acrescentá-los custa pouco.
+
+Por serem subclasses dos middlewares do Django, as verificações do admin
+(admin.E408-E410) continuam satisfeitas.
+"""
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.messages.middleware import MessageMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.middleware.csrf import CsrfViewMiddleware
+
+
+def precisa_stack_completo(request):
+    """Indica se a requisição passa pela pilha completa de middlewares."""
+    return request.path_info.startswith(settings.FULL_STACK_PATH_PREFIXES)
+
+
+class FaixaEnxutaMixin:
+    """Aplica o middleware apenas às rotas que precisam da pilha completa."""
+
+    def __call__(self, request):
+        if not precisa_stack_completo(request):
+            # Em modo assíncrono get_response devolve uma coroutine,
+            # que é aguardada por quem chamou este middleware.
+            return self.get_response(request)
+        return super().__call__(request)
+
+
+class LeanSessionMiddleware(FaixaEnxutaMixin, SessionMiddleware):
+    pass
+
+
+class LeanCsrfViewMiddleware(FaixaEnxutaMixin, CsrfViewMiddleware):
+
+    def process_view(self, request, callback, callback_args, callback_kwargs):
+        # process_view é chamado pelo handler diretamente, fora do __call__.
+        if not precisa_stack_completo(request):
+            return None
+        return super().process_view(request, callback, callback_args, callback_kwargs)
+
+
+class LeanAuthenticationMiddleware(FaixaEnxutaMixin, AuthenticationMiddleware):
+    pass
+
+
+class LeanMessageMiddleware(FaixaEnxutaMixin, MessageMiddleware):
+    pass
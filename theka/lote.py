@@ -0,0 +1,160 @@
+"""
+Endpoint composto ``POST /batch/``.
+
+A tela inicial do front dispara várias leituras em paralelo (novidades,
+destaque do mês, gêneros, estatísticas, contato, sobre nós), e cada uma paga
+middlewares, autenticação e roteamento. O ``/batch/`` recebe a lista de GETs::
+
+    {"requisicoes": ["/livros/novidades/", "/generos/?page=2", ...]}
+
+e os executa em processo, na ordem, pelo resolver de ``theka.urls``: o usuário
+é autenticado uma vez e repassado às sub-requisições, que usam a mesma conexão
+com o banco e não passam de novo pelos middlewares. A resposta traz, na mesma
+ordem, ``{"url", "status", "corpo"}`` de cada uma.
+
+Só as rotas da API listadas em ``BATCH_ROTAS_PERMITIDAS`` podem ser chamadas;
+admin, métricas, mídia e o próprio ``/batch/`` voltam com 403.
+
+O trabalho é limitado por ``BATCH_MAX_REQUISICOES`` (acima disso, 400) e por
+``BATCH_TEMPO_MAX_MS``: esgotado o tempo, as sub-requisições restantes não são
+executadas e voltam com status 503.
+"""
+import json
+import logging
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from drf_spectacular.utils import extend_schema
+from rest_framework import serializers, status
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .async_views import URLCONF_SINCRONO
+from .routers import requisicao_atual
+
+logger = logging.getLogger(__name__)
+
+
+def sub_requisicao(request, caminho, query, match):
+    """``HttpRequest`` GET para ``caminho`` com os headers e o usuário de ``request``."""
+    original = request._request
+    sub = HttpRequest()
+    sub.method = 'GET'
+    sub.path = sub.path_info = caminho
+    sub.META = {
+        **original.META,
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': caminho,
+        'QUERY_STRING': query,
+        'CONTENT_LENGTH': '',
+        'CONTENT_TYPE': '',
+        'HTTP_ACCEPT': 'application/json',
+    }
+    sub.GET = QueryDict(query)
+    sub.COOKIES = original.COOKIES
+    sub.resolver_match = match
+    # O DRF usa o usuário forçado no lugar dos autenticadores da view.
+    sub.user = request.user
+    sub._force_auth_user = request.user
+    sub._force_auth_token = request.auth
+    return sub
+
+
+def corpo_da_resposta(response):
+    if isinstance(response, Response):
+        return response.data
+    if getattr(response, 'streaming', False):
+        return None
+    if response.get('Content-Type', '').startswith('application/json'):
+        return json.loads(response.content)
+    return response.content.decode(response.charset or 'utf-8', 'replace')
+
+
+class BatchRequisicaoSerializer(serializers.Serializer):
+    requisicoes = serializers.ListField(
+        child=serializers.CharField(), help_text='Caminhos GET internos, como /livros/novidades/.',
+    )
+
+
+class BatchSubRespostaSerializer(serializers.Serializer):
+    url = serializers.CharField()
+    status = serializers.IntegerField()
+    corpo = serializers.JSONField()
+
+
+class BatchRespostaSerializer(serializers.Serializer):
+    respostas = BatchSubRespostaSerializer(many=True)
+
+
+def rota_permitida(caminho):
+    return caminho.lstrip('/').startswith(tuple(settings.BATCH_ROTAS_PERMITIDAS))
+
+
+class BatchView(APIView):
+    """
+        Executa em processo uma lista de requisições GET e retorna todas as
+        respostas de uma vez.
+    """
+    permission_classes = [AllowAny]
+
+    @extend_schema(
+        request=BatchRequisicaoSerializer,
+        responses={
+            200: BatchRespostaSerializer,
+            400: {'description': 'Corpo sem lista de URLs ou acima de BATCH_MAX_REQUISICOES'},
+        },
+    )
+    def post(self, request):
+        urls = request.data.get('requisicoes') if isinstance(request.data, dict) else None
+        if not isinstance(urls, list) or not all(isinstance(url, str) for url in urls):
+            return Response(
+                {'requisicoes': 'Informe uma lista de URLs (GET).'}, status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(urls) > settings.BATCH_MAX_REQUISICOES:
+            return Response(
+                {'requisicoes': f'No máximo {settings.BATCH_MAX_REQUISICOES} requisições por lote.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        request._request._somente_leitura = True
+        limite = time.perf_counter() + settings.BATCH_TEMPO_MAX_MS / 1000
+        respostas = []
+        for url in urls:
+            if time.perf_counter() > limite:
+                respostas.append(self.erro(url, status.HTTP_503_SERVICE_UNAVAILABLE,
+                                           'Tempo do lote esgotado antes desta requisição.'))
+                continue
+            respostas.append(self.executar(request, url))
+        return Response({'respostas': respostas})
+
+    @staticmethod
+    def erro(url, codigo, detalhe):
+        return {'url': url, 'status': codigo, 'corpo': {'detail': detalhe}}
+
+    def executar(self, request, url):
+        partes = urlsplit(url)
+        if partes.scheme or partes.netloc or not partes.path.startswith('/'):
+            return self.erro(url, status.HTTP_400_BAD_REQUEST, 'Use um caminho interno, como /livros/.')
+        if not rota_permitida(partes.path):
+            return self.erro(url, status.HTTP_403_FORBIDDEN, 'Rota não permitida em lotes.')
+        try:
+            match = resolve(partes.path, urlconf=URLCONF_SINCRONO)
+        except Resolver404:
+            return self.erro(url, status.HTTP_404_NOT_FOUND, 'Rota não encontrada.')
+        sub = sub_requisicao(request, partes.path, partes.query, match)
+        try:
+            with requisicao_atual(sub):
+                response = match.func(sub, *match.args, **match.kwargs)
+        except Http404:
+            return self.erro(url, status.HTTP_404_NOT_FOUND, 'Não encontrado.')
+        except PermissionDenied:
+            return self.erro(url, status.HTTP_403_FORBIDDEN, 'Acesso negado.')
+        except Exception:
+            logger.exception('Falha na sub-requisição %s do lote.', url)
+            return self.erro(url, status.HTTP_500_INTERNAL_SERVER_ERROR, 'Erro interno.')
+        return {'url': url, 'status': response.status_code, 'corpo': corpo_da_resposta(response)}
@@ -0,0 +1,61 @@
+"""
+Recuperação em lote por ids (``GET /<recurso>/?ids=1,2,3``).
+
+Clientes que guardam listas de ids (lista de desejos, histórico de leitura)
+buscam todos os objetos em uma requisição: uma única consulta ``IN`` com os
+``select_related`` do viewset, resultados na ordem pedida e os ids não
+encontrados em ``ausentes``. O número de ids é limitado por ``BATCH_IDS_MAX``.
+"""
+from django.conf import settings
+from rest_framework import status
+from rest_framework.response import Response
+
+PARAMETRO_IDS = 'ids'
+
+
+def separar_ids(valor):
+    """Ids inteiros de ``valor`` (separados por vírgula), sem repetição e na ordem dada."""
+    ids = []
+    for parte in valor.split(','):
+        parte = parte.strip()
+        if not parte:
+            continue
+        if not parte.isdigit():
+            raise ValueError(parte)
+        ids.append(int(parte))
+    return list(dict.fromkeys(ids))
+
+
+class RecuperacaoEmLoteMixin:
+    """
+        Mixin para viewsets: com ``?ids=`` o ``list`` responde
+        ``{"resultados": [...], "ausentes": [...]}`` em vez da listagem paginada.
+        ``lote_select_related`` lista as relações lidas pelo serializer.
+    """
+    lote_select_related = ()
+
+    def list(self, request, *args, **kwargs):
+        if PARAMETRO_IDS in request.query_params:
+            return self.recuperar_em_lote(request)
+        return super().list(request, *args, **kwargs)
+
+    def recuperar_em_lote(self, request):
+        try:
+            ids = separar_ids(request.query_params[PARAMETRO_IDS])
+        except ValueError as erro:
+            return Response({PARAMETRO_IDS: f'Id inválido: {erro}.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > settings.BATCH_IDS_MAX:
+            return Response(
+                {PARAMETRO_IDS: f'No máximo {settings.BATCH_IDS_MAX} ids por requisição.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        queryset = self.get_queryset().order_by()
+        if self.lote_select_related:
+            queryset = queryset.select_related(*self.lote_select_related)
+        por_id = {obj.pk: obj for obj in queryset.filter(pk__in=ids)} if ids else {}
+        encontrados = [por_id[pk] for pk in ids if pk in por_id]
+        return Response({
+            'resultados': self.get_serializer(encontrados, many=True).data,
+            'ausentes': [pk for pk in ids if pk not in por_id],
+        })
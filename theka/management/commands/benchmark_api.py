@@ -0,0 +1,153 @@
+import json
+import platform
+import time
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from library.models import Genero, Livro
+from theka.benchmark import CapturaQueries, percentil, requisitar_wsgi
+from theka.management.commands.seed_synthetic import DOMINIO_EMAIL, PREFIXO_USERNAME, SENHA_SINTETICA
+from theka.schema import versao_codigo
+from theka.throttling import baldes
+
+
+class Command(BaseCommand):
+    help = (
+        'Executa os cenários de benchmark da API em processo (sobre a base gerada '
+        'por seed_synthetic) e reporta vazão, p50/p95/p99 e queries por requisição. '
+        'O resultado é salvo em JSON para comparação entre commits.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requisicoes', type=int, default=200,
+                            help='Requisições medidas por cenário.')
+        parser.add_argument('--aquecimento', type=int, default=20)
+        parser.add_argument('--cenario', action='append', dest='cenarios',
+                            help='Executa apenas os cenários indicados (pode repetir).')
+        parser.add_argument('--saida', default=None,
+                            help='Arquivo JSON de saída (padrão: benchmarks/api-<versão>.json).')
+        parser.add_argument('--comparar', default=None,
+                            help='JSON de uma execução anterior para exibir as diferenças.')
+
+    def handle(self, *args, **options):
+        cenarios = self.montar_cenarios()
+        if options['cenarios']:
+            desconhecidos = set(options['cenarios']) - {nome for nome, *_ in cenarios}
+            if desconhecidos:
+                raise CommandError(f"Cenários desconhecidos: {', '.join(sorted(desconhecidos))}")
+            cenarios = [c for c in cenarios if c[0] in options['cenarios']]
+
+        # O throttling do login é medido à parte; aqui ele só distorceria o cenário.
+        taxas = {escopo: '1000000/s' for escopo in settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']}
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': taxas}):
+            app = WSGIHandler()
+            resultados = {}
+            self.stdout.write(
+                f"{'cenário':<22}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+                f"{'queries':>9}{'erros':>7}"
+            )
+            for nome, metodo, caminho, query, corpo in cenarios:
+                resultado = self.medir(app, metodo, caminho, query, corpo, options)
+                resultados[nome] = resultado
+                self.stdout.write(
+                    f"{nome:<22}{resultado['req_s']:>9.0f}{resultado['p50_ms']:>9.2f}"
+                    f"{resultado['p95_ms']:>9.2f}{resultado['p99_ms']:>9.2f}"
+                    f"{resultado['queries_por_requisicao']:>9.1f}{resultado['erros']:>7}"
+                )
+        baldes.limpar()
+
+        relatorio = {
+            'versao': versao_codigo(),
+            'executado_em': timezone.now().isoformat(),
+            'ambiente': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'banco': connections['default'].vendor,
+            },
+            'base': {
+                'livros': Livro.objects.count(),
+                'generos': Genero.objects.count(),
+            },
+            'requisicoes': options['requisicoes'],
+            'cenarios': resultados,
+        }
+        destino = Path(options['saida'] or Path(settings.BASE_DIR, 'benchmarks', f"api-{relatorio['versao']}.json"))
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        destino.write_text(json.dumps(relatorio, indent=2, ensure_ascii=False))
+        self.stdout.write(self.style.SUCCESS(f'Resultados salvos em {destino}'))
+
+        if options['comparar']:
+            self.comparar(json.loads(Path(options['comparar']).read_text()), relatorio)
+
+    def montar_cenarios(self):
+        """Lista de ``(nome, método, caminho, query, corpo)`` sobre a base atual."""
+        livro = Livro.objects.order_by('id').first()
+        if livro is None:
+            raise CommandError('Base vazia: execute manage.py seed_synthetic antes do benchmark.')
+        genero = Genero.objects.filter(livros__isnull=False).order_by('id').first()
+        termo = livro.titulo.split()[0]
+        login = json.dumps({
+            'email': f'{PREFIXO_USERNAME}0@{DOMINIO_EMAIL}',
+            'password': SENHA_SINTETICA,
+        }).encode()
+        # As chamadas da tela inicial do front, em um único /batch/.
+        home = json.dumps({'requisicoes': [
+            '/livros/novidades/', '/livros/destaque-mes/', '/generos/',
+            '/institucional/estatisticas-biblioteca/', '/institucional/contato/', '/institucional/sobrenos/',
+        ]}).encode()
+
+        return [
+            ('livros', 'GET', '/livros/', '', b''),
+            ('livros-filtro', 'GET', '/livros/', f'genero={genero.id}&ano_publicacao__gte=2000', b''),
+            ('livros-busca', 'GET', '/livros/', f'search={termo}', b''),
+            ('livros-ordenacao', 'GET', '/livros/', 'ordering=titulo', b''),
+            ('livro-detalhe', 'GET', f'/livros/{livro.id}/', '', b''),
+            ('novidades', 'GET', '/livros/novidades/', '', b''),
+            ('destaque-mes', 'GET', '/livros/destaque-mes/', '', b''),
+            ('token', 'POST', '/auth/token/', '', login),
+            ('home-batch', 'POST', '/batch/', '', home),
+            ('estatisticas', 'GET', '/institucional/estatisticas-biblioteca/', '', b''),
+            ('membros-equipe', 'GET', '/institucional/membros-equipe/', '', b''),
+            ('nossos-valores', 'GET', '/institucional/nossos-valores/', '', b''),
+            ('topicos', 'GET', '/institucional/topicos/', '', b''),
+        ]
+
+    def medir(self, app, metodo, caminho, query, corpo, options):
+        for _ in range(options['aquecimento']):
+            requisitar_wsgi(app, caminho, query, metodo, corpo)
+
+        latencias, erros = [], 0
+        with CapturaQueries() as captura:
+            inicio = time.perf_counter()
+            for _ in range(options['requisicoes']):
+                latencia, status = requisitar_wsgi(app, caminho, query, metodo, corpo)
+                latencias.append(latencia)
+                erros += status >= 400
+            duracao = time.perf_counter() - inicio
+
+        return {
+            'req_s': len(latencias) / duracao,
+            'p50_ms': percentil(latencias, 50) * 1000,
+            'p95_ms': percentil(latencias, 95) * 1000,
+            'p99_ms': percentil(latencias, 99) * 1000,
+            'queries_por_requisicao': len(captura.queries) / len(latencias),
+            'erros': erros,
+        }
+
+    def comparar(self, anterior, atual):
+        self.stdout.write(f"\nComparação com {anterior['versao']} (variação do p50 e das queries):")
+        for nome, resultado in atual['cenarios'].items():
+            base = anterior['cenarios'].get(nome)
+            if base is None:
+                self.stdout.write(f'{nome:<22}(novo cenário)')
+                continue
+            variacao = (resultado['p50_ms'] / base['p50_ms'] - 1) * 100 if base['p50_ms'] else 0.0
+            queries = resultado['queries_por_requisicao'] - base['queries_por_requisicao']
+            self.stdout.write(f'{nome:<22}{variacao:>+8.1f}% p50{queries:>+8.1f} queries')
@@ -0,0 +1,112 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.test.utils import override_settings
+
+from theka.benchmark import percentil, requisitar_wsgi
+
+ENDPOINTS_PADRAO = [
+    '/livros/',
+    '/livros/novidades/',
+    '/livros/destaque-mes/',
+    '/institucional/membros-equipe/',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara vazão e latência das leituras pelo caminho WSGI (viewsets '
+        'síncronos) e pelo ASGI (views assíncronas), em processo, sobre o banco configurado.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('endpoints', nargs='*', default=ENDPOINTS_PADRAO)
+        parser.add_argument('--requisicoes', type=int, default=2000,
+                            help='Requisições por endpoint e por caminho.')
+        parser.add_argument('--concorrencia', type=int, default=64,
+                            help='Requisições simultâneas.')
+
+    def handle(self, *args, **options):
+        wsgi = get_wsgi_application()
+        with override_settings(ROOT_URLCONF='theka.urls_asgi'):
+            asgi = get_asgi_application()
+
+        self.stdout.write(f"{'endpoint':<34}{'caminho':<8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'erros':>8}")
+        for endpoint in options['endpoints']:
+            caminho, _, query = endpoint.partition('?')
+            resultados = [
+                ('wsgi', self.medir_wsgi(wsgi, caminho, query, options)),
+            ]
+            with override_settings(ROOT_URLCONF='theka.urls_asgi'):
+                resultados.append(('asgi', asyncio.run(self.medir_asgi(asgi, caminho, query, options))))
+
+            for nome, (duracao, latencias, erros) in resultados:
+                self.stdout.write(
+                    f"{endpoint:<34}{nome:<8}{len(latencias) / duracao:>10.0f}"
+                    f"{percentil(latencias, 50) * 1000:>10.2f}"
+                    f"{percentil(latencias, 99) * 1000:>10.2f}{erros:>8}"
+                )
+
+    def medir_wsgi(self, app, caminho, query, options):
+        def requisitar(_):
+            latencia, status = requisitar_wsgi(app, caminho, query)
+            return latencia, status == 200
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concorrencia']) as executor:
+            resultados = list(executor.map(requisitar, range(options['requisicoes'])))
+        duracao = time.perf_counter() - inicio
+        return duracao, [lat for lat, _ in resultados], sum(1 for _, ok in resultados if not ok)
+
+    async def medir_asgi(self, app, caminho, query, options):
+        latencias, erros = [], 0
+        restantes = options['requisicoes']
+
+        async def requisitar():
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': 'GET',
+                'scheme': 'http',
+                'path': caminho,
+                'raw_path': caminho.encode(),
+                'query_string': query.encode(),
+                'root_path': '',
+                'headers': [(b'host', b'localhost'), (b'accept', b'application/json')],
+                'client': ('127.0.0.1', 50000),
+                'server': ('localhost', 80),
+            }
+            mensagens = []
+            corpo_enviado = False
+
+            async def receive():
+                nonlocal corpo_enviado
+                if not corpo_enviado:
+                    corpo_enviado = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                # Cliente nunca desconecta; o Django cancela esta espera ao responder.
+                await asyncio.Event().wait()
+
+            async def send(mensagem):
+                mensagens.append(mensagem)
+
+            inicio = time.perf_counter()
+            await app(scope, receive, send)
+            return time.perf_counter() - inicio, mensagens[0]['status'] == 200
+
+        async def trabalhador():
+            nonlocal restantes, erros
+            while restantes > 0:
+                restantes -= 1
+                latencia, ok = await requisitar()
+                latencias.append(latencia)
+                erros += not ok
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(trabalhador() for _ in range(options['concorrencia'])))
+        return time.perf_counter() - inicio, latencias, erros
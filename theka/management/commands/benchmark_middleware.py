@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from theka.benchmark import percentil, requisitar_wsgi
+
+# Pilha original do projeto, com todos os middlewares em todas as rotas.
+MIDDLEWARE_COMPLETO = {
+    'theka.lean.LeanSessionMiddleware': 'django.contrib.sessions.middleware.SessionMiddleware',
+    'theka.lean.LeanCsrfViewMiddleware': 'django.middleware.csrf.CsrfViewMiddleware',
+    'theka.lean.LeanAuthenticationMiddleware': 'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'theka.lean.LeanMessageMiddleware': 'django.contrib.messages.middleware.MessageMiddleware',
+    'theka.lean.LeanXFrameOptionsMiddleware': 'django.middleware.clickjacking.XFrameOptionsMiddleware',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede o custo por requisição da pilha de middlewares completa e da '
+        'faixa enxuta da API, em processo, sobre um endpoint leve.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', default='/institucional/contato/')
+        parser.add_argument('--requisicoes', type=int, default=3000)
+
+    def handle(self, *args, **options):
+        completo = [MIDDLEWARE_COMPLETO.get(nome, nome) for nome in settings.MIDDLEWARE]
+        cenarios = [('pilha completa', completo), ('faixa enxuta', settings.MIDDLEWARE)]
+
+        resultados = {}
+        self.stdout.write(f"{'cenário':<18}{'média µs':>12}{'p50 µs':>10}{'p99 µs':>10}")
+        for nome, middleware in cenarios:
+            with override_settings(MIDDLEWARE=middleware):
+                app = WSGIHandler()
+                for _ in range(50):  # aquecimento
+                    requisitar_wsgi(app, options['endpoint'])
+                latencias = [requisitar_wsgi(app, options['endpoint'])[0]
+                             for _ in range(options['requisicoes'])]
+
+            media = sum(latencias) / len(latencias) * 1e6
+            resultados[nome] = media
+            self.stdout.write(
+                f"{nome:<18}{media:>12.1f}{percentil(latencias, 50) * 1e6:>10.1f}"
+                f"{percentil(latencias, 99) * 1e6:>10.1f}"
+            )
+
+        economia = resultados['pilha completa'] - resultados['faixa enxuta']
+        self.stdout.write(self.style.SUCCESS(f'Overhead removido por requisição: {economia:.1f} µs'))
@@ -0,0 +1,125 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from theka.benchmark import percentil
+from theka.db import aplicar_pragmas
+
+SCHEMA = """
+    CREATE TABLE livro (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        titulo VARCHAR(255) NOT NULL,
+        autor VARCHAR(255) NOT NULL,
+        resumo TEXT NOT NULL,
+        criado_em REAL NOT NULL
+    )
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede leituras sob escritas concorrentes no SQLite com a configuração '
+        'padrão e com SQLITE_PRAGMAS, em bancos temporários.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duracao', type=float, default=5.0,
+                            help='Segundos de carga para cada cenário.')
+        parser.add_argument('--leitores', type=int, default=4,
+                            help='Número de threads de leitura.')
+        parser.add_argument('--linhas', type=int, default=5000,
+                            help='Linhas carregadas antes da medição.')
+
+    def handle(self, *args, **options):
+        cenarios = [
+            ('padrão (rollback journal)', {'busy_timeout': 5000}),
+            ('SQLITE_PRAGMAS', settings.SQLITE_PRAGMAS),
+        ]
+        self.stdout.write(
+            f"{'cenário':<28}{'leituras/s':>12}{'p50 ms':>10}{'p99 ms':>10}"
+            f"{'escritas/s':>12}{'erros':>8}"
+        )
+        for nome, pragmas in cenarios:
+            resultado = self.executar(pragmas, options)
+            self.stdout.write(
+                f"{nome:<28}{resultado['leituras_s']:>12.0f}{resultado['p50_ms']:>10.2f}"
+                f"{resultado['p99_ms']:>10.2f}{resultado['escritas_s']:>12.0f}"
+                f"{resultado['erros']:>8}"
+            )
+
+    def executar(self, pragmas, options):
+        with tempfile.TemporaryDirectory() as diretorio:
+            caminho = os.path.join(diretorio, 'bench.sqlite3')
+            conexao = self.conectar(caminho, pragmas)
+            conexao.execute(SCHEMA)
+            conexao.executemany(
+                'INSERT INTO livro (titulo, autor, resumo, criado_em) VALUES (?, ?, ?, ?)',
+                [(f'Livro {i}', f'Autor {i % 100}', 'Resumo ' * 20, time.time())
+                 for i in range(options['linhas'])],
+            )
+            conexao.commit()
+            conexao.close()
+
+            parar = threading.Event()
+            latencias, erros, escritas = [], [0], [0]
+            lock = threading.Lock()
+
+            def leitor():
+                con = self.conectar(caminho, pragmas)
+                locais = []
+                while not parar.is_set():
+                    inicio = time.perf_counter()
+                    try:
+                        con.execute(
+                            'SELECT id, titulo, autor FROM livro ORDER BY criado_em DESC LIMIT 10'
+                        ).fetchall()
+                        locais.append(time.perf_counter() - inicio)
+                    except sqlite3.OperationalError:
+                        with lock:
+                            erros[0] += 1
+                con.close()
+                with lock:
+                    latencias.extend(locais)
+
+            def escritor():
+                con = self.conectar(caminho, pragmas)
+                while not parar.is_set():
+                    try:
+                        con.execute(
+                            'INSERT INTO livro (titulo, autor, resumo, criado_em) VALUES (?, ?, ?, ?)',
+                            ('Novo', 'Autor', 'Resumo ' * 20, time.time()),
+                        )
+                        con.commit()
+                        escritas[0] += 1
+                    except sqlite3.OperationalError:
+                        with lock:
+                            erros[0] += 1
+                con.close()
+
+            threads = [threading.Thread(target=leitor) for _ in range(options['leitores'])]
+            threads.append(threading.Thread(target=escritor))
+            for thread in threads:
+                thread.start()
+            time.sleep(options['duracao'])
+            parar.set()
+            for thread in threads:
+                thread.join()
+
+        return {
+            'leituras_s': len(latencias) / options['duracao'],
+            'p50_ms': percentil(latencias, 50) * 1000,
+            'p99_ms': percentil(latencias, 99) * 1000,
+            'escritas_s': escritas[0] / options['duracao'],
+            'erros': erros[0],
+        }
+
+    @staticmethod
+    def conectar(caminho, pragmas):
+        conexao = sqlite3.connect(caminho, timeout=5, check_same_thread=False)
+        aplicar_pragmas(conexao.cursor(), pragmas)
+        return conexao
@@ -0,0 +1,156 @@
+import os
+import shutil
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import FileField
+
+from library.models import ArquivoMidia
+from theka.storage import eh_blob
+
+APPS_COM_MIDIA = ('library', 'institucional')
+
+
+def campos_de_midia():
+    """``[(model, nome_do_campo)]`` de todos os FileField/ImageField dos apps com mídia."""
+    return [
+        (model, campo.name)
+        for app in APPS_COM_MIDIA
+        for model in apps.get_app_config(app).get_models()
+        for campo in model._meta.get_fields()
+        if isinstance(campo, FileField)
+    ]
+
+
+def percorrer(raiz, ignorar):
+    """``DirEntry`` de todos os arquivos sob ``raiz`` (os.scandir, sem recursão em Python)."""
+    pendentes = [raiz]
+    while pendentes:
+        with os.scandir(pendentes.pop()) as entradas:
+            for entrada in entradas:
+                if entrada.is_dir(follow_symlinks=False):
+                    if os.path.normpath(entrada.path) not in ignorar:
+                        pendentes.append(entrada.path)
+                elif entrada.is_file(follow_symlinks=False):
+                    yield entrada
+
+
+class Command(BaseCommand):
+    help = (
+        'Remove (ou move para a quarentena) os arquivos de MEDIA_ROOT que nenhum '
+        'campo de imagem de library e institucional referencia, em lotes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Apenas lista e soma o que seria removido.')
+        parser.add_argument('--quarentena', nargs='?', const=settings.MEDIA_QUARENTENA, default=None,
+                            help='Move os arquivos para este diretório em vez de apagá-los '
+                                 '(padrão: MEDIA_QUARENTENA).')
+        parser.add_argument('--lote', type=int, default=500,
+                            help='Arquivos verificados de novo no banco e removidos por vez.')
+        parser.add_argument('--idade-minima', type=int, default=3600,
+                            help='Segundos desde a última modificação para um arquivo ser elegível '
+                                 '(protege uploads em andamento).')
+        parser.add_argument('--chunk', type=int, default=2000,
+                            help='Linhas por leitura ao percorrer as referências.')
+
+    def handle(self, *args, **options):
+        raiz = os.path.normpath(settings.MEDIA_ROOT)
+        if not os.path.isdir(raiz):
+            raise CommandError(f'MEDIA_ROOT não existe: {raiz}')
+        quarentena = options['quarentena']
+        if quarentena and os.path.normpath(quarentena) == raiz:
+            raise CommandError('A quarentena não pode ser o próprio MEDIA_ROOT.')
+
+        self.campos = campos_de_midia()
+        referenciados = self.referencias(options['chunk'])
+        limite = time.time() - options['idade_minima']
+        ignorar = {os.path.normpath(quarentena)} if quarentena else set()
+
+        verificados = removidos = liberados = 0
+        lote = []
+        for entrada in percorrer(raiz, ignorar):
+            verificados += 1
+            nome = os.path.relpath(entrada.path, raiz).replace(os.sep, '/')
+            if nome in referenciados:
+                continue
+            info = entrada.stat(follow_symlinks=False)
+            if info.st_mtime > limite:
+                continue
+            lote.append((nome, entrada.path, info.st_size))
+            if len(lote) >= options['lote']:
+                quantidade, tamanho = self.processar(lote, quarentena, options['dry_run'], limite)
+                removidos += quantidade
+                liberados += tamanho
+                lote = []
+        if lote:
+            quantidade, tamanho = self.processar(lote, quarentena, options['dry_run'], limite)
+            removidos += quantidade
+            liberados += tamanho
+
+        acao = 'seriam removidos' if options['dry_run'] else (
+            f'movidos para {quarentena}' if quarentena else 'removidos'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{verificados} arquivos verificados, {len(referenciados)} referenciados; '
+            f'{removidos} sem referência {acao} ({liberados} bytes, {liberados / 2 ** 20:.1f} MiB).'
+        ))
+
+    def referencias(self, chunk):
+        """Nomes referenciados por algum campo de mídia, lidos em streaming."""
+        nomes = set()
+        for model, campo in self.campos:
+            valores = (
+                model._default_manager.exclude(**{f'{campo}__isnull': True}).exclude(**{campo: ''})
+                .order_by().values_list(campo, flat=True)
+            )
+            nomes.update(os.path.normpath(nome).replace(os.sep, '/') for nome in valores.iterator(chunk_size=chunk))
+        return nomes
+
+    def processar(self, lote, quarentena, dry_run, limite):
+        """
+            Confirma no banco que os nomes do lote continuam sem referência
+            (podem ter ganhado uma desde a leitura inicial) e os remove. Os
+            blobs saem por ``apagar_se_antigo``, que confere de novo o mtime
+            depois de tirá-los do lugar: um upload idêntico pode tê-los
+            reaproveitado depois da varredura.
+        """
+        nomes = [nome for nome, _, _ in lote]
+        ainda_usados = set()
+        for model, campo in self.campos:
+            ainda_usados.update(
+                model._default_manager.filter(**{f'{campo}__in': nomes}).values_list(campo, flat=True)
+            )
+
+        removidos, liberados = [], 0
+        for nome, caminho, tamanho in lote:
+            if nome in ainda_usados:
+                continue
+            if dry_run:
+                self.stdout.write(f'  {nome} ({tamanho} bytes)')
+            elif eh_blob(nome):
+                try:
+                    if not default_storage.apagar_se_antigo(nome, limite, quarentena):
+                        continue
+                except FileNotFoundError:
+                    continue
+            else:
+                try:
+                    if quarentena:
+                        destino = os.path.join(quarentena, nome)
+                        os.makedirs(os.path.dirname(destino), exist_ok=True)
+                        shutil.move(caminho, destino)
+                    else:
+                        os.unlink(caminho)
+                except FileNotFoundError:
+                    continue
+            removidos.append(nome)
+            liberados += tamanho
+
+        if removidos and not dry_run:
+            ArquivoMidia.objects.filter(nome__in=removidos).delete()
+        return len(removidos), liberados
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from theka.schema import FORMATOS, caminho_schema, gerar_schema, versao_codigo
+
+
+class Command(BaseCommand):
+    help = 'Gera o schema OpenAPI da versão atual do código em SCHEMA_CACHE_DIR.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Gera novamente mesmo se a versão atual já existir.')
+
+    def handle(self, *args, **options):
+        versao = versao_codigo()
+        arquivos = [caminho_schema(versao, formato) for formato in FORMATOS]
+        if not options['force'] and all(arquivo.exists() for arquivo in arquivos):
+            self.stdout.write(f'Schema da versão {versao} já existe.')
+            return
+
+        gerar_schema(versao)
+        for arquivo in arquivos:
+            self.stdout.write(self.style.SUCCESS(f'Schema gravado em {arquivo}'))
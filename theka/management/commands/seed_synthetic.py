@@ -0,0 +1,200 @@
+import math
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from institucional.models import (
+    Contato,
+    EstatisticasBiblioteca,
+    MembrosEquipe,
+    NossaHistoria,
+    NossosValores,
+    SobreNos,
+    recalcular_total_livros,
+    topicos,
+)
+from library.models import Editora, Genero, Livro
+from users.provisioning import inserir_usuarios
+
+# Marcas dos registros sintéticos, usadas também pelo --limpar.
+PREFIXO_ISBN = '979-99-'
+PREFIXO_USERNAME = 'sintetico'
+DOMINIO_EMAIL = 'theka.test'
+SENHA_SINTETICA = 'Sintetico123!'
+
+GENEROS = [
+    'Romance', 'Fantasia', 'Ficção Científica', 'Suspense', 'Terror', 'Biografia',
+    'História', 'Poesia', 'Autoajuda', 'Infantil', 'Juvenil', 'Drama', 'Aventura',
+    'Policial', 'Filosofia', 'Ciências', 'Tecnologia', 'Negócios', 'Religião',
+    'Culinária', 'Viagem', 'Arte', 'Quadrinhos', 'Contos', 'Crônicas', 'Ensaios',
+    'Educação', 'Psicologia', 'Política', 'Clássicos',
+]
+NOMES = [
+    'Ana', 'Bruno', 'Carla', 'Daniel', 'Eduarda', 'Felipe', 'Gabriela', 'Henrique',
+    'Isabela', 'João', 'Larissa', 'Marcos', 'Natália', 'Otávio', 'Paula', 'Rafael',
+    'Sofia', 'Tiago', 'Vitória', 'Lucas', 'Mariana', 'Pedro', 'Beatriz', 'Gustavo',
+]
+SOBRENOMES = [
+    'Silva', 'Santos', 'Oliveira', 'Souza', 'Rodrigues', 'Ferreira', 'Alves', 'Pereira',
+    'Lima', 'Gomes', 'Costa', 'Ribeiro', 'Martins', 'Carvalho', 'Almeida', 'Lopes',
+    'Soares', 'Fernandes', 'Vieira', 'Barbosa', 'Rocha', 'Dias', 'Nascimento', 'Andrade',
+]
+PALAVRAS = (
+    'sombra luz mar tempo casa noite segredo jardim cidade caminho memória vento '
+    'destino sonho rio estrela silêncio fogo terra céu janela espelho viagem amor '
+    'guerra ilha floresta porto carta livro voz verão inverno chave ponte horizonte'
+).split()
+
+
+def pesos_zipf(n, s=1.1):
+    """Pesos de uma distribuição de Zipf: poucos itens concentram a maioria."""
+    return [1 / (posicao ** s) for posicao in range(1, n + 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera dados sintéticos (livros, gêneros, editoras, usuários e conteúdo '
+        'institucional) com distribuições realistas, para os benchmarks.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--livros', type=int, default=10000)
+        parser.add_argument('--generos', type=int, default=len(GENEROS))
+        parser.add_argument('--editoras', type=int, default=200)
+        parser.add_argument('--usuarios', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=42,
+                            help='Semente do gerador, para repetir a mesma base.')
+        parser.add_argument('--lote', type=int, default=1000)
+        parser.add_argument('--limpar', action='store_true',
+                            help='Remove os dados sintéticos de execuções anteriores antes de gerar.')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.lote = options['lote']
+
+        with transaction.atomic():
+            if options['limpar']:
+                self.limpar()
+            generos = self.gerar_generos(options['generos'])
+            editoras = self.gerar_editoras(options['editoras'])
+            livros = self.gerar_livros(options['livros'], generos, editoras)
+            self.gerar_institucional()
+            recalcular_total_livros()
+        usuarios = self.gerar_usuarios(options['usuarios'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{livros} livros, {len(generos)} gêneros, {len(editoras)} editoras e '
+            f'{usuarios} usuários gerados (senha dos usuários: {SENHA_SINTETICA}).'
+        ))
+
+    def limpar(self):
+        Livro.objects.filter(isbn__startswith=PREFIXO_ISBN).delete()
+        User.objects.filter(username__startswith=PREFIXO_USERNAME, email__endswith=f'@{DOMINIO_EMAIL}').delete()
+
+    def gerar_generos(self, quantidade):
+        nomes = GENEROS[:quantidade] + [f'Gênero {i}' for i in range(len(GENEROS), quantidade)]
+        Genero.objects.bulk_create([Genero(nome=nome) for nome in nomes], ignore_conflicts=True)
+        por_nome = {genero.nome: genero for genero in Genero.objects.filter(nome__in=nomes)}
+        return [por_nome[nome] for nome in nomes]
+
+    def gerar_editoras(self, quantidade):
+        nomes = [f'Editora {SOBRENOMES[i % len(SOBRENOMES)]} {i + 1}' for i in range(quantidade)]
+        Editora.objects.bulk_create(
+            [Editora(nome=nome, email=f'contato{i}@editora.{DOMINIO_EMAIL}') for i, nome in enumerate(nomes)],
+            ignore_conflicts=True,
+        )
+        por_nome = {editora.nome: editora for editora in Editora.objects.filter(nome__in=nomes)}
+        return [por_nome[nome] for nome in nomes]
+
+    def gerar_livros(self, quantidade, generos, editoras):
+        rng = self.rng
+        ano_atual = timezone.now().year
+        agora = timezone.now()
+        autores = [
+            f'{rng.choice(NOMES)} {rng.choice(SOBRENOMES)} {rng.choice(SOBRENOMES)}'
+            for _ in range(max(1, quantidade // 4))
+        ]
+        pesos_generos = pesos_zipf(len(generos))
+        pesos_editoras = pesos_zipf(len(editoras))
+        pesos_autores = pesos_zipf(len(autores), s=0.9)
+        inicio = Livro.objects.filter(isbn__startswith=PREFIXO_ISBN).count()
+        sorteio_generos = rng.choices(generos, pesos_generos, k=quantidade)
+        sorteio_editoras = rng.choices(editoras, pesos_editoras, k=quantidade)
+        sorteio_autores = rng.choices(autores, pesos_autores, k=quantidade)
+
+        livros = []
+        for n, i in enumerate(range(inicio, inicio + quantidade)):
+            titulo = ' '.join(rng.choices(PALAVRAS, k=rng.randint(1, 4))).capitalize()
+            livros.append(Livro(
+                titulo=f'{titulo} {i}',
+                # Mediana de ~270 páginas, com cauda longa.
+                numero_paginas=min(1500, max(40, int(rng.lognormvariate(math.log(270), 0.45)))),
+                isbn=f'{PREFIXO_ISBN}{i:09d}',
+                autor=sorteio_autores[n],
+                # Acervo concentrado em publicações recentes.
+                ano_publicacao=max(1800, ano_atual - int(rng.expovariate(1 / 15))),
+                editora=sorteio_editoras[n],
+                genero=sorteio_generos[n],
+                resumo=' '.join(rng.choices(PALAVRAS, k=rng.randint(20, 80))).capitalize() + '.',
+            ))
+        Livro.objects.bulk_create(livros, batch_size=self.lote)
+
+        # auto_now_add ignora valores explícitos: espalha o criado_em pelos
+        # últimos dois anos depois da inserção.
+        criados = list(Livro.objects.filter(isbn__startswith=PREFIXO_ISBN).order_by('id')[inicio:])
+        for livro in criados:
+            livro.criado_em = agora - timedelta(seconds=rng.randint(0, 2 * 365 * 86400))
+        Livro.objects.bulk_update(criados, ['criado_em'], batch_size=self.lote)
+        return len(criados)
+
+    def gerar_institucional(self):
+        if not MembrosEquipe.objects.exists():
+            MembrosEquipe.objects.bulk_create([
+                MembrosEquipe(nome=f'{NOMES[i]} {SOBRENOMES[i]}', cargo=cargo)
+                for i, cargo in enumerate(['Diretora', 'Bibliotecário', 'Curadora', 'Desenvolvedor',
+                                           'Designer', 'Atendimento'])
+            ])
+        if not NossosValores.objects.exists():
+            NossosValores.objects.bulk_create([
+                NossosValores(valor=valor, descricao=f'Compromisso com {valor.lower()}.')
+                for valor in ['Leitura', 'Acesso', 'Comunidade', 'Diversidade', 'Memória']
+            ])
+        topicos.objects.bulk_create(
+            [topicos(nome=nome) for nome in GENEROS[:10]], ignore_conflicts=True,
+        )
+        if not Contato.objects.exists():
+            Contato.objects.create(telefone='(84) 3200-0000', site=f'https://{DOMINIO_EMAIL}')
+        if not SobreNos.objects.exists():
+            sobre = SobreNos.objects.create(
+                descricao='Biblioteca digital comunitária.',
+                nossa_historia=NossaHistoria.objects.create(descricao='Fundada por leitores.'),
+                estatisticas_biblioteca=EstatisticasBiblioteca.objects.get_or_create(id=1)[0],
+            )
+            sobre.topicos.set(topicos.objects.all())
+            sobre.membros_equipe.set(MembrosEquipe.objects.all())
+            sobre.nossos_valores.set(NossosValores.objects.all())
+
+    def gerar_usuarios(self, quantidade):
+        inicio = User.objects.filter(username__startswith=PREFIXO_USERNAME).count()
+        # Uma senha conhecida para todos, hasheada uma única vez, para que o
+        # benchmark possa exercitar o login.
+        senha = make_password(SENHA_SINTETICA)
+        total = 0
+        for bloco in range(inicio, inicio + quantidade, self.lote):
+            usuarios = []
+            for i in range(bloco, min(bloco + self.lote, inicio + quantidade)):
+                nome, sobrenome = self.rng.choice(NOMES), self.rng.choice(SOBRENOMES)
+                usuarios.append(User(
+                    username=f'{PREFIXO_USERNAME}{i}',
+                    email=f'{PREFIXO_USERNAME}{i}@{DOMINIO_EMAIL}',
+                    first_name=nome,
+                    last_name=sobrenome,
+                    password=senha,
+                ))
+            total += inserir_usuarios(usuarios)
+        return total
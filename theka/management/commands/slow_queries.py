@@ -0,0 +1,78 @@
+import glob
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from theka.slow_queries import fingerprint_sql, normalizar_sql
+
+
+class Command(BaseCommand):
+    help = 'Agrupa o log de queries lentas por fingerprint do SQL normalizado.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--arquivo', default=settings.SLOW_QUERY_LOG,
+                            help='Log JSONL a ser lido (os arquivos rotacionados também são lidos).')
+        parser.add_argument('--limite', type=int, default=20,
+                            help='Número máximo de grupos exibidos.')
+        parser.add_argument('--json', action='store_true',
+                            help='Emite o relatório em JSON em vez de texto.')
+
+    def handle(self, *args, **options):
+        arquivos = sorted(glob.glob(options['arquivo'] + '*'))
+        if not arquivos:
+            raise CommandError(f"Nenhum log encontrado em {options['arquivo']}.")
+
+        grupos = self.agrupar(arquivos)
+        relatorio = sorted(grupos.values(), key=lambda g: g['total_ms'], reverse=True)
+        relatorio = relatorio[:options['limite']]
+
+        if options['json']:
+            self.stdout.write(json.dumps(relatorio, indent=2, ensure_ascii=False))
+            return
+
+        for grupo in relatorio:
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"[{grupo['fingerprint']}] {grupo['ocorrencias']}x  "
+                f"total {grupo['total_ms']:.1f} ms  média {grupo['media_ms']:.1f} ms  "
+                f"máx {grupo['max_ms']:.1f} ms"
+            ))
+            self.stdout.write(f"  sql:   {grupo['sql']}")
+            self.stdout.write(f"  views: {', '.join(grupo['views'])}")
+            for linha in grupo['plano']:
+                estilo = self.style.WARNING if self._scan_sem_indice(linha) else str
+                self.stdout.write(estilo(f'  plano: {linha}'))
+
+    def agrupar(self, arquivos):
+        grupos = defaultdict(lambda: {
+            'ocorrencias': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'views': set(), 'plano': [],
+        })
+        for caminho in arquivos:
+            with open(caminho, encoding='utf-8') as arquivo:
+                for linha in arquivo:
+                    try:
+                        registro = json.loads(linha)
+                    except json.JSONDecodeError:
+                        continue
+                    fingerprint = fingerprint_sql(registro['sql'])
+                    grupo = grupos[fingerprint]
+                    grupo['fingerprint'] = fingerprint
+                    grupo['sql'] = normalizar_sql(registro['sql'])
+                    grupo['ocorrencias'] += 1
+                    grupo['total_ms'] += registro['duracao_ms']
+                    grupo['views'].add(f"{registro['view']}.{registro['action']}")
+                    # Guarda o plano da execução mais lenta do grupo.
+                    if registro['duracao_ms'] >= grupo['max_ms']:
+                        grupo['max_ms'] = registro['duracao_ms']
+                        grupo['plano'] = registro.get('plano', [])
+
+        for grupo in grupos.values():
+            grupo['media_ms'] = grupo['total_ms'] / grupo['ocorrencias']
+            grupo['views'] = sorted(grupo['views'])
+        return grupos
+
+    @staticmethod
+    def _scan_sem_indice(linha):
+        """Linhas do plano com SCAN completo indicam um possível índice faltando."""
+        return 'SCAN' in linha and 'USING' not in linha and 'INDEX' not in linha
@@ -0,0 +1,51 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = 'Copia o banco SQLite primário para o arquivo da réplica de leitura.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--intervalo', type=float, default=0,
+                            help='Repete a sincronização a cada N segundos (0 = uma vez).')
+        parser.add_argument('--paginas', type=int, default=1024,
+                            help='Páginas copiadas por passo da API de backup.')
+
+    def handle(self, *args, **options):
+        alias = settings.DATABASE_REPLICA_ALIAS
+        if alias not in settings.DATABASES:
+            raise CommandError('Defina DATABASE_REPLICA_NAME para configurar a réplica.')
+        primario = settings.DATABASES['default']
+        replica = settings.DATABASES[alias]
+        if 'sqlite3' not in primario['ENGINE'] or 'sqlite3' not in replica['ENGINE']:
+            raise CommandError('sync_replica suporta apenas primário e réplica em SQLite.')
+
+        while True:
+            inicio = time.perf_counter()
+            self.sincronizar(str(primario['NAME']), str(replica['NAME']), options['paginas'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Réplica sincronizada em {(time.perf_counter() - inicio) * 1000:.0f} ms.'
+            ))
+            if not options['intervalo']:
+                break
+            time.sleep(options['intervalo'])
+
+        connections.close_all()
+
+    @staticmethod
+    def sincronizar(origem, destino, paginas):
+        """
+            Usa a API de backup online do SQLite, que gera uma cópia
+            consistente mesmo com escritas simultâneas no primário.
+        """
+        fonte = sqlite3.connect(origem)
+        alvo = sqlite3.connect(destino)
+        try:
+            fonte.backup(alvo, pages=paginas)
+        finally:
+            alvo.close()
+            fonte.close()
@@ -0,0 +1,155 @@
+"""
+Entrega dos arquivos de ``MEDIA_ROOT`` (capas e imagens institucionais).
+
+Substitui o ``django.conf.urls.static``, que só funciona com DEBUG e lê o
+arquivo inteiro pelo Python. A view:
+
+- responde ``304`` a ``If-None-Match``/``If-Modified-Since`` (ETag derivado de
+  tamanho e mtime);
+- atende um intervalo de ``Range: bytes=`` com ``206`` (ou ``416``), honrando
+  ``If-Range``;
+- marca como ``immutable`` por um ano os nomes que contêm um hash do conteúdo
+  (o nome muda sempre que o arquivo muda); os demais são revalidados após
+  ``MEDIA_CACHE_MAX_AGE``;
+- com ``MEDIA_SENDFILE`` delega a transferência ao servidor da frente
+  (``x-sendfile`` para Apache/lighttpd, ``x-accel-redirect`` para o nginx, que
+  então cuida também do Range); sem ele, o arquivo completo sai por
+  ``FileResponse``, que usa o ``wsgi.file_wrapper`` (sendfile) do servidor.
+"""
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from django.views.decorators.http import require_safe
+
+# Hash hexadecimal do conteúdo no nome: "<sha256>.jpg", "capa.3f2a9c1b7d4e.png".
+_NOME_COM_HASH_RE = re.compile(r'(?:^|[._-])[0-9a-f]{12,64}(?:\.[A-Za-z0-9]+)?$')
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+TAMANHO_BLOCO = 64 * 1024
+UM_ANO = 365 * 24 * 3600
+
+
+def nome_com_hash(caminho):
+    return bool(_NOME_COM_HASH_RE.search(os.path.basename(caminho)))
+
+
+def intervalo_pedido(cabecalho, tamanho):
+    """
+        ``(inicio, fim)`` inclusivo de um ``Range: bytes=`` com um único
+        intervalo; ``None`` se o cabeçalho deve ser ignorado (ausente, com
+        vários intervalos ou malformado). Levanta ``ValueError`` se o
+        intervalo não puder ser atendido.
+    """
+    casamento = _RANGE_RE.match(cabecalho.strip()) if cabecalho else None
+    if casamento is None:
+        return None
+    inicio, fim = casamento.groups()
+    if not inicio and not fim:
+        return None
+    if not inicio:  # sufixo: os últimos N bytes
+        sufixo = int(fim)
+        if sufixo == 0 or tamanho == 0:
+            raise ValueError(cabecalho)
+        return max(0, tamanho - sufixo), tamanho - 1
+    inicio = int(inicio)
+    fim = min(int(fim), tamanho - 1) if fim else tamanho - 1
+    if inicio >= tamanho or fim < inicio:
+        raise ValueError(cabecalho)
+    return inicio, fim
+
+
+def ler_intervalo(arquivo, inicio, tamanho):
+    try:
+        arquivo.seek(inicio)
+        while tamanho > 0:
+            bloco = arquivo.read(min(TAMANHO_BLOCO, tamanho))
+            if not bloco:
+                break
+            tamanho -= len(bloco)
+            yield bloco
+    finally:
+        arquivo.close()
+
+
+def if_range_atendido(request, etag, modificado_em):
+    """``If-Range`` ausente ou ainda válido: o Range pode ser atendido."""
+    valor = request.META.get('HTTP_IF_RANGE')
+    if not valor:
+        return True
+    if valor.startswith(('"', 'W/')):
+        return valor == etag
+    data = parse_http_date_safe(valor)
+    return data is not None and data >= modificado_em
+
+
+def com_cabecalhos(response, cabecalhos):
+    for nome, valor in cabecalhos.items():
+        response[nome] = valor
+    return response
+
+
+@require_safe
+def servir_media(request, caminho):
+    try:
+        completo = safe_join(settings.MEDIA_ROOT, caminho)
+        info = os.stat(completo)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404('Arquivo não encontrado.')
+    if not stat.S_ISREG(info.st_mode):
+        raise Http404('Arquivo não encontrado.')
+
+    tamanho = info.st_size
+    modificado_em = int(info.st_mtime)
+    etag = quote_etag(f'{tamanho:x}-{info.st_mtime_ns:x}')
+    cabecalhos = {
+        'ETag': etag,
+        'Last-Modified': http_date(modificado_em),
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': (
+            f'public, max-age={UM_ANO}, immutable' if nome_com_hash(caminho)
+            else f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}'
+        ),
+    }
+
+    condicional = get_conditional_response(request, etag=etag, last_modified=modificado_em)
+    if condicional is not None:
+        return com_cabecalhos(condicional, cabecalhos)
+
+    content_type = mimetypes.guess_type(completo)[0] or 'application/octet-stream'
+
+    if settings.MEDIA_SENDFILE:
+        response = HttpResponse(content_type=content_type)
+        if settings.MEDIA_SENDFILE == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + quote(caminho)
+        else:
+            response['X-Sendfile'] = completo
+        return com_cabecalhos(response, cabecalhos)
+
+    intervalo = None
+    if if_range_atendido(request, etag, modificado_em):
+        try:
+            intervalo = intervalo_pedido(request.META.get('HTTP_RANGE'), tamanho)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{tamanho}'
+            return com_cabecalhos(response, cabecalhos)
+
+    if intervalo is None:
+        response = FileResponse(open(completo, 'rb'), content_type=content_type)
+    else:
+        inicio, fim = intervalo
+        response = StreamingHttpResponse(
+            ler_intervalo(open(completo, 'rb'), inicio, fim - inicio + 1),
+            status=206, content_type=content_type,
+        )
+        response['Content-Length'] = str(fim - inicio + 1)
+        response['Content-Range'] = f'bytes {inicio}-{fim}/{tamanho}'
+    return com_cabecalhos(response, cabecalhos)
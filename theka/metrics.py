@@ -0,0 +1,125 @@
+"""
+Métricas da API no formato de exposição do Prometheus.
+
+As métricas são registradas pelo ``theka.middleware.MetricsMiddleware`` e
+expostas em ``/metrics``. Quando ``PROMETHEUS_MULTIPROC_DIR`` está definido
+(gunicorn/uwsgi com vários workers), cada processo grava seus valores em
+arquivos mmap nesse diretório e a view agrega todos eles na coleta. Nesse modo
+o servidor deve chamar ``prometheus_client.multiprocess.mark_process_dead(pid)``
+quando um worker é encerrado (hook ``child_exit`` do gunicorn).
+"""
+import os
+
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0,
+)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+REQUEST_LATENCY = Histogram(
+    'theka_request_latency_seconds',
+    'Latência das requisições por view e action do DRF.',
+    ['view', 'action', 'method'],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_TOTAL = Counter(
+    'theka_requests_total',
+    'Total de requisições por view, action e status HTTP.',
+    ['view', 'action', 'method', 'status'],
+)
+ERRORS_TOTAL = Counter(
+    'theka_request_errors_total',
+    'Requisições que terminaram em status 5xx ou exceção não tratada.',
+    ['view', 'action', 'method'],
+)
+DB_QUERIES_TOTAL = Counter(
+    'theka_db_queries_total',
+    'Total de queries SQL executadas por view e action.',
+    ['view', 'action'],
+)
+DB_QUERY_SECONDS_TOTAL = Counter(
+    'theka_db_query_seconds_total',
+    'Tempo total gasto em queries SQL por view e action.',
+    ['view', 'action'],
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    'theka_db_queries_per_request',
+    'Distribuição do número de queries SQL por requisição.',
+    ['view', 'action'],
+    buckets=QUERY_COUNT_BUCKETS,
+)
+CACHE_REQUESTS_TOTAL = Counter(
+    'theka_cache_requests_total',
+    'Acessos a caches da aplicação, separados em hit e miss.',
+    ['cache', 'result'],
+)
+
+
+def registrar_acesso_cache(cache, hit):
+    """
+        Registra um acesso a um cache da aplicação.
+        A taxa de acerto é obtida no Prometheus com
+        ``rate(theka_cache_requests_total{result="hit"}[5m])``
+        dividido pelo total do mesmo cache.
+    """
+    CACHE_REQUESTS_TOTAL.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+class EstatisticasBibliotecaCollector:
+    """
+        Expõe os totais de ``EstatisticasBiblioteca`` como gauges.
+        Os valores são lidos do banco somente no momento da coleta,
+        sem custo algum para as requisições da API.
+    """
+    CAMPOS = ('total_livros', 'total_autores', 'total_categorias', 'total_usuarios')
+
+    def collect(self):
+        from institucional.models import EstatisticasBiblioteca
+
+        valores = (
+            EstatisticasBiblioteca.objects.filter(id=1).values(*self.CAMPOS).first()
+            or dict.fromkeys(self.CAMPOS, 0)
+        )
+        for campo in self.CAMPOS:
+            yield GaugeMetricFamily(
+                f'theka_biblioteca_{campo}',
+                f'Valor atual de EstatisticasBiblioteca.{campo}.',
+                value=valores[campo],
+            )
+
+
+def _montar_registry():
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = CollectorRegistry()
+        registry.register(_RegistryPadrao())
+    registry.register(EstatisticasBibliotecaCollector())
+    return registry
+
+
+class _RegistryPadrao:
+    """Adapta o ``REGISTRY`` global para ser combinado com outros collectors."""
+
+    def collect(self):
+        return REGISTRY.collect()
+
+
+def metrics_view(request):
+    """
+        Retorna todas as métricas no formato texto do Prometheus.
+    """
+    registry = _montar_registry()
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
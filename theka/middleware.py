@@ -0,0 +1,120 @@
+import time
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connections
+
+from .metrics import (
+    DB_QUERIES_PER_REQUEST,
+    DB_QUERIES_TOTAL,
+    DB_QUERY_SECONDS_TOTAL,
+    ERRORS_TOTAL,
+    REQUEST_LATENCY,
+    REQUESTS_TOTAL,
+)
+
+
+@contextmanager
+def em_todas_as_conexoes(wrapper):
+    """Instala ``wrapper`` via ``execute_wrapper`` em todas as conexões (inclusive a réplica)."""
+    with ExitStack() as pilha:
+        for conexao in connections.all():
+            pilha.enter_context(conexao.execute_wrapper(wrapper))
+        yield
+
+
+def identificar_view(request):
+    """
+        Retorna o par (view, action) usado como rótulo das métricas.
+        Para viewsets do DRF usa o nome da classe e a action mapeada
+        para o método HTTP (list, retrieve, novidades...).
+        Depende de ``request.resolver_match``, definido pelo Django
+        ao resolver a URL.
+    """
+    metodo = request.method.lower()
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<sem_rota>', metodo
+
+    view_func = match.func
+    cls = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    if cls is None:
+        return getattr(view_func, '__name__', 'desconhecida'), metodo
+
+    actions = getattr(view_func, 'actions', None) or {}
+    return cls.__name__, actions.get(metodo, metodo)
+
+
+class _ContadorQueries:
+    """Wrapper de execução que acumula número e duração das queries."""
+    __slots__ = ('total', 'duracao')
+
+    def __init__(self):
+        self.total = 0
+        self.duracao = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duracao += time.perf_counter() - inicio
+            self.total += 1
+
+
+class MetricsMiddleware:
+    """
+        Coleta latência, contadores de requisições/erros e uso do banco
+        por view e action. As métricas são atualizadas uma única vez ao
+        final de cada requisição para manter o custo no caminho crítico baixo.
+
+        No modo assíncrono as queries rodam em outra thread, fora do alcance
+        do ``execute_wrapper``; nesse caso apenas latência e contadores de
+        requisição são registrados.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        contador = _ContadorQueries()
+        inicio = time.perf_counter()
+        status = 500
+        try:
+            with em_todas_as_conexoes(contador):
+                response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            self._registrar(request, status, time.perf_counter() - inicio, contador)
+
+    async def __acall__(self, request):
+        inicio = time.perf_counter()
+        status = 500
+        try:
+            response = await self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            self._registrar(request, status, time.perf_counter() - inicio, None)
+
+    def _registrar(self, request, status, duracao, contador):
+        view, action = identificar_view(request)
+        method = request.method
+        REQUEST_LATENCY.labels(view, action, method).observe(duracao)
+        REQUESTS_TOTAL.labels(view, action, method, str(status)).inc()
+        if status >= 500:
+            ERRORS_TOTAL.labels(view, action, method).inc()
+        if contador is None:
+            return
+        DB_QUERIES_PER_REQUEST.labels(view, action).observe(contador.total)
+        if contador.total:
+            DB_QUERIES_TOTAL.labels(view, action).inc(contador.total)
+            DB_QUERY_SECONDS_TOTAL.labels(view, action).inc(contador.duracao)
@@ -0,0 +1,166 @@
+"""
+Guarda de regressão de queries e latência por rota.
+
+Os testes percorrem todas as rotas GET dos routers da API (list, retrieve e
+actions extras), medem o número de queries, o SQL normalizado e a latência
+mediana, e comparam com o baseline versionado em
+``theka/baselines/regressao.json``. Mais queries que o baseline (além de
+``TOLERANCIA_QUERIES``) ou latência acima do orçamento falham o teste, com um
+diff das queries novas.
+
+A latência medida é comparada depois de descontada a lentidão da máquina no
+momento (``fator_maquina``: a mediana das razões medido/baseline de todas as
+rotas), e uma rota acima do orçamento é medida de novo antes de falhar. Assim
+o orçamento pode ser apertado sem que a variação do ambiente gere falhas.
+
+Para gravar o baseline das rotas novas::
+
+    THEKA_ATUALIZAR_BASELINES=1 python manage.py test theka.tests.RegressaoDesempenhoTest
+
+As rotas já gravadas não mudam; regravá-las afrouxaria os orçamentos que a
+guarda existe para fazer valer. Para regravar tudo, depois de uma mudança
+intencional e revisada, use ``THEKA_ATUALIZAR_BASELINES=tudo``.
+"""
+import difflib
+import json
+import os
+import statistics
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.urls import reverse
+from rest_framework.permissions import IsAdminUser
+
+from institucional.urls import router as router_institucional
+from library.urls import router as router_library
+from theka.benchmark import CapturaQueries
+from theka.slow_queries import normalizar_sql
+from users.urls import router as router_users
+
+CAMINHO_BASELINES = Path(settings.BASE_DIR, 'theka', 'baselines', 'regressao.json')
+ROUTERS = (router_library, router_institucional, router_users)
+
+TOLERANCIA_QUERIES = 0
+# Orçamento de latência, sobre o baseline já corrigido pelo fator da máquina:
+# o maior entre baseline * FATOR e baseline + FOLGA.
+FATOR_LATENCIA = 1.5
+FOLGA_LATENCIA_MS = 2.0
+REPETICOES = 11
+
+
+def atualizar_baselines():
+    """``None``, ``'novas'`` (só rotas sem baseline) ou ``'tudo'``."""
+    valor = os.environ.get('THEKA_ATUALIZAR_BASELINES')
+    if valor == 'tudo':
+        return 'tudo'
+    return 'novas' if valor == '1' else None
+
+
+def rotas_de_leitura():
+    """``[(nome, url)]`` de todas as rotas GET dos routers, com um objeto real no retrieve."""
+    rotas = []
+    for router in ROUTERS:
+        for _, viewset, basename in router.registry:
+            if 'get' not in getattr(viewset, 'http_method_names', ['get']):
+                continue
+            instancia = viewset.queryset.model.objects.order_by('pk').first()
+            rotas.append((f'{basename}-list', reverse(f'{basename}-list')))
+            if instancia is not None:
+                rotas.append((f'{basename}-detail', reverse(f'{basename}-detail', args=[instancia.pk])))
+            for extra in viewset.get_extra_actions():
+                if 'get' not in extra.mapping:
+                    continue
+                if IsAdminUser in extra.kwargs.get('permission_classes', ()):
+                    continue  # rotas administrativas: o cliente anônimo da guarda recebe 401
+                nome = f'{basename}-{extra.url_name}'
+                if extra.detail:
+                    if instancia is not None:
+                        rotas.append((nome, reverse(nome, args=[instancia.pk])))
+                else:
+                    rotas.append((nome, reverse(nome)))
+    return rotas
+
+
+def medir_rota(client, url):
+    """Mede queries (na primeira execução) e a latência mediana da rota."""
+    client.get(url)  # aquecimento: caches de processo, conexões, imports
+    with CapturaQueries() as captura:
+        response = client.get(url)
+    latencias = []
+    for _ in range(REPETICOES):
+        inicio = time.perf_counter()
+        client.get(url)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return {
+        'status': response.status_code,
+        'queries': len(captura.queries),
+        'sql': [normalizar_sql(sql) for sql in captura.queries],
+        'latencia_ms': round(statistics.median(latencias), 2),
+    }
+
+
+def carregar_baselines():
+    if not CAMINHO_BASELINES.exists():
+        return {}
+    return json.loads(CAMINHO_BASELINES.read_text())
+
+
+def salvar_baselines(baselines):
+    CAMINHO_BASELINES.parent.mkdir(parents=True, exist_ok=True)
+    CAMINHO_BASELINES.write_text(json.dumps(baselines, indent=2, ensure_ascii=False, sort_keys=True) + '\n')
+
+
+def mesclar_baselines(baselines, medidos, modo):
+    """Baselines a gravar: só acrescenta rotas novas, a menos que ``modo`` seja ``'tudo'``."""
+    if modo == 'tudo':
+        return dict(medidos)
+    return {**{nome: medido for nome, medido in medidos.items() if nome not in baselines}, **baselines}
+
+
+def fator_maquina(medidos, baselines):
+    """
+        Mediana das razões latência medida / baseline (no mínimo 1): quanto a
+        máquina está mais lenta agora do que quando o baseline foi gravado.
+        A mediana não se move com a regressão de poucas rotas.
+    """
+    razoes = [
+        medido['latencia_ms'] / baselines[nome]['latencia_ms']
+        for nome, medido in medidos.items()
+        if nome in baselines and baselines[nome]['latencia_ms'] > 0
+    ]
+    return max(1.0, statistics.median(razoes)) if razoes else 1.0
+
+
+def acima_do_orcamento(medido, baseline, fator=1.0):
+    referencia = baseline['latencia_ms'] * fator
+    orcamento = max(referencia * FATOR_LATENCIA, referencia + FOLGA_LATENCIA_MS)
+    return medido['latencia_ms'] > orcamento, orcamento
+
+
+def comparar(nome, medido, baseline, fator=1.0):
+    """
+        Lista de problemas (texto legível) de ``medido`` frente ao
+        ``baseline``, com a latência corrigida pelo ``fator`` da máquina.
+    """
+    if baseline is None:
+        return [f'{nome}: rota sem baseline; regrave com THEKA_ATUALIZAR_BASELINES=1.']
+
+    problemas = []
+    if medido['queries'] > baseline['queries'] + TOLERANCIA_QUERIES:
+        diff = difflib.unified_diff(
+            baseline['sql'], medido['sql'], 'baseline', 'atual', lineterm='', n=0,
+        )
+        novas = [linha for linha in diff if linha.startswith('+') and not linha.startswith('+++')]
+        problemas.append(
+            f"{nome}: {medido['queries']} queries (baseline {baseline['queries']}). Queries novas:\n"
+            + '\n'.join(f'  {linha}' for linha in novas)
+        )
+
+    acima, orcamento = acima_do_orcamento(medido, baseline, fator)
+    if acima:
+        problemas.append(
+            f"{nome}: latência mediana de {medido['latencia_ms']:.1f} ms acima do orçamento de "
+            f"{orcamento:.1f} ms (baseline {baseline['latencia_ms']:.1f} ms, máquina {fator:.2f}x)."
+        )
+    return problemas
@@ -0,0 +1,147 @@
+"""
+Roteamento de leituras para uma réplica.
+
+O ``ReplicaMiddleware`` expõe a requisição atual ao ``ReplicaRouter``, que decide
+na primeira leitura se ela pode ir para a réplica: apenas GET/HEAD em actions de
+leitura (``DATABASE_REPLICA_READ_ACTIONS``) e somente se o cliente não escreveu
+nos últimos ``DATABASE_REPLICA_STICKY_SECONDS`` (read-your-writes). Escritas e
+migrações vão sempre para o ``default``. Essa janela fica no cache; sem
+``CACHE_COMPARTILHADO`` a réplica não é usada.
+
+Localmente a réplica é um segundo arquivo SQLite atualizado a partir do
+primário por ``manage.py sync_replica``.
+"""
+import hashlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+
+from .middleware import identificar_view
+
+_requisicao = ContextVar('theka_requisicao', default=None)
+
+METODOS_LEITURA = ('GET', 'HEAD')
+
+
+def chave_cliente(request):
+    """
+        Identifica o cliente para a janela de read-your-writes.
+        Usa o header Authorization (token do usuário) quando existe,
+        senão o IP de origem.
+    """
+    identidade = request.META.get('HTTP_AUTHORIZATION') or request.META.get('REMOTE_ADDR', '')
+    return 'replica-sticky:' + hashlib.sha1(identidade.encode('utf-8')).hexdigest()
+
+
+def usar_replica(request):
+    """
+        Decide se as leituras da requisição podem ir para a réplica.
+        A decisão é tomada depois que a URL foi resolvida e fica guardada
+        na própria requisição.
+    """
+    decisao = getattr(request, '_usar_replica', None)
+    if decisao is not None:
+        return decisao
+    if request.method not in METODOS_LEITURA or getattr(request, 'resolver_match', None) is None:
+        return False
+    # A janela de read-your-writes vive no cache: num cache por processo, outro
+    # worker não veria a escrita recente e leria dados velhos da réplica.
+    if not settings.CACHE_COMPARTILHADO:
+        return False
+
+    _, action = identificar_view(request)
+    decisao = (
+        action in settings.DATABASE_REPLICA_READ_ACTIONS
+        and not cache.get(chave_cliente(request))
+    )
+    request._usar_replica = decisao
+    return decisao
+
+
+@contextmanager
+def requisicao_atual(request):
+    """Expõe ao ``ReplicaRouter`` uma requisição criada em processo (sub-requisições do /batch/)."""
+    if settings.DATABASE_REPLICA_ALIAS not in settings.DATABASES:
+        yield
+        return
+    token = _requisicao.set(request)
+    try:
+        yield
+    finally:
+        _requisicao.reset(token)
+
+
+class ReplicaRouter:
+    """Envia para a réplica as leituras liberadas por ``usar_replica``."""
+
+    def db_for_read(self, model, **hints):
+        request = _requisicao.get()
+        if request is not None and usar_replica(request):
+            return settings.DATABASE_REPLICA_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        bancos = {'default', settings.DATABASE_REPLICA_ALIAS}
+        if obj1._state.db in bancos and obj2._state.db in bancos:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # A réplica é uma cópia do primário; o schema chega pela sincronização.
+        if db == settings.DATABASE_REPLICA_ALIAS:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """
+        Disponibiliza a requisição ao ``ReplicaRouter`` e abre a janela de
+        read-your-writes depois de escritas bem-sucedidas.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if settings.DATABASE_REPLICA_ALIAS not in settings.DATABASES:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _requisicao.set(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _requisicao.reset(token)
+        if self._escreveu(request, response):
+            cache.set(chave_cliente(request), True, settings.DATABASE_REPLICA_STICKY_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        token = _requisicao.set(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _requisicao.reset(token)
+        if self._escreveu(request, response):
+            await cache.aset(chave_cliente(request), True, settings.DATABASE_REPLICA_STICKY_SECONDS)
+        return response
+
+    @staticmethod
+    def _escreveu(request, response):
+        # POSTs que só leem (o /batch/) marcam a requisição com _somente_leitura.
+        return (
+            request.method not in METODOS_LEITURA
+            and not getattr(request, '_somente_leitura', False)
+            and response.status_code < 400
+        )
@@ -0,0 +1,126 @@
+"""
+Schema OpenAPI pré-calculado.
+
+Gerar o documento OpenAPI exige introspecção de todos os viewsets e
+serializers. Aqui ele é gerado uma única vez por versão do código
+(``manage.py generate_schema`` no build, ou no primeiro acesso), gravado em
+``SCHEMA_CACHE_DIR`` e servido da memória com ETag.
+
+A versão do código vem de ``THEKA_CODE_VERSION`` (ex.: o SHA do commit no
+deploy) ou, na falta dela, de um hash do código-fonte das apps do projeto,
+da versão do drf-spectacular e de ``SPECTACULAR_SETTINGS``.
+"""
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+import drf_spectacular
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import parse_etags
+from drf_spectacular.generators import SchemaGenerator
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+from drf_spectacular.views import SpectacularAPIView
+
+APPS_PROJETO = ('theka', 'library', 'institucional', 'users')
+FORMATOS = {
+    'yaml': OpenApiYamlRenderer,
+    'json': OpenApiJsonRenderer,
+}
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def versao_codigo():
+    """Identifica a versão do código que gerou o schema."""
+    versao = os.environ.get('THEKA_CODE_VERSION')
+    if versao:
+        return versao[:16]
+
+    digest = hashlib.sha1()
+    digest.update(drf_spectacular.__version__.encode())
+    digest.update(repr(sorted(settings.SPECTACULAR_SETTINGS.items())).encode())
+    for app in APPS_PROJETO:
+        for caminho in sorted(Path(settings.BASE_DIR, app).rglob('*.py')):
+            digest.update(str(caminho.relative_to(settings.BASE_DIR)).encode())
+            digest.update(caminho.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def caminho_schema(versao, formato):
+    return Path(settings.SCHEMA_CACHE_DIR) / f'openapi-{versao}.{formato}'
+
+
+def gerar_schema(versao):
+    """Gera o schema, grava um arquivo por formato e retorna o conteúdo."""
+    # Sempre a partir das rotas síncronas: as views assíncronas do ASGI
+    # são atalhos para os mesmos viewsets.
+    schema = SchemaGenerator(urlconf='theka.urls').get_schema(request=None, public=True)
+    Path(settings.SCHEMA_CACHE_DIR).mkdir(parents=True, exist_ok=True)
+    conteudos = {}
+    for formato, renderer in FORMATOS.items():
+        conteudo = renderer().render(schema, renderer_context={})
+        destino = caminho_schema(versao, formato)
+        temporario = destino.with_suffix(destino.suffix + '.tmp')
+        temporario.write_bytes(conteudo)
+        os.replace(temporario, destino)
+        conteudos[formato] = conteudo
+    return conteudos
+
+
+def carregar_schema():
+    """
+        Retorna ``(versao, conteudos)`` para a versão atual do código,
+        lendo os arquivos já gerados ou gerando-os na primeira chamada.
+    """
+    if 'conteudos' in _cache:
+        return _cache['versao'], _cache['conteudos']
+    with _lock:
+        if 'conteudos' not in _cache:
+            versao = versao_codigo()
+            arquivos = {formato: caminho_schema(versao, formato) for formato in FORMATOS}
+            if all(arquivo.exists() for arquivo in arquivos.values()):
+                conteudos = {formato: arquivo.read_bytes() for formato, arquivo in arquivos.items()}
+            else:
+                conteudos = gerar_schema(versao)
+            _cache['versao'] = versao
+            _cache['conteudos'] = conteudos
+    return _cache['versao'], _cache['conteudos']
+
+
+def etag_corresponde(etag, if_none_match):
+    """
+        Comparação fraca do ``If-None-Match`` (lista de ETags, ``*`` ou
+        ``W/``), como em ``django.views.decorators.http``.
+    """
+    etags = parse_etags(if_none_match)
+    if '*' in etags:
+        return True
+    etag = etag.removeprefix('W/')
+    return any(candidata.removeprefix('W/') == etag for candidata in etags)
+
+
+class CachedSpectacularAPIView(SpectacularAPIView):
+    """
+        ``SpectacularAPIView`` que responde com o schema pré-calculado.
+        A negociação de conteúdo (YAML ou JSON) continua a do drf-spectacular.
+    """
+
+    def _get_schema_response(self, request):
+        versao, conteudos = carregar_schema()
+        renderer = request.accepted_renderer
+        formato = renderer.format
+        etag = f'"{versao}-{formato}"'
+        if etag_corresponde(etag, request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponseNotModified()
+        else:
+            content_type = request.accepted_media_type
+            if renderer.charset:
+                content_type = f'{content_type}; charset={renderer.charset}'
+            response = HttpResponse(conteudos[formato], content_type=content_type)
+            response['Content-Disposition'] = f'inline; filename="{self._get_filename(request, None)}"'
+        response['ETag'] = etag
+        response['Cache-Control'] = 'public, max-age=300'
+        return response
@@ -48,20 +48,28 @@ INSTALLED_APPS = [
     'django_filters',
     'institucional',
     'users',
+    'theka',
 ]
 
 MIDDLEWARE = [
+    'theka.middleware.MetricsMiddleware',
+    'theka.slow_queries.SlowQueryMiddleware',
+    'theka.routers.ReplicaMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    # Sessão, CSRF, autenticação por sessão e mensagens só rodam nos caminhos
+    # de FULL_STACK_PATH_PREFIXES; a API usa JWT (theka/lean.py).
+    'theka.lean.LeanSessionMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
+    'theka.lean.LeanCsrfViewMiddleware',
+    'theka.lean.LeanAuthenticationMiddleware',
+    'theka.lean.LeanMessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
+FULL_STACK_PATH_PREFIXES = ('/admin/',)
 
-ROOT_URLCONF = 'theka.urls'
+# Sob ASGI (theka/asgi.py) as leituras mais acessadas usam views assíncronas.
+ROOT_URLCONF = 'theka.urls_asgi' if config('THEKA_ASYNC_VIEWS', default=False, cast=bool) else 'theka.urls'
 
 TEMPLATES = [
     {
@@ -88,9 +96,72 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Conexões persistentes: evita abrir (e reconfigurar) uma conexão por requisição.
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=600, cast=int),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Pega o lock de escrita no BEGIN, evitando deadlocks de upgrade de lock no WAL.
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# Réplica de leitura (theka/routers.py). Localmente é um segundo arquivo SQLite
+# sincronizado do primário com `manage.py sync_replica`. A janela de
+# read-your-writes fica no cache, então a réplica só é usada com
+# CACHE_COMPARTILHADO; sem ele todas as leituras vão ao primário.
+DATABASE_REPLICA_ALIAS = 'replica'
+DATABASE_REPLICA_NAME = config('DATABASE_REPLICA_NAME', default='')
+DATABASE_REPLICA_STICKY_SECONDS = config('DATABASE_REPLICA_STICKY_SECONDS', default=5, cast=int)
+DATABASE_REPLICA_READ_ACTIONS = ('list', 'retrieve', 'novidades', 'destaque_mes', 'relacionados', 'autocomplete')
+if DATABASE_REPLICA_NAME:
+    DATABASES[DATABASE_REPLICA_ALIAS] = {
+        **DATABASES['default'],
+        'NAME': DATABASE_REPLICA_NAME,
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['theka.routers.ReplicaRouter']
+
+# PRAGMAs aplicados a cada nova conexão SQLite (theka/db.py)
+SQLITE_PRAGMAS = {
+    'journal_mode': config('SQLITE_JOURNAL_MODE', default='WAL'),
+    'synchronous': config('SQLITE_SYNCHRONOUS', default='NORMAL'),
+    'busy_timeout': config('SQLITE_BUSY_TIMEOUT', default=5000, cast=int),
+    'mmap_size': config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int),
+    'cache_size': config('SQLITE_CACHE_SIZE', default=-20000, cast=int),  # negativo = KiB
+    'temp_store': config('SQLITE_TEMP_STORE', default='MEMORY'),
+}
+
+# Fila de escrita serializada (theka/writer.py): uma thread escritora por processo
+# com group commit, para rajadas de escrita não esbarrarem no lock do SQLite.
+WRITE_QUEUE_ENABLED = config('WRITE_QUEUE_ENABLED', default=False, cast=bool)
+WRITE_QUEUE_BATCH_SIZE = config('WRITE_QUEUE_BATCH_SIZE', default=64, cast=int)
+WRITE_QUEUE_MAX_WAIT_MS = config('WRITE_QUEUE_MAX_WAIT_MS', default=2, cast=float)
+WRITE_QUEUE_TIMEOUT = config('WRITE_QUEUE_TIMEOUT', default=30, cast=float)
+
+
+# Cache. O padrão é local ao processo; com vários workers use um backend
+# compartilhado (ex.: Redis) para que invalidações e contadores valham para todos.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='theka'),
+    }
+}
+
+# Indica se o cache é visto por todos os processos. Os índices em memória
+# (revogações de JWT, autocomplete) só confiam no contador de geração do cache
+# quando ele é compartilhado; LocMem e Dummy são por processo. Um deploy com um
+# único processo pode declarar CACHE_COMPARTILHADO=True mesmo com o LocMem.
+CACHE_COMPARTILHADO = config(
+    'CACHE_COMPARTILHADO',
+    default=CACHES['default']['BACKEND'] not in (
+        'django.core.cache.backends.locmem.LocMemCache',
+        'django.core.cache.backends.dummy.DummyCache',
+    ),
+    cast=bool,
+)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -133,6 +204,30 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Entrega dos arquivos de mídia (theka/media.py). MEDIA_SENDFILE delega a
+# transferência ao servidor da frente: '' (a própria view), 'x-sendfile' ou
+# 'x-accel-redirect' (nginx, com um location internal em MEDIA_ACCEL_REDIRECT_PREFIX
+# apontando para MEDIA_ROOT). MEDIA_CACHE_MAX_AGE vale para nomes sem hash do conteúdo.
+MEDIA_SERVIR = config('MEDIA_SERVIR', default=True, cast=bool)
+MEDIA_SENDFILE = config('MEDIA_SENDFILE', default='')
+MEDIA_ACCEL_REDIRECT_PREFIX = config('MEDIA_ACCEL_REDIRECT_PREFIX', default='/_media_interna/')
+MEDIA_CACHE_MAX_AGE = config('MEDIA_CACHE_MAX_AGE', default=3600, cast=int)
+
+# Uploads gravados uma única vez por conteúdo (theka/storage.py), com contagem
+# de referências em library.midia. Blobs reaproveitados há menos de
+# MEDIA_BLOB_CARENCIA_SEGUNDOS não são apagados ao ficarem sem referências.
+STORAGES = {
+    'default': {
+        'BACKEND': config('MEDIA_STORAGE_BACKEND', default='theka.storage.ArmazenamentoPorConteudo'),
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+MEDIA_BLOB_CARENCIA_SEGUNDOS = config('MEDIA_BLOB_CARENCIA_SEGUNDOS', default=300, cast=int)
+# Destino padrão de `manage.py gc_media --quarentena` (fora do MEDIA_ROOT, para não ser servido).
+MEDIA_QUARENTENA = config('MEDIA_QUARENTENA', default=os.path.join(BASE_DIR, 'media_quarentena'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -144,10 +239,26 @@ CORS_ALLOW_ALL_ORIGINS = True
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        'users.authentication.CachedJWTAuthentication',
+    ),
+    # Taxas dos throttles por token bucket (theka.throttling), aplicados ao
+    # login e ao pedido de redefinição de senha.
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': config('THROTTLE_LOGIN_IP', default='30/min'),
+        'login_email': config('THROTTLE_LOGIN_EMAIL', default='5/min'),
+        'password_reset_ip': config('THROTTLE_PASSWORD_RESET_IP', default='10/hour'),
+        'password_reset_email': config('THROTTLE_PASSWORD_RESET_EMAIL', default='3/hour'),
+    },
+    # Proxies reversos confiáveis na frente da aplicação. Os throttles por IP
+    # usam o endereço que o último deles viu no X-Forwarded-For; com 0 (sem
+    # proxy), só REMOTE_ADDR, e um X-Forwarded-For forjado não cria baldes novos.
+    'NUM_PROXIES': config('NUM_PROXIES', default=0, cast=int),
 }
 
+# Máximo de chaves mantidas pelo armazenamento de token buckets por processo,
+# usado sem CACHE_COMPARTILHADO (com ele, os baldes ficam no cache).
+THROTTLE_MAX_KEYS = config('THROTTLE_MAX_KEYS', default=100_000, cast=int)
+
 # Spectacular settings
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Theka API',
@@ -155,6 +266,8 @@ SPECTACULAR_SETTINGS = {
     'VERSION': '1.0.0',
     'SERVE_INCLUDE_SCHEMA': False,
 }
+# Schema pré-calculado por versão do código (theka/schema.py, `manage.py generate_schema`)
+SCHEMA_CACHE_DIR = config('SCHEMA_CACHE_DIR', default=os.path.join(BASE_DIR, 'schema_cache'))
 
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=int(config('ACCESS_TOKEN_LIFETIME'))),
@@ -165,6 +278,69 @@ SIMPLE_JWT = {
     "ALGORITHM": config('ALGORITHM'),
     "AUTH_HEADER_TYPES": ("Bearer",),
 }
+# Tempo (s) que o usuário autenticado fica em cache (users/authentication.py);
+# só vale com CACHE_COMPARTILHADO, para que desativações alcancem todos os workers.
+JWT_USER_CACHE_TTL = config('JWT_USER_CACHE_TTL', default=60, cast=int)
+
+# Livros relacionados (library.similaridade): K vizinhos por livro, termos do
+# vocabulário TF-IDF, artefato com os vetores esparsos usado nas atualizações
+# incrementais, se os sinais de Livro enfileiram essas atualizações e quantos
+# itens da fila o comando update_related_books processa por lote.
+LIVROS_RELACIONADOS_K = config('LIVROS_RELACIONADOS_K', default=10, cast=int)
+LIVROS_RELACIONADOS_MAX_TERMOS = config('LIVROS_RELACIONADOS_MAX_TERMOS', default=4096, cast=int)
+LIVROS_RELACIONADOS_ARQUIVO = config(
+    'LIVROS_RELACIONADOS_ARQUIVO', default=str(BASE_DIR / 'similaridade' / 'livros.npz'),
+)
+LIVROS_RELACIONADOS_INCREMENTAL = config('LIVROS_RELACIONADOS_INCREMENTAL', default=True, cast=bool)
+LIVROS_RELACIONADOS_LOTE = config('LIVROS_RELACIONADOS_LOTE', default=500, cast=int)
+
+# Autocomplete de títulos e autores (library.autocomplete): sugestões por
+# consulta (padrão e máximo), montagem do índice em memória na subida do wsgi/asgi
+# e intervalo em segundos entre as conferências do índice com o banco.
+LIVROS_AUTOCOMPLETE_LIMITE = config('LIVROS_AUTOCOMPLETE_LIMITE', default=8, cast=int)
+LIVROS_AUTOCOMPLETE_LIMITE_MAX = config('LIVROS_AUTOCOMPLETE_LIMITE_MAX', default=20, cast=int)
+LIVROS_AUTOCOMPLETE_AQUECER = config('LIVROS_AUTOCOMPLETE_AQUECER', default=True, cast=bool)
+LIVROS_AUTOCOMPLETE_VERIFICAR_SEGUNDOS = config('LIVROS_AUTOCOMPLETE_VERIFICAR_SEGUNDOS', default=5, cast=float)
+
+# Feed de alterações /livros/changes/ (library.alteracoes): tamanho do lote
+# (padrão e máximo), atraso em segundos antes de uma alteração entrar no feed
+# (transações ainda não commitadas) e dias de retenção dos tombstones.
+LIVROS_CHANGES_LOTE = config('LIVROS_CHANGES_LOTE', default=100, cast=int)
+LIVROS_CHANGES_LOTE_MAX = config('LIVROS_CHANGES_LOTE_MAX', default=1000, cast=int)
+LIVROS_CHANGES_MARGEM_SEGUNDOS = config('LIVROS_CHANGES_MARGEM_SEGUNDOS', default=2, cast=float)
+LIVROS_CHANGES_RETENCAO_DIAS = config('LIVROS_CHANGES_RETENCAO_DIAS', default=30, cast=int)
+
+# Máximo de ids em ?ids=1,2,3 (theka.lote_ids) nos viewsets de livros, gêneros e editoras.
+BATCH_IDS_MAX = config('BATCH_IDS_MAX', default=100, cast=int)
+
+# Endpoint composto POST /batch/ (theka.lote): sub-requisições por lote,
+# tempo máximo (ms) de execução (as que passarem do tempo voltam com 503) e
+# prefixos das rotas da API que podem ser chamadas dentro de um lote.
+BATCH_MAX_REQUISICOES = config('BATCH_MAX_REQUISICOES', default=10, cast=int)
+BATCH_TEMPO_MAX_MS = config('BATCH_TEMPO_MAX_MS', default=2000, cast=int)
+BATCH_ROTAS_PERMITIDAS = ('livros/', 'generos/', 'editoras/', 'institucional/', 'users/')
+
+# Provisionamento de usuários em lote (POST /users/bulk/ e provision_users).
+# O endpoint valida os registros, hasheia as senhas e enfileira; o comando
+# process_user_batches cria os usuários, cada lote reservado por
+# USER_BULK_LEASE_SECONDS.
+# USER_BULK_HASH_PROCESSES=0 usa um processo de hash por CPU; lotes menores
+# que USER_BULK_PARALLEL_THRESHOLD são hasheados no próprio processo.
+USER_BULK_MAX_ITEMS = config('USER_BULK_MAX_ITEMS', default=5000, cast=int)
+USER_BULK_HASH_PROCESSES = config('USER_BULK_HASH_PROCESSES', default=0, cast=int)
+USER_BULK_PARALLEL_THRESHOLD = config('USER_BULK_PARALLEL_THRESHOLD', default=64, cast=int)
+USER_BULK_LEASE_SECONDS = config('USER_BULK_LEASE_SECONDS', default=1800, cast=int)
+
+# Filtro de Bloom dos refresh tokens revogados (users.revocation). Com 2**20
+# bits e 7 funções, até ~100 mil revogações ativas têm ~1% de falsos positivos;
+# acima da capacidade o filtro é recriado só com as revogações não expiradas.
+# Sem CACHE_COMPARTILHADO o filtro não é usado e toda verificação vai ao banco;
+# com ele, o filtro também relê as revogações novas a cada
+# JWT_REVOCATION_SYNC_SECONDS, mesmo sem mudança na geração do cache.
+JWT_REVOCATION_BLOOM_BITS = config('JWT_REVOCATION_BLOOM_BITS', default=2**20, cast=int)
+JWT_REVOCATION_BLOOM_HASHES = config('JWT_REVOCATION_BLOOM_HASHES', default=7, cast=int)
+JWT_REVOCATION_BLOOM_CAPACITY = config('JWT_REVOCATION_BLOOM_CAPACITY', default=100_000, cast=int)
+JWT_REVOCATION_SYNC_SECONDS = config('JWT_REVOCATION_SYNC_SECONDS', default=5, cast=float)
 
 # Configurações de Email para Outlook/Office 365
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -174,6 +350,52 @@ EMAIL_USE_TLS = config('EMAIL_USE_TLS', cast=bool)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL')
+EMAIL_TIMEOUT = config('EMAIL_TIMEOUT', default=10, cast=int)
+
+# Outbox de emails (users.outbox): as requisições enfileiram e o comando
+# send_queued_email entrega em lotes por uma única conexão SMTP. Falhas são
+# reagendadas com backoff exponencial até EMAIL_OUTBOX_MAX_ATTEMPTS.
+EMAIL_OUTBOX_BATCH_SIZE = config('EMAIL_OUTBOX_BATCH_SIZE', default=50, cast=int)
+EMAIL_OUTBOX_MAX_ATTEMPTS = config('EMAIL_OUTBOX_MAX_ATTEMPTS', default=5, cast=int)
+EMAIL_OUTBOX_BACKOFF_SECONDS = config('EMAIL_OUTBOX_BACKOFF_SECONDS', default=60, cast=int)
+EMAIL_OUTBOX_LEASE_SECONDS = config('EMAIL_OUTBOX_LEASE_SECONDS', default=300, cast=int)
+
+# Métricas (Prometheus)
+# Com vários workers, aponte para um diretório local compartilhado e limpo a cada deploy.
+PROMETHEUS_MULTIPROC_DIR = config('PROMETHEUS_MULTIPROC_DIR', default='')
+if PROMETHEUS_MULTIPROC_DIR:
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+    os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', PROMETHEUS_MULTIPROC_DIR)
+
+# Log de queries lentas (JSONL rotativo, lido por `manage.py slow_queries`)
+SLOW_QUERY_THRESHOLD_MS = config('SLOW_QUERY_THRESHOLD_MS', default=100, cast=int)
+SLOW_QUERY_LOG = config('SLOW_QUERY_LOG', default=os.path.join(BASE_DIR, 'logs', 'slow_queries.jsonl'))
+os.makedirs(os.path.dirname(SLOW_QUERY_LOG), exist_ok=True)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'jsonl': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'formatter': 'jsonl',
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'theka.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
 
 # URL do seu frontend para o link de reset
 FRONTEND_URL = config('FRONTEND_URL', default='http://localhost:3000')
@@ -0,0 +1,133 @@
+"""
+Registro de queries lentas com captura do plano de execução.
+
+O ``SlowQueryMiddleware`` instala um wrapper via ``execute_wrapper`` em todas
+as conexões (inclusive a réplica) que mede cada query da requisição. As que ultrapassam
+``SLOW_QUERY_THRESHOLD_MS`` são gravadas como JSON, uma por linha, no logger
+``theka.slow_queries`` (arquivo rotativo configurado em ``LOGGING``), junto com
+os parâmetros, a view/action de origem e a saída do ``EXPLAIN QUERY PLAN``.
+O relatório agrupado é gerado por ``manage.py slow_queries``.
+"""
+import hashlib
+import json
+import logging
+import re
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+from .middleware import em_todas_as_conexoes, identificar_view
+
+logger = logging.getLogger('theka.slow_queries')
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMERO_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_RE = re.compile(r'%s|\?')
+_LISTA_IN_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_ESPACOS_RE = re.compile(r'\s+')
+
+
+def normalizar_sql(sql):
+    """
+        Remove literais e colapsa listas de parâmetros para que queries
+        equivalentes tenham o mesmo texto, independentemente dos valores.
+    """
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMERO_RE.sub('?', sql)
+    sql = _PLACEHOLDER_RE.sub('?', sql)
+    sql = _LISTA_IN_RE.sub('(...)', sql)
+    return _ESPACOS_RE.sub(' ', sql).strip()
+
+
+def fingerprint_sql(sql):
+    """Retorna um identificador curto da forma normalizada da query."""
+    return hashlib.md5(normalizar_sql(sql).encode('utf-8')).hexdigest()[:12]
+
+
+def explicar_query(sql, params, conexao=connection):
+    """
+        Executa ``EXPLAIN QUERY PLAN`` (ou ``EXPLAIN`` fora do SQLite)
+        para a query, na conexão que a executou, e devolve as linhas do
+        plano como texto.
+    """
+    prefixo = 'EXPLAIN QUERY PLAN ' if conexao.vendor == 'sqlite' else 'EXPLAIN '
+    try:
+        with conexao.cursor() as cursor:
+            cursor.execute(prefixo + sql, params)
+            return [' '.join(str(coluna) for coluna in linha) for linha in cursor.fetchall()]
+    except DatabaseError as erro:
+        return [f'erro ao obter plano: {erro}']
+
+
+class SlowQueryLogger:
+    """Wrapper de execução que registra as queries acima do limite."""
+
+    def __init__(self, request, limite_ms):
+        self.request = request
+        self.limite = limite_ms / 1000
+        self._explicando = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if self._explicando:
+            return execute(sql, params, many, context)
+
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracao = time.perf_counter() - inicio
+            if duracao >= self.limite:
+                self._registrar(sql, params, many, duracao, context['connection'])
+
+    def _registrar(self, sql, params, many, duracao, conexao):
+        view, action = identificar_view(self.request)
+        plano = []
+        # EXPLAIN não se aplica a executemany e não deve entrar em recursão.
+        if not many:
+            self._explicando = True
+            try:
+                plano = explicar_query(sql, params, conexao)
+            finally:
+                self._explicando = False
+
+        logger.info(json.dumps({
+            'ts': timezone.now().isoformat(),
+            'duracao_ms': round(duracao * 1000, 3),
+            'sql': sql,
+            'params': list(params) if params and not many else [],
+            'many': many,
+            'view': view,
+            'action': action,
+            'path': self.request.path,
+            'banco': conexao.alias,
+            'plano': plano,
+        }, default=str, ensure_ascii=False))
+
+
+class SlowQueryMiddleware:
+    """
+        Ativa o ``SlowQueryLogger`` durante cada requisição.
+        Um valor negativo em ``SLOW_QUERY_THRESHOLD_MS`` desliga o registro.
+        Requisições assíncronas passam direto: suas queries rodam em outra
+        thread, fora do alcance do ``execute_wrapper``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.limite_ms = settings.SLOW_QUERY_THRESHOLD_MS
+        if self.limite_ms < 0:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.get_response(request)
+        with em_todas_as_conexoes(SlowQueryLogger(request, self.limite_ms)):
+            return self.get_response(request)
@@ -0,0 +1,126 @@
+"""
+Armazenamento de mídia endereçado por conteúdo.
+
+Cada upload é gravado uma única vez em ``blobs/<aa>/<bb>/<sha256><ext>``: o
+hash é calculado enquanto o arquivo é copiado para um temporário (ou lido do
+temporário do próprio upload, que então é apenas movido). Se o blob já
+existe, o temporário é descartado e o nome existente é reaproveitado, sem
+ocupar disco de novo. Como o nome muda junto com o conteúdo, as URLs podem
+ser cacheadas para sempre (ver ``theka.media``).
+
+O ``upload_to`` dos campos é ignorado para os novos arquivos; os arquivos
+antigos continuam acessíveis pelos seus nomes. A contagem de referências
+dos blobs fica em ``library.midia``.
+"""
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import uuid
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+PREFIXO_BLOBS = 'blobs'
+_EXTENSAO_RE = re.compile(r'^\.[a-z0-9]{1,10}$')
+
+
+def nome_do_blob(digest, extensao):
+    return f'{PREFIXO_BLOBS}/{digest[:2]}/{digest[2:4]}/{digest}{extensao}'
+
+
+def eh_blob(nome):
+    return bool(nome) and nome.startswith(f'{PREFIXO_BLOBS}/')
+
+
+@deconstructible
+class ArmazenamentoPorConteudo(FileSystemStorage):
+    """``FileSystemStorage`` que nomeia cada arquivo pelo SHA-256 do conteúdo."""
+
+    def get_available_name(self, name, max_length=None):
+        # O nome definitivo só é conhecido depois do hash, em _save; um nome
+        # já existente é justamente o caso da deduplicação.
+        return name
+
+    def _save(self, name, content):
+        extensao = os.path.splitext(name)[1].lower()
+        if not _EXTENSAO_RE.match(extensao):
+            extensao = ''
+        hash_ = hashlib.sha256()
+
+        if hasattr(content, 'temporary_file_path'):
+            # Upload grande, já em disco: só lê para o hash e depois move.
+            temporario = content.temporary_file_path()
+            for bloco in content.chunks():
+                hash_.update(bloco)
+            nome = nome_do_blob(hash_.hexdigest(), extensao)
+            if not self._reaproveitar(nome):
+                self._instalar(temporario, nome, mover=file_move_safe)
+            return nome
+
+        diretorio = self.path(os.path.join(PREFIXO_BLOBS, 'tmp'))
+        os.makedirs(diretorio, exist_ok=True)
+        fd, temporario = tempfile.mkstemp(dir=diretorio, suffix=extensao)
+        try:
+            with os.fdopen(fd, 'wb') as destino:
+                for bloco in content.chunks():
+                    hash_.update(bloco)
+                    destino.write(bloco)
+            nome = nome_do_blob(hash_.hexdigest(), extensao)
+            if self._reaproveitar(nome):
+                os.unlink(temporario)
+            else:
+                self._instalar(temporario, nome, mover=os.replace)
+        except BaseException:
+            if os.path.exists(temporario):
+                os.unlink(temporario)
+            raise
+        return nome
+
+    def _reaproveitar(self, nome):
+        """Se o blob já existe, renova o mtime (carência da coleta) e retorna True."""
+        caminho = self.path(nome)
+        try:
+            os.utime(caminho)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def apagar_se_antigo(self, nome, limite, quarentena=None):
+        """
+            Apaga o blob (ou o move para ``quarentena``, preservando o nome) se
+            ele não foi reaproveitado desde ``limite`` (timestamp). O arquivo
+            sai primeiro do lugar com um rename atômico: depois dele um
+            ``_reaproveitar`` concorrente não o encontra e instala uma cópia nova,
+            e o mtime conferido em seguida já inclui os reaproveitamentos
+            anteriores. Retorna True se o blob foi removido.
+        """
+        caminho = self.path(nome)
+        reservado = f'{caminho}.{uuid.uuid4().hex}.apagando'
+        try:
+            os.rename(caminho, reservado)
+        except FileNotFoundError:
+            return False
+        if os.path.getmtime(reservado) >= limite:
+            # Mesmo conteúdo de uma cópia que tenha sido instalada nesse meio-tempo.
+            os.replace(reservado, caminho)
+            return False
+        if quarentena:
+            destino = os.path.join(quarentena, nome)
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            shutil.move(reservado, destino)
+        else:
+            os.unlink(reservado)
+        return True
+
+    def _instalar(self, origem, nome, mover):
+        caminho = self.path(nome)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        try:
+            mover(origem, caminho)
+        except FileExistsError:
+            return  # upload idêntico e simultâneo instalou o mesmo blob
+        if self.file_permissions_mode is not None:
+            os.chmod(caminho, self.file_permissions_mode)
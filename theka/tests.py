@@ -0,0 +1,791 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+from io import StringIO
+from django.core.management import call_command
+from django.test import override_settings
+from django.db import connection, connections
+from concurrent.futures import ThreadPoolExecutor
+from django.db import IntegrityError
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase
+from django.urls import ResolverMatch, reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from library.models import Livro, Genero, Editora
+from library import autocomplete
+from library.views import LivroViewSet
+from institucional.models import MembrosEquipe
+from theka.routers import ReplicaMiddleware, ReplicaRouter
+from theka.db import aplicar_pragmas
+from theka.writer import FilaEscrita, apos_commit, executar_escrita
+from theka import regressao
+from theka import schema as schema_cache
+from theka.metrics import DB_QUERIES_TOTAL, REQUESTS_TOTAL, registrar_acesso_cache
+from theka.management.commands.gc_media import Command as GcMediaCommand
+
+
+class MetricsTest(APITestCase):
+    """Testes para o endpoint /metrics"""
+
+    def setUp(self):
+        genero = Genero.objects.create(nome="Romance")
+        editora = Editora.objects.create(nome="Editora Métricas")
+        Livro.objects.create(
+            titulo="Livro Métricas",
+            numero_paginas=100,
+            isbn="9780000000001",
+            autor="Autor",
+            ano_publicacao=2020,
+            editora=editora,
+            resumo="Resumo do livro de métricas",
+            genero=genero,
+        )
+
+    def test_metrics_formato_prometheus(self):
+        """Testa que o endpoint responde no formato texto do Prometheus"""
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn(b'theka_request_latency_seconds', response.content)
+
+    def test_metrics_rotulos_viewset_e_action(self):
+        """Testa que as requisições são rotuladas com viewset e action"""
+        antes = REQUESTS_TOTAL.labels('LivroViewSet', 'novidades', 'GET', '200')._value.get()
+        self.client.get(reverse('livro-novidades'))
+        depois = REQUESTS_TOTAL.labels('LivroViewSet', 'novidades', 'GET', '200')._value.get()
+        self.assertEqual(depois, antes + 1)
+
+    def test_metrics_estatisticas_biblioteca(self):
+        """Testa a exposição das estatísticas da biblioteca como gauges"""
+        response = self.client.get(reverse('metrics'))
+        self.assertIn(b'theka_biblioteca_total_livros 1.0', response.content)
+
+    def test_metrics_contam_queries_da_replica(self):
+        """Testa que queries de outras conexões (réplica) entram na contagem"""
+        outra = connections.create_connection('default')
+        outra.ensure_connection()
+        self.addCleanup(outra.close)
+        original = LivroViewSet.novidades
+
+        def novidades(viewset, request):
+            with outra.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return original(viewset, request)
+
+        def queries_da_requisicao(view):
+            antes = DB_QUERIES_TOTAL.labels('LivroViewSet', 'novidades')._value.get()
+            with mock.patch.object(connections, 'all', return_value=[connection, outra]), \
+                    mock.patch.object(LivroViewSet, 'novidades', view):
+                self.client.get(reverse('livro-novidades'))
+            return DB_QUERIES_TOTAL.labels('LivroViewSet', 'novidades')._value.get() - antes
+
+        sem_replica = queries_da_requisicao(original)
+        com_replica = queries_da_requisicao(novidades)
+        self.assertEqual(com_replica, sem_replica + 1)
+
+    def test_metrics_cache(self):
+        """Testa o contador de acessos a cache"""
+        registrar_acesso_cache('teste', hit=True)
+        response = self.client.get(reverse('metrics'))
+        self.assertIn(b'theka_cache_requests_total{cache="teste",result="hit"}', response.content)
+
+
+@override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+class SlowQueryTest(APITestCase):
+    """Testes para o log de queries lentas"""
+
+    def test_registra_query_com_plano(self):
+        """Testa que queries acima do limite são registradas com o plano"""
+        with self.assertLogs('theka.slow_queries', level='INFO') as logs:
+            self.client.get(reverse('livro-list'), {'search': 'dom'})
+
+        registros = [json.loads(linha.split(':', 2)[2]) for linha in logs.output]
+        registro = next(r for r in registros if 'library_livro' in r['sql'])
+        self.assertEqual(registro['view'], 'LivroViewSet')
+        self.assertEqual(registro['action'], 'list')
+        self.assertIn('%dom%', registro['params'])
+        self.assertTrue(any('SCAN' in linha for linha in registro['plano']))
+
+    def test_query_da_replica_explicada_na_propria_conexao(self):
+        """Testa que a query de outra conexão é registrada e explicada nela"""
+        outra = connections.create_connection('default')
+        outra.alias = 'replica'
+        self.addCleanup(outra.close)
+        original = LivroViewSet.novidades
+
+        def novidades(viewset, request):
+            with outra.cursor() as cursor:
+                cursor.execute('SELECT 1 WHERE 1 = %s', [1])
+            return original(viewset, request)
+
+        with mock.patch.object(connections, 'all', return_value=[connection, outra]), \
+                mock.patch.object(LivroViewSet, 'novidades', novidades), \
+                mock.patch('theka.slow_queries.explicar_query', return_value=[]) as explicar, \
+                self.assertLogs('theka.slow_queries', level='INFO') as logs:
+            self.client.get(reverse('livro-novidades'))
+
+        registros = [json.loads(linha.split(':', 2)[2]) for linha in logs.output]
+        self.assertIn('replica', [registro['banco'] for registro in registros])
+        explicar.assert_any_call('SELECT 1 WHERE 1 = %s', [1], outra)
+
+    def test_relatorio_agrupa_por_fingerprint(self):
+        """Testa que o relatório agrupa queries equivalentes"""
+        registros = [
+            {'sql': 'SELECT * FROM library_livro WHERE id IN (%s, %s)', 'duracao_ms': 120.0,
+             'view': 'LivroViewSet', 'action': 'list', 'plano': ['2 0 0 SCAN library_livro']},
+            {'sql': 'SELECT * FROM library_livro WHERE id IN (%s)', 'duracao_ms': 300.0,
+             'view': 'LivroViewSet', 'action': 'retrieve', 'plano': ['2 0 0 SCAN library_livro']},
+        ]
+        with tempfile.TemporaryDirectory() as diretorio:
+            caminho = os.path.join(diretorio, 'slow.jsonl')
+            with open(caminho, 'w', encoding='utf-8') as arquivo:
+                arquivo.writelines(json.dumps(r) + '\n' for r in registros)
+
+            saida = StringIO()
+            call_command('slow_queries', arquivo=caminho, json=True, stdout=saida)
+
+        grupos = json.loads(saida.getvalue())
+        self.assertEqual(len(grupos), 1)
+        self.assertEqual(grupos[0]['ocorrencias'], 2)
+        self.assertEqual(grupos[0]['max_ms'], 300.0)
+        self.assertEqual(grupos[0]['views'], ['LivroViewSet.list', 'LivroViewSet.retrieve'])
+
+
+class SqlitePragmasTest(APITestCase):
+    """Testes para a configuração das conexões SQLite"""
+
+    def test_pragmas_aplicados_na_conexao(self):
+        """Testa que os PRAGMAs de SQLITE_PRAGMAS são aplicados"""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA temp_store')
+            self.assertEqual(cursor.fetchone()[0], 2)  # MEMORY
+
+
+class AplicarPragmasTest(SimpleTestCase):
+    """Testes para a validação dos valores de PRAGMA"""
+
+    def test_valor_invalido(self):
+        """Testa que valores com caracteres inesperados são rejeitados"""
+        with self.assertRaises(ValueError):
+            aplicar_pragmas(None, {'journal_mode': 'WAL; DROP TABLE x'})
+
+
+class FilaEscritaTest(TransactionTestCase):
+    """Testes para a fila de escrita serializada"""
+
+    def setUp(self):
+        self.fila = FilaEscrita(tamanho_lote=16, espera_ms=20)
+
+    def tearDown(self):
+        self.fila.encerrar(timeout=5)
+
+    def test_escritas_concorrentes_agrupadas(self):
+        """Testa que escritas concorrentes são executadas pela thread escritora"""
+        threads = set()
+
+        def criar(nome):
+            threads.add(threading.current_thread().name)
+            return Genero.objects.create(nome=nome).pk
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futuros = [
+                executor.submit(lambda n=n: self.fila.submeter(criar, f'Genero {n}').result(5))
+                for n in 'ABCDEFGHIJKLMNOP'
+            ]
+            ids = [futuro.result() for futuro in futuros]
+
+        self.assertEqual(len(set(ids)), 16)
+        self.assertEqual(threads, {'theka-escritor'})
+        self.assertEqual(Genero.objects.count(), 16)
+
+    def test_falha_isolada_no_lote(self):
+        """Testa que uma falha afeta apenas a operação correspondente"""
+        Genero.objects.create(nome='Drama')
+        ok = self.fila.submeter(Genero.objects.create, nome='Poesia')
+        duplicado = self.fila.submeter(Genero.objects.create, nome='Drama')
+
+        self.assertEqual(ok.result(5).nome, 'Poesia')
+        with self.assertRaises(IntegrityError):
+            duplicado.result(5)
+        self.assertEqual(Genero.objects.count(), 2)
+
+    def test_falha_ao_abrir_transacao_resolve_todo_o_lote(self):
+        """Testa que um erro no BEGIN chega a todos os chamadores, sem esperar o timeout"""
+        from django.db import OperationalError, transaction as transacao
+
+        bloqueado = OperationalError('database is locked')
+        with mock.patch.object(transacao.Atomic, '__enter__', side_effect=bloqueado):
+            futuros = [self.fila.submeter(Genero.objects.create, nome=nome) for nome in ('Poesia', 'Drama')]
+            for futuro in futuros:
+                with self.assertRaises(OperationalError):
+                    futuro.result(5)
+        self.assertEqual(Genero.objects.count(), 0)
+
+    def test_pos_commit_fora_da_thread_escritora(self):
+        """Testa que os callbacks pós-commit de uma escrita da fila rodam na thread auxiliar"""
+        executados = []
+        pronto = threading.Event()
+
+        def criar():
+            genero = Genero.objects.create(nome='Poesia')
+            apos_commit(lambda: (executados.append(threading.current_thread().name), pronto.set()))
+            return genero.pk
+
+        self.fila.submeter(criar).result(5)
+        self.assertTrue(pronto.wait(5))
+        self.assertTrue(executados[0].startswith('theka-pos-commit'))
+
+    @override_settings(WRITE_QUEUE_ENABLED=True, WRITE_QUEUE_TIMEOUT=0.05)
+    def test_timeout_cancela_escrita_ainda_na_fila(self):
+        """Testa que a escrita que estourou o timeout na fila não é executada depois"""
+        liberar = threading.Event()
+        bloqueio = self.fila.submeter(liberar.wait, 5)
+        with mock.patch('theka.writer.obter_fila', return_value=self.fila):
+            with self.assertRaises(TimeoutError):
+                executar_escrita(Genero.objects.create, nome='Poesia')
+        liberar.set()
+        bloqueio.result(5)
+        self.fila.submeter(lambda: None).result(5)
+        self.assertFalse(Genero.objects.exists())
+
+    @override_settings(WRITE_QUEUE_ENABLED=True, WRITE_QUEUE_TIMEOUT=0.05)
+    def test_timeout_espera_escrita_em_andamento(self):
+        """Testa que a escrita já em execução é aguardada em vez de virar erro"""
+        def criar():
+            time.sleep(0.2)
+            return Genero.objects.create(nome='Poesia').pk
+
+        with mock.patch('theka.writer.obter_fila', return_value=self.fila):
+            pk = executar_escrita(criar)
+        self.assertTrue(Genero.objects.filter(pk=pk).exists())
+
+
+@override_settings(DATABASE_REPLICA_ALIAS='default', CACHE_COMPARTILHADO=True)
+class ReplicaMiddlewareTest(SimpleTestCase):
+    """Testes para a decisão de leitura na réplica"""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.decisoes = []
+
+        def get_response(request):
+            # Reproduz o handler do Django, que resolve a URL antes da view.
+            request.resolver_match = ResolverMatch(self.view, (), {})
+            self.decisoes.append(ReplicaRouter().db_for_read(Livro))
+            return HttpResponse(status=201 if request.method == 'POST' else 200)
+
+        self.middleware = ReplicaMiddleware(get_response)
+
+    def executar(self, metodo, actions):
+        self.view = LivroViewSet.as_view(actions)
+        return self.middleware(getattr(self.factory, metodo)('/livros/'))
+
+    def test_leitura_vai_para_replica(self):
+        """Testa que actions de leitura usam a réplica"""
+        self.executar('get', {'get': 'list'})
+        self.assertEqual(self.decisoes, ['default'])
+        self.assertIsNone(ReplicaRouter().db_for_read(Livro))
+
+    def test_escrita_vai_para_primario(self):
+        """Testa que escritas nunca usam a réplica"""
+        self.executar('post', {'post': 'create'})
+        self.assertEqual(self.decisoes, [None])
+        self.assertEqual(ReplicaRouter().db_for_write(Livro), 'default')
+
+    def test_read_your_writes(self):
+        """Testa que o cliente lê do primário logo após escrever"""
+        self.executar('post', {'post': 'create'})
+        self.executar('get', {'get': 'list'})
+        self.assertEqual(self.decisoes, [None, None])
+
+    @override_settings(CACHE_COMPARTILHADO=False)
+    def test_sem_cache_compartilhado_le_do_primario(self):
+        """Testa que, sem cache compartilhado, a réplica não é usada"""
+        self.executar('get', {'get': 'list'})
+        self.assertEqual(self.decisoes, [None])
+
+
+class AsyncViewsTest(APITestCase):
+    """Testes para as views assíncronas de leitura (theka/urls_asgi.py)"""
+
+    def setUp(self):
+        genero = Genero.objects.create(nome="Fantasia")
+        editora = Editora.objects.create(nome="Editora Async")
+        self.livros = [
+            Livro.objects.create(
+                titulo=f"Livro {i}",
+                numero_paginas=100 + i,
+                isbn=f"97800000001{i:02d}",
+                autor=f"Autor {i}",
+                ano_publicacao=2000 + i,
+                editora=editora,
+                resumo="Resumo do livro assíncrono",
+                genero=genero,
+            )
+            for i in range(12)
+        ]
+        MembrosEquipe.objects.create(nome="Ana", cargo="Curadora")
+
+    async def comparar(self, url, **params):
+        sincrono = await self.async_client.get(url, params)
+        with self.settings(ROOT_URLCONF='theka.urls_asgi'):
+            assincrono = await self.async_client.get(url, params)
+        self.assertEqual(assincrono.status_code, sincrono.status_code)
+        self.assertEqual(assincrono.content, sincrono.content)
+        return assincrono
+
+    async def test_list_paginado_identico(self):
+        """Testa que a listagem paginada tem o mesmo payload"""
+        response = await self.comparar('/livros/')
+        # O header Allow é adicionado só pelo DRF: a resposta veio da view assíncrona.
+        self.assertFalse(response.has_header('Allow'))
+        await self.comparar('/livros/', page=2)
+        await self.comparar('/livros/', page=2, page_size=5)
+
+    async def test_retrieve_e_actions_identicos(self):
+        """Testa retrieve, novidades e destaque-mes"""
+        await self.comparar(f'/livros/{self.livros[0].pk}/')
+        await self.comparar('/livros/novidades/')
+        await self.comparar('/livros/destaque-mes/')
+        await self.comparar('/institucional/membros-equipe/')
+
+    async def test_autocomplete_identico(self):
+        """Testa que o autocomplete assíncrono responde como o síncrono"""
+        autocomplete.reiniciar()
+        self.addCleanup(autocomplete.reiniciar)
+        await self.comparar('/livros/autocomplete/', q='livro 1', limite=3)
+        await self.comparar('/livros/autocomplete/', q='autor')
+
+    async def test_fallback_para_view_sincrona(self):
+        """Testa que filtros, busca e 404 são delegados ao viewset"""
+        response = await self.comparar('/livros/', search='Livro 1')
+        self.assertTrue(response.has_header('Allow'))
+        await self.comparar('/livros/', page=99)
+        response = await self.comparar('/livros/999999/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SchemaCacheTest(APITestCase):
+    """Testes para o schema OpenAPI pré-calculado"""
+
+    def setUp(self):
+        self.diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.diretorio.cleanup)
+        self.addCleanup(schema_cache._cache.clear)
+        schema_cache._cache.clear()
+        override = self.settings(SCHEMA_CACHE_DIR=self.diretorio.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_schema_servido_com_etag(self):
+        """Testa que o schema é gerado uma vez e revalidado por ETag"""
+        response = self.client.get(reverse('schema'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(b'Theka API', response.content)
+        self.assertTrue(response['Content-Type'].startswith('application/vnd.oai.openapi'))
+
+        versao = schema_cache.versao_codigo()
+        self.assertTrue(schema_cache.caminho_schema(versao, 'yaml').exists())
+
+        response = self.client.get(reverse('schema'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_schema_revalidado_com_lista_e_etag_fraca(self):
+        """Testa que o If-None-Match aceita listas, ETags fracas e ``*``"""
+        etag = self.client.get(reverse('schema'))['ETag']
+        for cabecalho in (f'"outra", W/{etag}', '*'):
+            response = self.client.get(reverse('schema'), HTTP_IF_NONE_MATCH=cabecalho)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(reverse('schema'), HTTP_IF_NONE_MATCH='"outra"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_schema_json(self):
+        """Testa a negociação do formato JSON"""
+        response = self.client.get(reverse('schema'), {'format': 'json'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('/livros/', json.loads(response.content)['paths'])
+
+    def test_schema_do_lote(self):
+        """Testa que o /batch/ entra no schema com corpo e resposta tipados"""
+        response = self.client.get(reverse('schema'), {'format': 'json'})
+        operacao = json.loads(response.content)['paths']['/batch/']['post']
+        self.assertEqual(
+            operacao['requestBody']['content']['application/json']['schema']['$ref'],
+            '#/components/schemas/BatchRequisicao',
+        )
+        self.assertEqual(
+            operacao['responses']['200']['content']['application/json']['schema']['$ref'],
+            '#/components/schemas/BatchResposta',
+        )
+
+    def test_generate_schema(self):
+        """Testa o comando que gera o schema no build"""
+        call_command('generate_schema', stdout=StringIO())
+        versao = schema_cache.versao_codigo()
+        for formato in schema_cache.FORMATOS:
+            self.assertTrue(schema_cache.caminho_schema(versao, formato).exists())
+
+
+class LeanMiddlewareTest(APITestCase):
+    """Testes para a faixa enxuta de middlewares da API"""
+
+    def test_api_sem_sessao_e_mensagens(self):
+        """Testa que as rotas da API pulam sessão e mensagens"""
+        response = self.client.get(reverse('livro-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(hasattr(response.wsgi_request, 'session'))
+        self.assertFalse(hasattr(response.wsgi_request, '_messages'))
+
+    def test_docs_mantem_cabecalhos_de_seguranca(self):
+        """Testa que o /docs/ (HTML) mantém clickjacking e os cabeçalhos de segurança"""
+        response = self.client.get(reverse('swagger-ui'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Frame-Options'], 'DENY')
+        self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+
+    def test_admin_com_pilha_completa(self):
+        """Testa que o /admin/ mantém a pilha completa"""
+        response = self.client.get('/admin/login/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Frame-Options'], 'DENY')
+        self.assertTrue(hasattr(response.wsgi_request, 'session'))
+        self.assertIn('csrftoken', response.cookies)
+
+
+class BenchmarkApiTest(APITestCase):
+    """Testes para a base sintética e o benchmark da API"""
+
+    @override_settings(ALLOWED_HOSTS=['localhost'])
+    def test_seed_e_benchmark(self):
+        """Testa que a base sintética alimenta todos os cenários sem erros"""
+        call_command('seed_synthetic', livros=30, usuarios=3, editoras=5, stdout=StringIO())
+        self.assertEqual(Livro.objects.filter(isbn__startswith='979-99-').count(), 30)
+
+        with tempfile.TemporaryDirectory() as diretorio:
+            destino = os.path.join(diretorio, 'resultado.json')
+            call_command('benchmark_api', requisicoes=2, aquecimento=0, saida=destino, stdout=StringIO())
+            with open(destino) as arquivo:
+                relatorio = json.load(arquivo)
+
+        self.assertIn('token', relatorio['cenarios'])
+        for nome, resultado in relatorio['cenarios'].items():
+            self.assertEqual(resultado['erros'], 0, nome)
+            self.assertGreater(resultado['queries_por_requisicao'], 0, nome)
+
+
+class RegressaoDesempenhoTest(APITestCase):
+    """Guarda de regressão de queries e latência de todas as rotas de leitura"""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_synthetic', livros=25, usuarios=3, editoras=5, stdout=StringIO())
+
+    def test_rotas_dentro_do_baseline(self):
+        """Testa que nenhuma rota GET faz mais queries ou é mais lenta que o baseline"""
+        baselines = regressao.carregar_baselines()
+        rotas = dict(regressao.rotas_de_leitura())
+        medidos = {}
+        for nome, url in rotas.items():
+            medido = regressao.medir_rota(self.client, url)
+            self.assertEqual(medido['status'], status.HTTP_200_OK, f'{nome} ({url})')
+            medidos[nome] = medido
+
+        modo = regressao.atualizar_baselines()
+        if modo:
+            regressao.salvar_baselines(regressao.mesclar_baselines(baselines, medidos, modo))
+            self.skipTest(f'Baseline gravado em {regressao.CAMINHO_BASELINES} ({modo})')
+
+        fator = regressao.fator_maquina(medidos, baselines)
+        problemas = []
+        for nome, medido in medidos.items():
+            baseline = baselines.get(nome)
+            if baseline is not None and regressao.acima_do_orcamento(medido, baseline, fator)[0]:
+                # Uma regressão de verdade se repete; um pico do ambiente, não.
+                medido = regressao.medir_rota(self.client, rotas[nome])
+            problemas.extend(regressao.comparar(nome, medido, baseline, fator))
+        self.assertFalse(problemas, '\n\n'.join(problemas))
+
+    def test_diff_das_queries_novas(self):
+        """Testa que uma regressão lista as queries que apareceram"""
+        baseline = {'queries': 1, 'sql': ['SELECT * FROM livro'], 'latencia_ms': 1.0}
+        medido = {'queries': 2, 'sql': ['SELECT * FROM livro', 'SELECT * FROM genero WHERE id = ?'],
+                  'latencia_ms': 1.0}
+        problemas = regressao.comparar('livro-list', medido, baseline)
+        self.assertEqual(len(problemas), 1)
+        self.assertIn('+SELECT * FROM genero WHERE id = ?', problemas[0])
+
+    def test_orcamento_de_latencia(self):
+        """Testa que a lentidão geral da máquina é descontada, mas a de uma rota isolada não"""
+        baselines = {nome: {'latencia_ms': 10.0} for nome in 'abcde'}
+        lenta = {nome: {'latencia_ms': 20.0} for nome in 'abcde'}
+        self.assertEqual(regressao.fator_maquina(lenta, baselines), 2.0)
+        medidos = {nome: {'latencia_ms': 10.0} for nome in 'abcd'}
+        medidos['e'] = {'latencia_ms': 16.0}
+        fator = regressao.fator_maquina(medidos, baselines)
+        self.assertEqual(fator, 1.0)
+        self.assertTrue(regressao.acima_do_orcamento(medidos['e'], baselines['e'], fator)[0])
+
+    def test_atualizacao_so_acrescenta_rotas_novas(self):
+        """Testa que regravar o baseline não altera as rotas já gravadas"""
+        baselines = {'livro-list': {'latencia_ms': 10.0}}
+        medidos = {'livro-list': {'latencia_ms': 14.0}, 'livro-nova': {'latencia_ms': 2.0}}
+        self.assertEqual(
+            regressao.mesclar_baselines(baselines, medidos, 'novas'),
+            {'livro-list': {'latencia_ms': 10.0}, 'livro-nova': {'latencia_ms': 2.0}},
+        )
+        self.assertEqual(regressao.mesclar_baselines(baselines, medidos, 'tudo'), medidos)
+
+
+class BatchViewTest(APITestCase):
+    """Testes para o endpoint composto /batch/"""
+
+    def setUp(self):
+        self.genero = Genero.objects.create(nome="Fantasia")
+        editora = Editora.objects.create(nome="Editora Lote")
+        self.livro = Livro.objects.create(
+            titulo="Livro Lote", numero_paginas=100, isbn="9780000000077", autor="Autor",
+            ano_publicacao=2020, editora=editora, resumo="Resumo", genero=self.genero,
+        )
+
+    def lote(self, urls, **extra):
+        return self.client.post(reverse('batch'), {'requisicoes': urls}, format='json', **extra)
+
+    def test_respostas_iguais_as_individuais(self):
+        """Testa que cada sub-requisição retorna o mesmo corpo da chamada direta"""
+        urls = ['/livros/novidades/', '/livros/destaque-mes/', '/generos/',
+                f'/livros/{self.livro.id}/', '/livros/?page_size=1']
+        response = self.lote(urls)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        respostas = response.data['respostas']
+        self.assertEqual([resposta['url'] for resposta in respostas], urls)
+        for url, resposta in zip(urls, respostas):
+            direta = self.client.get(url)
+            self.assertEqual(resposta['status'], direta.status_code, url)
+            self.assertEqual(resposta['corpo'], direta.json(), url)
+
+    def test_erros_por_sub_requisicao(self):
+        """Testa 404, caminho externo e lote aninhado sem derrubar o lote"""
+        response = self.lote(['/livros/999999/', '/livros/nao-existe/x/', 'https://exemplo.com/livros/',
+                              '/batch/', '/generos/'])
+        self.assertEqual(
+            [resposta['status'] for resposta in response.data['respostas']],
+            [404, 404, 400, 403, 200],
+        )
+
+    def test_apenas_rotas_da_api(self):
+        """Testa que admin, métricas, mídia e documentação ficam fora do lote"""
+        urls = ['/admin/', '/metrics', '/media/capas_livros/capa.jpg', '/schema/', '/auth/token/']
+        response = self.lote(urls)
+        self.assertEqual([resposta['status'] for resposta in response.data['respostas']], [403] * len(urls))
+
+    def test_usuario_repassado(self):
+        """Testa que as sub-requisições recebem o usuário já autenticado"""
+        usuario = User.objects.create_user('leitor', 'leitor@theka.test', 'Senha123!')
+        self.client.force_authenticate(usuario)
+        capturados = []
+        original = LivroViewSet.novidades
+
+        def novidades(viewset, request):
+            capturados.append(request.user)
+            return original(viewset, request)
+
+        with mock.patch.object(LivroViewSet, 'novidades', novidades):
+            self.lote(['/livros/novidades/'])
+        self.assertEqual(capturados, [usuario])
+
+    @override_settings(BATCH_MAX_REQUISICOES=2)
+    def test_limite_de_requisicoes(self):
+        """Testa 400 acima do número máximo de sub-requisições"""
+        response = self.lote(['/generos/'] * 3)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(reverse('batch'), {'requisicoes': '/generos/'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(BATCH_TEMPO_MAX_MS=0)
+    def test_tempo_esgotado(self):
+        """Testa que, esgotado o tempo, as sub-requisições restantes voltam com 503"""
+        response = self.lote(['/generos/', '/generos/'])
+        self.assertEqual([resposta['status'] for resposta in response.data['respostas']], [503, 503])
+
+    def test_lote_nao_abre_janela_de_escrita(self):
+        """Testa que o POST do lote não conta como escrita para a réplica"""
+        request = RequestFactory().post('/batch/')
+        request._somente_leitura = True
+        self.assertFalse(ReplicaMiddleware._escreveu(request, HttpResponse()))
+
+
+class MediaViewTest(APITestCase):
+    """Testes para a entrega dos arquivos de mídia"""
+
+    def setUp(self):
+        self.diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.diretorio.cleanup)
+        override = self.settings(MEDIA_ROOT=self.diretorio.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        os.makedirs(os.path.join(self.diretorio.name, 'capas_livros'))
+        self.conteudo = bytes(range(256)) * 4
+        for nome in ('capas_livros/capa.jpg', 'capas_livros/3f2a9c1b7d4e5f60.jpg'):
+            with open(os.path.join(self.diretorio.name, nome), 'wb') as arquivo:
+                arquivo.write(self.conteudo)
+
+    def get(self, caminho, **headers):
+        return self.client.get(f'/media/{caminho}', **headers)
+
+    def test_arquivo_completo_e_cache(self):
+        """Testa a entrega completa com ETag, Last-Modified e cache"""
+        response = self.get('capas_livros/capa.jpg')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), self.conteudo)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertTrue(response.has_header('Last-Modified'))
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+        response = self.get('capas_livros/3f2a9c1b7d4e5f60.jpg')
+        self.assertIn('immutable', response['Cache-Control'])
+        response.close()
+
+    def test_requisicoes_condicionais(self):
+        """Testa 304 para If-None-Match e If-Modified-Since"""
+        response = self.get('capas_livros/capa.jpg')
+        response.close()
+        etag, modificado = response['ETag'], response['Last-Modified']
+        response = self.get('capas_livros/capa.jpg', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        response = self.get('capas_livros/capa.jpg', HTTP_IF_MODIFIED_SINCE=modificado)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_range(self):
+        """Testa intervalos, sufixo, If-Range desatualizado e intervalo inválido"""
+        response = self.get('capas_livros/capa.jpg', HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(response.streaming_content), self.conteudo[10:20])
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.conteudo)}')
+        self.assertEqual(response['Content-Length'], '10')
+
+        response = self.get('capas_livros/capa.jpg', HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), self.conteudo[-5:])
+
+        response = self.get('capas_livros/capa.jpg', HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"outro"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response.close()
+
+        response = self.get('capas_livros/capa.jpg', HTTP_RANGE='bytes=5000-')
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.conteudo)}')
+
+    def test_sendfile(self):
+        """Testa a delegação ao servidor da frente"""
+        with self.settings(MEDIA_SENDFILE='x-accel-redirect'):
+            response = self.get('capas_livros/capa.jpg')
+        self.assertEqual(response['X-Accel-Redirect'], '/_media_interna/capas_livros/capa.jpg')
+        self.assertEqual(response.content, b'')
+        with self.settings(MEDIA_SENDFILE='x-sendfile'):
+            response = self.get('capas_livros/capa.jpg')
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.diretorio.name, 'capas_livros', 'capa.jpg'))
+
+    def test_caminhos_invalidos(self):
+        """Testa 404 para arquivo inexistente, diretório e fuga do MEDIA_ROOT"""
+        self.assertEqual(self.get('capas_livros/nao-existe.jpg').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.get('capas_livros').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.get('../settings.py').status_code, status.HTTP_404_NOT_FOUND)
+
+
+class GcMediaTest(APITestCase):
+    """Testes para a coleta de arquivos de mídia sem referência"""
+
+    def setUp(self):
+        self.diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.diretorio.cleanup)
+        self.quarentena = os.path.join(self.diretorio.name, 'quarentena')
+        self.media = os.path.join(self.diretorio.name, 'media')
+        override = self.settings(MEDIA_ROOT=self.media, MEDIA_QUARENTENA=self.quarentena)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.livro = Livro.objects.create(
+            titulo="Livro Capa", numero_paginas=100, isbn="9780000000088", autor="Autor",
+            ano_publicacao=2020, resumo="Resumo",
+            editora=Editora.objects.create(nome="Editora GC"), genero=Genero.objects.create(nome="Drama"),
+            capa=SimpleUploadedFile('capa.jpg', b'capa em uso', content_type='image/jpeg'),
+        )
+        MembrosEquipe.objects.create(nome="Ana", cargo="Curadora", foto='equipe/ana.jpg')
+        antigo = time.time() - 7200
+        for nome, conteudo in (('equipe/ana.jpg', b'foto'), ('capas_livros/orfa.jpg', b'sem dono'),
+                               ('valores/orfa.png', b'12345')):
+            self.escrever(nome, conteudo, antigo)
+        self.escrever('banners/recente.jpg', b'upload em andamento', time.time())
+        os.utime(os.path.join(self.media, self.livro.capa.name), (antigo, antigo))
+
+    def escrever(self, nome, conteudo, mtime):
+        caminho = os.path.join(self.media, nome)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with open(caminho, 'wb') as arquivo:
+            arquivo.write(conteudo)
+        os.utime(caminho, (mtime, mtime))
+
+    def arquivos(self, raiz):
+        return sorted(
+            os.path.relpath(os.path.join(pasta, nome), raiz)
+            for pasta, _, nomes in os.walk(raiz) for nome in nomes
+        )
+
+    def executar(self, **opcoes):
+        saida = StringIO()
+        call_command('gc_media', stdout=saida, **opcoes)
+        return saida.getvalue()
+
+    def test_dry_run(self):
+        """Testa que o dry run só reporta o que seria removido"""
+        antes = self.arquivos(self.media)
+        saida = self.executar(dry_run=True)
+        self.assertEqual(self.arquivos(self.media), antes)
+        self.assertIn('2 sem referência seriam removidos (13 bytes', saida)
+
+    def test_remove_apenas_orfaos_antigos(self):
+        """Testa que só os arquivos antigos e sem referência são apagados"""
+        self.executar(lote=1)
+        self.assertEqual(
+            self.arquivos(self.media),
+            sorted(['banners/recente.jpg', 'equipe/ana.jpg', self.livro.capa.name]),
+        )
+
+    def test_quarentena(self):
+        """Testa que, com --quarentena, os órfãos são movidos preservando o caminho"""
+        self.executar(quarentena=self.quarentena)
+        self.assertEqual(self.arquivos(self.quarentena), ['capas_livros/orfa.jpg', 'valores/orfa.png'])
+        self.assertNotIn('capas_livros/orfa.jpg', self.arquivos(self.media))
+
+    def test_blob_reaproveitado_depois_da_varredura(self):
+        """Testa que um blob reaproveitado entre a varredura e a remoção é mantido"""
+        blob, reaproveitado = 'blobs/ab/cd/' + 'ab' * 32 + '.jpg', 'blobs/ef/01/' + 'ef' * 32 + '.jpg'
+        antigo = time.time() - 7200
+        self.escrever(blob, b'blob sem dono', antigo)
+        self.escrever(reaproveitado, b'upload identico', antigo)
+        processar = GcMediaCommand.processar
+
+        def reaproveitar_antes(comando, lote, *args):
+            # Upload idêntico concorrente: renova o mtime depois da varredura.
+            default_storage._reaproveitar(reaproveitado)
+            return processar(comando, lote, *args)
+
+        with mock.patch.object(GcMediaCommand, 'processar', reaproveitar_antes):
+            self.executar()
+        arquivos = self.arquivos(self.media)
+        self.assertIn(reaproveitado, arquivos)
+        self.assertNotIn(blob, arquivos)
@@ -0,0 +1,175 @@
+"""
+Throttling por token bucket.
+
+Cada chave (escopo + IP, escopo + email...) tem um balde com capacidade igual
+ao número de requisições da taxa (ex.: ``'5/min'``) que se reabastece de forma
+contínua ao longo do período. A verificação é feita no ``initial()`` do DRF,
+antes do handler: uma requisição recusada não chega a consultar o banco nem a
+calcular hash de senha.
+
+Com ``CACHE_COMPARTILHADO`` os baldes ficam no cache do Django
+(``ArmazemBaldesCache``), com ``add``/``incr`` atômicos, e o limite vale para
+todos os processos. Sem ele (LocMem, que descarta chaves ao encher), ficam num
+dicionário do processo (``ArmazemBaldes``): acima de ``THROTTLE_MAX_KEYS`` só
+são descartados baldes já cheios, para que girar chaves novas não apague o
+balde de quem está sendo limitado.
+"""
+import threading
+import time
+from collections import OrderedDict
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODOS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+# Baldes examinados por descarte quando o armazém local passa do limite.
+VARREDURA_DESCARTE = 64
+
+
+def interpretar_taxa(taxa):
+    """``'5/min'`` -> ``(5, 60)``: capacidade do balde e período em segundos."""
+    quantidade, periodo = taxa.split('/')
+    return int(quantidade), PERIODOS[periodo[0]]
+
+
+class ArmazemBaldes:
+    """Baldes de tokens por chave no processo, com descarte LRU só de baldes cheios."""
+
+    def __init__(self, max_chaves):
+        self.max_chaves = max_chaves
+        self._baldes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consumir(self, chave, capacidade, periodo):
+        """
+            Retira um token do balde de ``chave``. Retorna 0 se a requisição
+            é permitida ou os segundos até haver um token disponível.
+        """
+        agora = time.monotonic()
+        reposicao = capacidade / periodo
+        with self._lock:
+            tokens, ultimo, _ = self._baldes.pop(chave, (capacidade, agora, agora))
+            tokens = min(capacidade, tokens + (agora - ultimo) * reposicao)
+            if tokens >= 1:
+                tokens -= 1
+                espera = 0
+            else:
+                espera = (1 - tokens) / reposicao
+            self._baldes[chave] = (tokens, agora, agora + (capacidade - tokens) / reposicao)
+            if len(self._baldes) > self.max_chaves:
+                self._descartar_cheios(agora)
+        return espera
+
+    def _descartar_cheios(self, agora):
+        # Um balde ainda reabastecendo guarda o limite de quem está sendo
+        # barrado; se todos os examinados estão assim, o armazém cresce
+        # temporariamente além de max_chaves.
+        for chave, (_, _, cheio_em) in list(islice(self._baldes.items(), VARREDURA_DESCARTE)):
+            if len(self._baldes) <= self.max_chaves:
+                break
+            if cheio_em <= agora:
+                del self._baldes[chave]
+
+    def limpar(self):
+        with self._lock:
+            self._baldes.clear()
+
+
+class ArmazemBaldesCache:
+    """
+        Baldes no cache do Django, compartilhados entre processos. ``add`` e
+        ``incr`` são atômicos, mas não há compare-and-set, então o balde é
+        aproximado por uma janela deslizante: a contagem da janela atual mais
+        a da anterior, ponderada pelo quanto dela ainda cabe no período.
+    """
+    prefixo = 'throttle'
+
+    def _contar(self, chave, validade):
+        cache.add(chave, 0, validade)
+        try:
+            return cache.incr(chave)
+        except ValueError:  # chave expulsa do cache entre o add e o incr
+            cache.set(chave, 1, validade)
+            return 1
+
+    def consumir(self, chave, capacidade, periodo):
+        """Mesmo contrato de ``ArmazemBaldes.consumir``."""
+        janela, fracao = divmod(time.time() / periodo, 1)
+        atual = f'{self.prefixo}:{chave}:{int(janela)}'
+        contagem = self._contar(atual, periodo * 2)
+        anterior = cache.get(f'{self.prefixo}:{chave}:{int(janela) - 1}', 0)
+        if anterior * (1 - fracao) + contagem <= capacidade:
+            return 0
+
+        # Recusada: não conta para a janela.
+        try:
+            cache.decr(atual)
+        except ValueError:  # janela expirada ou expulsa do cache desde o incr
+            pass
+        livres = capacidade - contagem  # cabe mais uma quando o peso da anterior cair abaixo disso
+        if anterior and livres >= 0:
+            return max((1 - livres / anterior - fracao) * periodo, 0.001)
+        return (1 - fracao) * periodo
+
+
+baldes = ArmazemBaldes(settings.THROTTLE_MAX_KEYS)
+baldes_cache = ArmazemBaldesCache()
+
+
+def armazem():
+    """Armazém de baldes conforme o cache seja ou não compartilhado entre processos."""
+    return baldes_cache if settings.CACHE_COMPARTILHADO else baldes
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+        Throttle do DRF sobre o ``armazem()`` de baldes. Subclasses definem ``scope`` (a taxa
+        vem de ``DEFAULT_THROTTLE_RATES``) e ``get_ident_chave``.
+    """
+    scope = None
+
+    def __init__(self):
+        try:
+            taxa = api_settings.DEFAULT_THROTTLE_RATES[self.scope]
+        except KeyError:
+            raise ImproperlyConfigured(f"Sem taxa em DEFAULT_THROTTLE_RATES para o escopo '{self.scope}'.")
+        self.capacidade, self.periodo = interpretar_taxa(taxa)
+        self.espera = None
+
+    def get_ident_chave(self, request, view):
+        """Identificador do cliente para este escopo, ou None para não limitar."""
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        ident = self.get_ident_chave(request, view)
+        if ident is None:
+            return True
+        self.espera = armazem().consumir(f'{self.scope}:{ident}', self.capacidade, self.periodo)
+        return self.espera == 0
+
+    def wait(self):
+        return self.espera
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    """
+        Limita por IP do cliente. O X-Forwarded-For só é considerado até o
+        número de proxies confiáveis em ``NUM_PROXIES`` (padrão 0: REMOTE_ADDR).
+    """
+
+    def get_ident_chave(self, request, view):
+        return self.get_ident(request)
+
+
+class EmailTokenBucketThrottle(TokenBucketThrottle):
+    """Limita pelo email enviado no corpo, normalizado em minúsculas."""
+
+    def get_ident_chave(self, request, view):
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if not isinstance(email, str) or not email.strip():
+            return None
+        return email.strip().lower()
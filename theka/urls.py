@@ -14,27 +14,37 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
-from rest_framework_simplejwt.views import (
-    TokenRefreshView,
-)
-from users.views import EmailTokenObtainPairView
+from drf_spectacular.views import SpectacularSwaggerView
+from users.views import EmailTokenObtainPairView, RevocableTokenRefreshView
+from theka.lote import BatchView
+from theka.media import servir_media
+from theka.metrics import metrics_view
+from theka.schema import CachedSpectacularAPIView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('library.urls')),
     path('institucional/', include('institucional.urls')),
     path('', include('users.urls')),
-    path('schema/', SpectacularAPIView.as_view(), name='schema'),
+    path('schema/', CachedSpectacularAPIView.as_view(), name='schema'),
     path('docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
     path('auth/token/', EmailTokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('auth/token/refresh/', RevocableTokenRefreshView.as_view(), name='token_refresh'),
+    re_path(r'^metrics/?$', metrics_view, name='metrics'),
+    path('batch/', BatchView.as_view(), name='batch'),
 ]
 
+# Com MEDIA_URL absoluto (CDN) a mídia não passa pela aplicação.
+if settings.MEDIA_SERVIR and settings.MEDIA_URL.startswith('/'):
+    urlpatterns += [
+        re_path(rf'^{re.escape(settings.MEDIA_URL.lstrip("/"))}(?P<caminho>.+)$', servir_media, name='media'),
+    ]
+
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
@@ -0,0 +1,48 @@
+"""
+URLs usadas pelo ``theka/asgi.py``.
+
+As rotas de leitura mais acessadas apontam para views assíncronas
+(``theka.async_views``); todo o resto, e os casos que essas views não
+atendem, continua nas rotas síncronas de ``theka.urls``.
+"""
+from django.urls import path, re_path
+
+from institucional.views import (
+    ContatoViewSet,
+    EstatisticasBibliotecaViewSet,
+    MembrosEquipeViewSet,
+    NossaHistoriaViewSet,
+    NossosValoresViewSet,
+    SobreNosViewSet,
+    TopicosViewSet,
+)
+from library import async_views as library_async
+from theka.async_views import list_assincrono, retrieve_assincrono
+
+from .urls import urlpatterns as urlpatterns_sincronos
+
+INSTITUCIONAL = [
+    ('sobrenos', SobreNosViewSet),
+    ('nossa-historia', NossaHistoriaViewSet),
+    ('membros-equipe', MembrosEquipeViewSet),
+    ('nossos-valores', NossosValoresViewSet),
+    ('topicos', TopicosViewSet),
+    ('contato', ContatoViewSet),
+    ('estatisticas-biblioteca', EstatisticasBibliotecaViewSet),
+]
+
+urlpatterns = [
+    path('livros/', library_async.livros_list),
+    path('livros/novidades/', library_async.livros_novidades),
+    path('livros/destaque-mes/', library_async.livros_destaque_mes),
+    path('livros/autocomplete/', library_async.livros_autocomplete),
+    re_path(r'^livros/(?P<pk>[^/.]+)/$', library_async.livros_retrieve),
+]
+
+for prefixo, viewset in INSTITUCIONAL:
+    urlpatterns += [
+        path(f'institucional/{prefixo}/', list_assincrono(viewset)),
+        re_path(rf'^institucional/{prefixo}/(?P<pk>[^/.]+)/$', retrieve_assincrono(viewset)),
+    ]
+
+urlpatterns += urlpatterns_sincronos
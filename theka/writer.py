@@ -0,0 +1,221 @@
+"""
+Fila de escrita serializada para o SQLite.
+
+O SQLite aceita um único escritor por vez; com várias threads disputando o lock,
+rajadas de POST terminam em ``database is locked``. Quando
+``WRITE_QUEUE_ENABLED`` está ativo, as escritas encaminhadas por
+``executar_escrita`` são executadas por uma única thread escritora, que agrupa
+até ``WRITE_QUEUE_BATCH_SIZE`` operações em uma só transação (group commit).
+Cada operação roda em seu próprio savepoint, então uma falha afeta apenas o
+chamador correspondente. Os chamadores recebem um ``Future`` (``submeter``) ou
+o resultado síncrono (``executar_escrita``).
+
+A fila serializa as escritas de um processo; entre processos a disputa restante
+é absorvida pelo ``busy_timeout`` de ``SQLITE_PRAGMAS``.
+
+Os callbacks agendados com ``apos_commit`` por uma escrita da fila rodam em
+uma thread auxiliar, para que o trabalho pós-commit (índices em memória,
+remoção de arquivos) não atrase os lotes seguintes.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+logger = logging.getLogger(__name__)
+
+_PARAR = object()
+_thread_escritora = threading.local()
+
+
+class FilaEscrita:
+    """Thread escritora única com agrupamento de transações."""
+
+    def __init__(self, tamanho_lote=64, espera_ms=2):
+        self.tamanho_lote = tamanho_lote
+        self.espera = espera_ms / 1000
+        self._fila = queue.SimpleQueue()
+        self._thread = None
+        self._pos_commit = None
+        self._lock = threading.Lock()
+
+    def na_thread_escritora(self):
+        return threading.current_thread() is self._thread
+
+    def submeter(self, fn, *args, **kwargs):
+        """Enfileira ``fn(*args, **kwargs)`` e retorna um ``Future`` com o resultado."""
+        futuro = Future()
+        self._iniciar()
+        self._fila.put((futuro, fn, args, kwargs))
+        return futuro
+
+    def despachar(self, fn):
+        """Executa ``fn`` na thread auxiliar de pós-commit."""
+        with self._lock:
+            if self._pos_commit is None:
+                self._pos_commit = ThreadPoolExecutor(max_workers=1, thread_name_prefix='theka-pos-commit')
+            return self._pos_commit.submit(_executar_pos_commit, fn)
+
+    def encerrar(self, timeout=None):
+        """Processa o que já foi enfileirado e finaliza a thread escritora."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._fila.put(_PARAR)
+            thread.join(timeout)
+        with self._lock:
+            pos_commit, self._pos_commit = self._pos_commit, None
+        if pos_commit is not None:
+            pos_commit.shutdown(wait=True)
+
+    def _iniciar(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._executar, name='theka-escritor', daemon=True,
+                )
+                self._thread.start()
+
+    def _executar(self):
+        _thread_escritora.fila = self
+        try:
+            parar = False
+            while not parar:
+                item = self._fila.get()
+                if item is _PARAR:
+                    break
+                lote = [item]
+                prazo = time.monotonic() + self.espera
+                while len(lote) < self.tamanho_lote:
+                    restante = prazo - time.monotonic()
+                    try:
+                        item = self._fila.get(timeout=restante) if restante > 0 else self._fila.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _PARAR:
+                        parar = True
+                        break
+                    lote.append(item)
+                self._processar(lote)
+        finally:
+            connection.close()
+
+    def _processar(self, lote):
+        close_old_connections()
+        concluidos = []
+        try:
+            with transaction.atomic():
+                for futuro, fn, args, kwargs in lote:
+                    if not futuro.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        with transaction.atomic():
+                            concluidos.append((futuro, fn(*args, **kwargs), None))
+                    except Exception as erro:
+                        concluidos.append((futuro, None, erro))
+        except Exception as erro:
+            # Falha ao abrir ou ao confirmar a transação (ex.: "database is
+            # locked" por outro processo): nada do lote foi persistido e todos
+            # os chamadores recebem o erro, inclusive os que nem chegaram a rodar.
+            for futuro, _, _, _ in lote:
+                if not futuro.done():
+                    futuro.set_exception(erro)
+            return
+
+        for futuro, resultado, erro in concluidos:
+            if erro is not None:
+                futuro.set_exception(erro)
+            else:
+                futuro.set_result(resultado)
+
+
+def _executar_pos_commit(fn):
+    close_old_connections()
+    try:
+        fn()
+    except Exception:
+        logger.exception('Falha em callback pós-commit da fila de escrita.')
+    finally:
+        close_old_connections()
+
+
+_fila = None
+_fila_lock = threading.Lock()
+
+
+def obter_fila():
+    """Retorna a fila de escrita do processo, criando-a no primeiro uso."""
+    global _fila
+    if _fila is None:
+        with _fila_lock:
+            if _fila is None:
+                _fila = FilaEscrita(
+                    tamanho_lote=settings.WRITE_QUEUE_BATCH_SIZE,
+                    espera_ms=settings.WRITE_QUEUE_MAX_WAIT_MS,
+                )
+    return _fila
+
+
+def _despachar_pos_commit(fn):
+    fila = getattr(_thread_escritora, 'fila', None)
+    if fila is not None:
+        fila.despachar(fn)
+    else:
+        fn()
+
+
+def apos_commit(fn):
+    """
+        ``transaction.on_commit`` que, quando o commit é da thread escritora,
+        executa ``fn`` na thread auxiliar em vez de segurar a fila.
+    """
+    transaction.on_commit(partial(_despachar_pos_commit, fn))
+
+
+def executar_escrita(fn, *args, **kwargs):
+    """
+        Executa ``fn`` pela fila de escrita e retorna seu resultado.
+        Executa diretamente quando a fila está desligada, quando já estamos
+        na thread escritora (ex.: signals disparados por uma escrita da fila)
+        ou dentro de um ``atomic`` do chamador, cuja atomicidade seria perdida.
+
+        Se ``WRITE_QUEUE_TIMEOUT`` vence com a escrita ainda na fila, ela é
+        cancelada (a thread escritora a descarta) e o ``TimeoutError`` sobe;
+        se já está rodando, espera o desfecho em vez de responder erro para
+        uma escrita que ainda pode ser confirmada.
+    """
+    if not settings.WRITE_QUEUE_ENABLED or connection.in_atomic_block:
+        return fn(*args, **kwargs)
+    fila = obter_fila()
+    if fila.na_thread_escritora():
+        return fn(*args, **kwargs)
+    futuro = fila.submeter(fn, *args, **kwargs)
+    try:
+        return futuro.result(timeout=settings.WRITE_QUEUE_TIMEOUT)
+    except TimeoutError:
+        if futuro.cancel():
+            raise
+        return futuro.result()
+
+
+class EscritaSerializadaMixin:
+    """
+        Mixin para viewsets que encaminha create, update e destroy
+        pela fila de escrita.
+    """
+
+    def perform_create(self, serializer):
+        executar_escrita(super().perform_create, serializer)
+
+    def perform_update(self, serializer):
+        executar_escrita(super().perform_update, serializer)
+
+    def perform_destroy(self, instance):
+        executar_escrita(super().perform_destroy, instance)
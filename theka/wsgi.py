@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'theka.settings')
 
 application = get_wsgi_application()
+
+# Monta na subida os índices em memória servidos sem acesso ao banco.
+from library.autocomplete import aquecer  # noqa: E402
+
+aquecer()
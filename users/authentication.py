@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.cache import cache
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from theka.metrics import registrar_acesso_cache
+from .models import chave_usuario
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+        JWTAuthentication que resolve o usuário a partir de um cache de TTL curto
+        (``JWT_USER_CACHE_TTL``), evitando uma query por requisição autenticada.
+
+        A entrada guarda a versão do token (claim ``REVOKE_TOKEN_CLAIM``, quando
+        presente) junto com o usuário e é removida sempre que o ``User`` é salvo
+        ou excluído (ver ``users/models.py``), o que cobre troca de senha e
+        desativação. Usuários inexistentes ou inativos nunca entram no cache.
+
+        A remoção só alcança os outros workers com ``CACHE_COMPARTILHADO``;
+        com um cache por processo (LocMem) o usuário é lido do banco a cada
+        requisição, como no JWTAuthentication.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None or not settings.CACHE_COMPARTILHADO:
+            return super().get_user(validated_token)
+
+        versao = validated_token.get(api_settings.REVOKE_TOKEN_CLAIM)
+        chave = chave_usuario(user_id)
+        em_cache = cache.get(chave)
+        if em_cache is not None and em_cache[0] == versao:
+            registrar_acesso_cache('jwt_user', hit=True)
+            return em_cache[1]
+
+        registrar_acesso_cache('jwt_user', hit=False)
+        user = super().get_user(validated_token)
+        cache.set(chave, (versao, user), settings.JWT_USER_CACHE_TTL)
+        return user
+
+
+class CachedJWTScheme(SimpleJWTScheme):
+    """Documenta a autenticação no OpenAPI como o JWT do simplejwt."""
+    target_class = 'users.authentication.CachedJWTAuthentication'
@@ -0,0 +1,16 @@
+from rest_framework import filters
+
+from .models import usuarios_por_prefixo
+
+
+class PrefixoSearchFilter(filters.SearchFilter):
+    """
+        ``?search=`` por prefixo sobre os termos indexados em
+        ``TermoBuscaUsuario`` (username, email e palavras do nome). Cada termo
+        da busca restringe o resultado, como no ``SearchFilter``.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        for termo in self.get_search_terms(request):
+            queryset = queryset.filter(pk__in=usuarios_por_prefixo(termo))
+        return queryset
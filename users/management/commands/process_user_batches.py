@@ -0,0 +1,39 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.provisioning import processar_lote, reservar_lote
+
+
+class Command(BaseCommand):
+    help = (
+        'Processa os lotes de POST /users/bulk/ (hash das senhas num pool de '
+        'processos e inserção em lote). Sem --continuo, para quando não houver lotes pendentes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processos', type=int, default=None,
+                            help='Processos de hash (padrão: USER_BULK_HASH_PROCESSES).')
+        parser.add_argument('--continuo', action='store_true',
+                            help='Continua consultando a fila indefinidamente.')
+        parser.add_argument('--intervalo', type=float, default=5.0,
+                            help='Segundos de espera com a fila vazia no modo contínuo.')
+
+    def handle(self, *args, **options):
+        lotes = total_criados = 0
+        while True:
+            lote = reservar_lote()
+            if lote is not None:
+                criados, erros = processar_lote(lote, processos=options['processos'])
+                lotes += 1
+                total_criados += criados
+                self.stdout.write(f'Lote {lote.pk}: {criados} usuários criados, {len(erros)} recusados.')
+                for erro in erros:
+                    self.stderr.write(f"  Registro {erro['indice']}: {json.dumps(erro['erros'], ensure_ascii=False)}")
+                continue
+            if not options['continuo']:
+                break
+            time.sleep(options['intervalo'])
+
+        self.stdout.write(self.style.SUCCESS(f'{lotes} lotes processados, {total_criados} usuários criados.'))
@@ -0,0 +1,38 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.provisioning import provisionar_usuarios
+
+CAMPOS = ('username', 'email', 'password', 'first_name', 'last_name')
+
+
+class Command(BaseCommand):
+    help = (
+        'Provisiona usuários em lote a partir de um CSV (com cabeçalho username, '
+        'email, password, first_name, last_name) ou de um JSON com uma lista.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo')
+        parser.add_argument('--processos', type=int, default=None,
+                            help='Processos de hash (padrão: USER_BULK_HASH_PROCESSES).')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['arquivo'], newline='', encoding='utf-8') as arquivo:
+                if options['arquivo'].endswith('.json'):
+                    registros = json.load(arquivo)
+                else:
+                    registros = [
+                        {campo: linha.get(campo) or '' for campo in CAMPOS}
+                        for linha in csv.DictReader(arquivo)
+                    ]
+        except (OSError, ValueError) as erro:
+            raise CommandError(f'Não foi possível ler {options["arquivo"]}: {erro}')
+
+        criados, erros = provisionar_usuarios(registros, processos=options['processos'])
+        for erro in erros:
+            self.stderr.write(f"Registro {erro['indice']}: {json.dumps(erro['erros'], ensure_ascii=False)}")
+        self.stdout.write(self.style.SUCCESS(f'{criados} usuários criados, {len(erros)} recusados.'))
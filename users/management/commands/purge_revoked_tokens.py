@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from users.revocation import revogacoes
+
+
+class Command(BaseCommand):
+    help = 'Remove em lote as revogações de refresh tokens que já expiraram.'
+
+    def handle(self, *args, **options):
+        removidos = revogacoes.purgar_expirados()
+        self.stdout.write(self.style.SUCCESS(f'{removidos} revogações expiradas removidas.'))
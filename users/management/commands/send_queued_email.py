@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.outbox import entregar_lote
+
+
+class Command(BaseCommand):
+    help = (
+        'Entrega os emails da outbox em lotes, reaproveitando uma conexão SMTP '
+        'por lote. Sem --continuo, para quando não houver mensagens vencidas.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=None,
+                            help='Mensagens por lote (padrão: EMAIL_OUTBOX_BATCH_SIZE).')
+        parser.add_argument('--continuo', action='store_true',
+                            help='Continua consultando a fila indefinidamente.')
+        parser.add_argument('--intervalo', type=float, default=5.0,
+                            help='Segundos de espera com a fila vazia no modo contínuo.')
+
+    def handle(self, *args, **options):
+        total_enviados = total_falhas = 0
+        while True:
+            enviados, falhas = entregar_lote(options['lote'])
+            total_enviados += enviados
+            total_falhas += falhas
+            if enviados or falhas:
+                self.stdout.write(f'Lote: {enviados} enviados, {falhas} falhas.')
+                if enviados:
+                    continue
+            if not options['continuo']:
+                break
+            time.sleep(options['intervalo'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{total_enviados} emails enviados, {total_falhas} falhas.'
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from users.models import indexar_emails_pendentes
+
+
+class Command(BaseCommand):
+    help = (
+        'Preenche o índice de emails (EmailUsuario) para usuários criados antes '
+        'dele e lista emails duplicados, que precisam ser resolvidos à mão. '
+        'O migrate já faz esse preenchimento.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        indexados, duplicados = indexar_emails_pendentes(lote=options['lote'])
+        for user_id, email in duplicados:
+            self.stderr.write(f'Usuário {user_id}: email duplicado {email}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{indexados} emails indexados, {len(duplicados)} duplicados.'
+        ))
@@ -0,0 +1,31 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from users.models import CAMPOS_BUSCA, TermoBuscaUsuario, termos_busca
+
+
+class Command(BaseCommand):
+    help = (
+        'Recria os termos de busca (TermoBuscaUsuario) de todos os usuários, em lotes. '
+        'O migrate já cria os termos dos usuários que não têm nenhum.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            TermoBuscaUsuario.objects.all().delete()
+            usuarios = User.objects.only('id', *CAMPOS_BUSCA).iterator(chunk_size=options['lote'])
+            termos, total = [], 0
+            for user in usuarios:
+                termos.extend(TermoBuscaUsuario(user_id=user.id, termo=termo) for termo in termos_busca(user))
+                if len(termos) >= options['lote']:
+                    TermoBuscaUsuario.objects.bulk_create(termos)
+                    total += len(termos)
+                    termos = []
+            TermoBuscaUsuario.objects.bulk_create(termos)
+            total += len(termos)
+
+        self.stdout.write(self.style.SUCCESS(f'{total} termos de busca indexados.'))
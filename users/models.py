@@ -1,3 +1,289 @@
-from django.db import models
+import logging
+
+from django.db import DEFAULT_DB_ALIAS, models
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
 
 # Create your models here.
+
+def normalizar_email(email):
+    return (email or '').strip().lower()
+
+
+class EmailUsuario(models.Model):
+    """
+        modelo para representar o email normalizado (minúsculo) de cada
+        usuário. O ``auth_user.email`` não tem índice; esta tabela dá às
+        buscas por email um índice único, mantido pelos sinais do User.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='email_indexado')
+    email = models.CharField(max_length=254, unique=True)
+
+    class Meta:
+        verbose_name = "Email de Usuário"
+        verbose_name_plural = "Emails de Usuários"
+
+    def __str__(self):
+        return self.email
+
+
+class EmailPendente(models.Model):
+    """
+        modelo para representar um email na fila de envio (outbox). As
+        requisições apenas enfileiram; o comando ``send_queued_email`` entrega.
+    """
+    STATUS_PENDENTE = 'pendente'
+    STATUS_ENVIADO = 'enviado'
+    STATUS_FALHOU = 'falhou'
+    STATUS_CHOICES = [
+        (STATUS_PENDENTE, 'Pendente'),
+        (STATUS_ENVIADO, 'Enviado'),
+        (STATUS_FALHOU, 'Falhou'),
+    ]
+
+    assunto = models.CharField(max_length=255)
+    corpo = models.TextField()
+    corpo_html = models.TextField(blank=True)
+    remetente = models.CharField(max_length=254)
+    destinatarios = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDENTE)
+    tentativas = models.PositiveSmallIntegerField(default=0)
+    proxima_tentativa_em = models.DateTimeField(default=timezone.now)
+    ultimo_erro = models.TextField(blank=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    enviado_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Email Pendente"
+        verbose_name_plural = "Emails Pendentes"
+        indexes = [models.Index(fields=['status', 'proxima_tentativa_em'])]
+
+    def __str__(self):
+        return f'{self.assunto} ({self.status})'
+
+
+class LoteProvisionamento(models.Model):
+    """
+        modelo para representar um lote de usuários enviado a ``POST
+        /users/bulk/``. A requisição apenas grava o lote; o comando
+        ``process_user_batches`` o processa fora do ciclo da requisição. Os
+        registros já validados (com as senhas hasheadas) são apagados assim
+        que o lote termina; ficam só o total criado e os erros por índice.
+    """
+    STATUS_PENDENTE = 'pendente'
+    STATUS_CONCLUIDO = 'concluido'
+    STATUS_CHOICES = [
+        (STATUS_PENDENTE, 'Pendente'),
+        (STATUS_CONCLUIDO, 'Concluído'),
+    ]
+
+    solicitante = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
+    registros = models.JSONField(null=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDENTE)
+    criados = models.PositiveIntegerField(default=0)
+    erros = models.JSONField(default=list)
+    reservado_ate = models.DateTimeField(default=timezone.now)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    concluido_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Lote de Provisionamento"
+        verbose_name_plural = "Lotes de Provisionamento"
+        indexes = [models.Index(fields=['status', 'reservado_ate'])]
+
+    def __str__(self):
+        return f'Lote {self.pk} ({self.status})'
+
+
+def usuarios_por_email(email):
+    """
+        Usuários com o email informado, sem diferenciar maiúsculas. Consulta o
+        índice; se nenhum usuário indexado tem o email, procura por ``iexact``
+        entre os que não têm linha no índice (duplicados deixados de fora pelo
+        preenchimento e contas criadas por ``raw``/``loaddata``/``bulk_create``).
+    """
+    email = normalizar_email(email)
+    ids = list(EmailUsuario.objects.filter(email=email).values_list('user_id', flat=True))
+    if ids:
+        return User.objects.filter(pk__in=ids)
+    return User.objects.filter(email_indexado__isnull=True, email__iexact=email)
+
+
+def indexar_emails_pendentes(using=DEFAULT_DB_ALIAS, lote=1000):
+    """
+        Cria o EmailUsuario dos usuários que ainda não têm um (criados antes
+        do índice ou por caminhos sem sinais). Retorna ``(indexados,
+        duplicados)``; os duplicados, ``[(user_id, email)]``, ficam sem
+        índice até serem resolvidos à mão.
+    """
+    indexados = set(EmailUsuario.objects.using(using).values_list('email', flat=True))
+    pendentes = (
+        User.objects.using(using).filter(email_indexado__isnull=True)
+        .exclude(email='')
+        .values_list('id', 'email')
+    )
+    novos, duplicados = [], []
+    for user_id, email in pendentes.iterator():
+        email = normalizar_email(email)
+        if email in indexados:
+            duplicados.append((user_id, email))
+            continue
+        indexados.add(email)
+        novos.append(EmailUsuario(user_id=user_id, email=email))
+    EmailUsuario.objects.using(using).bulk_create(novos, batch_size=lote, ignore_conflicts=True)
+    return len(novos), duplicados
+
+
+CAMPOS_BUSCA = ('username', 'email', 'first_name', 'last_name')
+
+
+def termos_busca(user):
+    """Termos indexados do usuário: username, email e cada palavra do nome."""
+    termos = {user.username.lower(), normalizar_email(user.email)}
+    for campo in ('first_name', 'last_name'):
+        termos.update(getattr(user, campo).lower().split())
+    termos.discard('')
+    return termos
+
+
+def intervalo_prefixo(prefixo):
+    """
+        ``(inicio, fim)`` tal que ``inicio <= termo < fim`` equivale a
+        ``termo.startswith(prefixo)``; a comparação por intervalo usa o
+        índice em qualquer banco, ao contrário do LIKE.
+    """
+    return prefixo, prefixo[:-1] + chr(ord(prefixo[-1]) + 1)
+
+
+class TermoBuscaUsuario(models.Model):
+    """
+        modelo para representar um termo de busca (minúsculo) de um usuário.
+        Alimenta a busca por prefixo do ``/users/`` com uma varredura de
+        índice em vez de ``icontains`` em quatro colunas do ``auth_user``.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='termos_busca')
+    termo = models.CharField(max_length=254)
+
+    class Meta:
+        verbose_name = "Termo de Busca de Usuário"
+        verbose_name_plural = "Termos de Busca de Usuários"
+        indexes = [models.Index(fields=['termo', 'user'])]
+
+    def __str__(self):
+        return self.termo
+
+
+def indexar_termos_pendentes(using=DEFAULT_DB_ALIAS, lote=1000):
+    """
+        Cria os termos de busca dos usuários que ainda não têm nenhum (todo
+        usuário indexado tem ao menos o username). Retorna quantos termos criou.
+    """
+    usuarios = (
+        User.objects.using(using).filter(termos_busca__isnull=True)
+        .only('id', *CAMPOS_BUSCA).iterator(chunk_size=lote)
+    )
+    termos, total = [], 0
+    for user in usuarios:
+        termos.extend(TermoBuscaUsuario(user_id=user.id, termo=termo) for termo in termos_busca(user))
+        if len(termos) >= lote:
+            TermoBuscaUsuario.objects.using(using).bulk_create(termos)
+            total += len(termos)
+            termos = []
+    TermoBuscaUsuario.objects.using(using).bulk_create(termos)
+    return total + len(termos)
+
+
+def usuarios_por_prefixo(prefixo):
+    """IDs dos usuários com algum termo começando por ``prefixo``."""
+    inicio, fim = intervalo_prefixo(prefixo.lower())
+    return TermoBuscaUsuario.objects.filter(termo__gte=inicio, termo__lt=fim).values('user_id')
+
+
+class TokenRevogado(models.Model):
+    """
+        modelo para representar refresh tokens revogados (rotacionados ou
+        invalidados). Guarda apenas o hash do JTI e a expiração do token.
+    """
+    jti_hash = models.CharField(max_length=64, unique=True)
+    expira_em = models.DateTimeField(db_index=True)
+    revogado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Token Revogado"
+        verbose_name_plural = "Tokens Revogados"
+
+    def __str__(self):
+        return self.jti_hash
+
+
+def chave_usuario(user_id):
+    """Chave do usuário no cache do CachedJWTAuthentication."""
+    return f'jwt-user:{user_id}'
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidar_cache_autenticacao(sender, instance, **kwargs):
+    """
+        Remove o usuário do cache do CachedJWTAuthentication sempre que ele
+        é alterado (troca de senha, desativação...) ou excluído.
+    """
+    cache.delete(chave_usuario(instance.pk))
+
+
+@receiver(post_save, sender=User)
+def indexar_email(sender, instance, update_fields=None, raw=False, **kwargs):
+    """
+        Mantém o EmailUsuario em dia com o email do usuário. Um email já
+        usado por outra conta viola o índice único (IntegrityError).
+    """
+    if raw or (update_fields is not None and 'email' not in update_fields):
+        return
+    email = normalizar_email(instance.email)
+    if not email:
+        EmailUsuario.objects.filter(user=instance).delete()
+        return
+    atualizados = EmailUsuario.objects.filter(user=instance).exclude(email=email).update(email=email)
+    if not atualizados:
+        EmailUsuario.objects.get_or_create(user=instance, defaults={'email': email})
+
+
+@receiver(post_save, sender=User)
+def indexar_termos_busca(sender, instance, update_fields=None, raw=False, **kwargs):
+    """Mantém os termos de busca do usuário em dia (só grava o que mudou)."""
+    if raw or (update_fields is not None and not set(update_fields) & set(CAMPOS_BUSCA)):
+        return
+    novos = termos_busca(instance)
+    atuais = set(TermoBuscaUsuario.objects.filter(user=instance).values_list('termo', flat=True))
+    if atuais - novos:
+        TermoBuscaUsuario.objects.filter(user=instance, termo__in=atuais - novos).delete()
+    if novos - atuais:
+        TermoBuscaUsuario.objects.bulk_create(
+            [TermoBuscaUsuario(user=instance, termo=termo) for termo in novos - atuais]
+        )
+
+
+@receiver(post_migrate)
+def preencher_indices_usuarios(sender, using=DEFAULT_DB_ALIAS, apps=None, **kwargs):
+    """
+        Preenche, ao fim de cada ``migrate``, o índice de emails e os termos
+        de busca dos usuários que ainda não os têm: as migrações do projeto
+        não são versionadas, então o preenchimento não pode ser uma migração
+        de dados.
+    """
+    if sender.label != 'users' or apps is None:
+        return
+    try:
+        apps.get_model('users', 'EmailUsuario')
+        apps.get_model('users', 'TermoBuscaUsuario')
+    except LookupError:
+        return  # migrado para antes das tabelas de índice
+    _, duplicados = indexar_emails_pendentes(using)
+    for user_id, email in duplicados:
+        logger.warning('Usuário %s sem índice de email: %s já pertence a outra conta.', user_id, email)
+    indexar_termos_pendentes(using)
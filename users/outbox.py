@@ -0,0 +1,101 @@
+"""
+Outbox de emails transacionais.
+
+``enfileirar_email`` grava a mensagem em ``EmailPendente`` e retorna; a
+entrega fica com ``entregar_lote`` (comando ``send_queued_email``), que envia
+um lote por uma única conexão do ``EMAIL_BACKEND`` e reagenda as falhas com
+backoff exponencial. Cada lote é reservado com um prazo
+(``EMAIL_OUTBOX_LEASE_SECONDS``): se o worker cair no meio do envio, as
+mensagens voltam para a fila quando o prazo vence.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import EmailPendente
+
+
+def enfileirar_email(assunto, mensagem, destinatarios, html_message=None, from_email=None):
+    """Mesma assinatura essencial do ``send_mail``, mas apenas enfileira."""
+    return EmailPendente.objects.create(
+        assunto=assunto,
+        corpo=mensagem,
+        corpo_html=html_message or '',
+        remetente=from_email or settings.DEFAULT_FROM_EMAIL,
+        destinatarios=list(destinatarios),
+    )
+
+
+def reservar_lote(tamanho):
+    """Reserva até ``tamanho`` mensagens vencidas para este worker."""
+    agora = timezone.now()
+    with transaction.atomic():
+        lote = list(
+            EmailPendente.objects
+            .filter(status=EmailPendente.STATUS_PENDENTE, proxima_tentativa_em__lte=agora)
+            .order_by('proxima_tentativa_em', 'id')[:tamanho]
+        )
+        EmailPendente.objects.filter(id__in=[email.id for email in lote]).update(
+            proxima_tentativa_em=agora + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE_SECONDS),
+        )
+    return lote
+
+
+def registrar_falha(email, erro):
+    email.tentativas += 1
+    email.ultimo_erro = f'{type(erro).__name__}: {erro}'
+    if email.tentativas >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        email.status = EmailPendente.STATUS_FALHOU
+    else:
+        atraso = settings.EMAIL_OUTBOX_BACKOFF_SECONDS * 2 ** (email.tentativas - 1)
+        email.proxima_tentativa_em = timezone.now() + timedelta(seconds=atraso)
+
+
+def entregar_lote(tamanho=None):
+    """
+        Envia um lote pela mesma conexão e retorna ``(enviados, falhas)``.
+        Se a conexão não abre, todo o lote é reagendado.
+    """
+    lote = reservar_lote(tamanho or settings.EMAIL_OUTBOX_BATCH_SIZE)
+    if not lote:
+        return 0, 0
+
+    enviados = falhas = 0
+    conexao = get_connection(fail_silently=False)
+    try:
+        conexao.open()
+    except Exception as erro:
+        for email in lote:
+            registrar_falha(email, erro)
+        falhas = len(lote)
+    else:
+        try:
+            for email in lote:
+                mensagem = EmailMultiAlternatives(
+                    subject=email.assunto,
+                    body=email.corpo,
+                    from_email=email.remetente,
+                    to=email.destinatarios,
+                    connection=conexao,
+                )
+                if email.corpo_html:
+                    mensagem.attach_alternative(email.corpo_html, 'text/html')
+                try:
+                    mensagem.send()
+                except Exception as erro:
+                    registrar_falha(email, erro)
+                    falhas += 1
+                else:
+                    email.status = EmailPendente.STATUS_ENVIADO
+                    email.enviado_em = timezone.now()
+                    enviados += 1
+        finally:
+            conexao.close()
+
+    EmailPendente.objects.bulk_update(
+        lote, ['status', 'tentativas', 'proxima_tentativa_em', 'ultimo_erro', 'enviado_em'],
+    )
+    return enviados, falhas
@@ -0,0 +1,12 @@
+from rest_framework import pagination
+
+
+class UserCursorPagination(pagination.CursorPagination):
+    """
+        Paginação por cursor: cada página é uma varredura do índice a partir
+        da posição do cursor, sem OFFSET e sem COUNT(*) da tabela inteira.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = 'username'
@@ -0,0 +1,220 @@
+"""
+Provisionamento de usuários em lote.
+
+Cadastrar milhares de leitores por ``POST /users/`` paga, por usuário, uma
+consulta de email, uma de username, o hash PBKDF2 dentro da requisição e a
+recontagem de ``atualizar_estatisticas_usuarios``. Aqui o lote é validado sem
+consultas por item, a unicidade é verificada com consultas ``IN`` por bloco,
+as senhas são hasheadas em paralelo num pool de processos e a inserção é um
+``bulk_create`` numa única transação (pela fila de escrita), seguido de uma
+só atualização das estatísticas.
+
+Como ``bulk_create`` não dispara ``post_save``, os índices mantidos por sinais
+(``EmailUsuario`` e ``TermoBuscaUsuario``) são preenchidos aqui também.
+
+``POST /users/bulk/`` valida os registros e hasheia as senhas antes de gravar
+o lote em ``LoteProvisionamento`` (``enfileirar_lote``), para que nenhuma senha
+em claro fique no banco (nem nas cópias do ``sync_replica``). A unicidade e a
+inserção ficam para o comando ``process_user_batches`` (``processar_lote``).
+Cada lote é reservado por ``USER_BULK_LEASE_SECONDS``; se o worker cair, ele
+volta à fila.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from institucional.models import recalcular_total_usuarios
+from theka.writer import executar_escrita
+from .models import EmailUsuario, LoteProvisionamento, TermoBuscaUsuario, normalizar_email, termos_busca
+from .serializers import UserBulkItemSerializer
+
+# Bloco das consultas IN, abaixo do limite de parâmetros do SQLite.
+TAMANHO_BLOCO = 500
+
+
+def _inicializar_processo():
+    # Com spawn (macOS/Windows) o processo filho começa sem o Django configurado.
+    django.setup()
+
+
+def hashear_senhas(senhas, processos=None):
+    """Aplica ``make_password`` às senhas, em paralelo quando o lote é grande."""
+    processos = processos or settings.USER_BULK_HASH_PROCESSES or os.cpu_count() or 1
+    if processos <= 1 or len(senhas) < settings.USER_BULK_PARALLEL_THRESHOLD:
+        return [make_password(senha) for senha in senhas]
+    with ProcessPoolExecutor(max_workers=processos, initializer=_inicializar_processo) as pool:
+        return list(pool.map(make_password, senhas, chunksize=max(1, len(senhas) // (processos * 4))))
+
+
+def _existentes(queryset, campo, valores):
+    existentes = set()
+    valores = list(valores)
+    for inicio in range(0, len(valores), TAMANHO_BLOCO):
+        bloco = valores[inicio:inicio + TAMANHO_BLOCO]
+        existentes.update(queryset.filter(**{f'{campo}__in': bloco}).values_list(campo, flat=True))
+    return existentes
+
+
+def validar_registros(registros):
+    """
+        Valida cada registro, sem consultas. Retorna ``(validos, erros)``:
+        ``[(indice, dados)]`` e a lista de ``{'indice': i, 'erros': {...}}``
+        dos registros recusados.
+    """
+    validos, erros = [], []
+    for indice, registro in enumerate(registros):
+        serializer = UserBulkItemSerializer(data=registro)
+        if serializer.is_valid():
+            validos.append((indice, dict(serializer.validated_data)))
+        else:
+            erros.append({'indice': indice, 'erros': serializer.errors})
+    return validos, erros
+
+
+def validar_lote(registros):
+    """
+        Retorna ``(aceitos, erros)``: os dados validados e únicos e a lista de
+        ``{'indice': i, 'erros': {...}}`` dos registros recusados.
+    """
+    validos, erros = validar_registros(registros)
+    return _filtrar_existentes(validos, erros)
+
+
+def _filtrar_existentes(validos, erros):
+    usernames = _existentes(User.objects, 'username', {dados['username'] for _, dados in validos})
+    emails = _existentes(EmailUsuario.objects, 'email', {dados['email'] for _, dados in validos})
+
+    aceitos = []
+    for indice, dados in validos:
+        problemas = {}
+        if dados['username'] in usernames:
+            problemas['username'] = ['Um usuário com este nome de usuário já existe.']
+        if dados['email'] in emails:
+            problemas['email'] = [UserBulkItemSerializer.EMAIL_EM_USO]
+        if problemas:
+            erros.append({'indice': indice, 'erros': problemas})
+            continue
+        # Duplicados dentro do próprio lote: vale o primeiro.
+        usernames.add(dados['username'])
+        emails.add(dados['email'])
+        aceitos.append(dados)
+
+    erros.sort(key=lambda erro: erro['indice'])
+    return aceitos, erros
+
+
+def inserir_usuarios(usuarios):
+    """
+        Insere ``usuarios`` (com senha já hasheada) numa transação, junto dos
+        índices de email e de busca, e atualiza as estatísticas uma vez.
+    """
+    with transaction.atomic():
+        criados = User.objects.bulk_create(usuarios, batch_size=TAMANHO_BLOCO)
+        if any(user.pk is None for user in criados):
+            # Bancos sem RETURNING no bulk_create: recupera os ids pelo username.
+            ids = dict(User.objects.filter(username__in=[u.username for u in criados])
+                       .values_list('username', 'id'))
+            for user in criados:
+                user.pk = ids[user.username]
+        EmailUsuario.objects.bulk_create(
+            [EmailUsuario(user=user, email=normalizar_email(user.email)) for user in criados if user.email],
+            batch_size=TAMANHO_BLOCO,
+        )
+        TermoBuscaUsuario.objects.bulk_create(
+            [TermoBuscaUsuario(user=user, termo=termo) for user in criados for termo in termos_busca(user)],
+            batch_size=TAMANHO_BLOCO,
+        )
+        recalcular_total_usuarios()
+    return len(criados)
+
+
+def provisionar_usuarios(registros, processos=None):
+    """
+        Valida e cria os usuários de ``registros`` (dicts com os campos do
+        UserSerializer). Retorna ``(criados, erros)``; registros recusados não
+        impedem a criação dos demais.
+    """
+    aceitos, erros = validar_lote(registros)
+    if not aceitos:
+        return 0, erros
+    senhas = hashear_senhas([dados['password'] for dados in aceitos], processos)
+    return _criar_usuarios(aceitos, senhas, erros)
+
+
+def _criar_usuarios(aceitos, senhas, erros):
+    usuarios = [
+        User(
+            username=dados['username'],
+            email=dados['email'],
+            first_name=dados.get('first_name', ''),
+            last_name=dados.get('last_name', ''),
+            password=senha,
+        )
+        for dados, senha in zip(aceitos, senhas)
+    ]
+    try:
+        criados = executar_escrita(inserir_usuarios, usuarios)
+    except IntegrityError:
+        # Cadastro concorrente com o mesmo username/email entre a validação
+        # e a inserção: o lote inteiro foi desfeito.
+        return 0, erros + [{'indice': None, 'erros': {'non_field_errors': [
+            'Conflito com um cadastro simultâneo; nenhum usuário do lote foi criado.'
+        ]}}]
+    return criados, erros
+
+
+def enfileirar_lote(registros, solicitante=None, processos=None):
+    """
+        Valida os registros, hasheia as senhas dos válidos e grava o lote para
+        o ``process_user_batches``; os recusados já saem nos erros do lote.
+    """
+    validos, erros = validar_registros(registros)
+    senhas = hashear_senhas([dados.pop('password') for _, dados in validos], processos)
+    registros = [
+        {**dados, 'indice': indice, 'password': senha}
+        for (indice, dados), senha in zip(validos, senhas)
+    ]
+    return LoteProvisionamento.objects.create(registros=registros, erros=erros, solicitante=solicitante)
+
+
+def reservar_lote():
+    """Reserva o lote pendente mais antigo para este worker, ou retorna ``None``."""
+    agora = timezone.now()
+    with transaction.atomic():
+        lote = (
+            LoteProvisionamento.objects
+            .filter(status=LoteProvisionamento.STATUS_PENDENTE, reservado_ate__lte=agora)
+            .order_by('reservado_ate', 'id')
+            .first()
+        )
+        if lote is None:
+            return None
+        reservado = LoteProvisionamento.objects.filter(pk=lote.pk, reservado_ate=lote.reservado_ate).update(
+            reservado_ate=agora + timedelta(seconds=settings.USER_BULK_LEASE_SECONDS),
+        )
+    # Outro worker reservou o mesmo lote entre a leitura e o update.
+    return lote if reservado else None
+
+
+def processar_lote(lote, processos=None):
+    """Cria os usuários do lote (senhas já hasheadas) e guarda o resultado."""
+    validos = [(registro.pop('indice'), registro) for registro in lote.registros or []]
+    aceitos, erros = _filtrar_existentes(validos, list(lote.erros))
+    if aceitos:
+        criados, erros = _criar_usuarios(aceitos, [dados['password'] for dados in aceitos], erros)
+    else:
+        criados = 0
+    lote.criados = criados
+    lote.erros = erros
+    lote.registros = None
+    lote.status = LoteProvisionamento.STATUS_CONCLUIDO
+    lote.concluido_em = timezone.now()
+    lote.save(update_fields=['criados', 'erros', 'registros', 'status', 'concluido_em'])
+    return criados, erros
@@ -0,0 +1,169 @@
+"""
+Armazenamento de refresh tokens revogados.
+
+Cada JTI revogado é gravado como hash em ``TokenRevogado`` até expirar. Na
+frente da tabela fica um filtro de Bloom em memória: se o hash não está no
+filtro, o token certamente não foi revogado e a consulta ao banco é evitada.
+Só os positivos (revogados de fato ou falsos positivos) chegam ao banco.
+
+Os processos se mantêm atualizados por um contador de geração no cache: quando
+ele muda, o filtro carrega apenas as linhas novas (``id`` maior que o último
+lido). Como o contador pode ser expulso do cache, o filtro também relê as
+linhas novas a cada ``JWT_REVOCATION_SYNC_SECONDS``. O filtro só é usado com
+``CACHE_COMPARTILHADO``: com um cache por processo (LocMem), uma revogação
+feita em outro worker nunca chegaria ao filtro, então a verificação vai
+sempre ao banco.
+"""
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from theka.metrics import registrar_acesso_cache
+from .models import TokenRevogado
+
+CHAVE_GERACAO = 'jwt-revogacao:geracao'
+
+
+def hash_jti(jti):
+    return hashlib.sha256(str(jti).encode('utf-8')).hexdigest()
+
+
+class FiltroBloom:
+    """Filtro de Bloom sobre hashes hexadecimais de 256 bits."""
+
+    def __init__(self, bits, funcoes):
+        self.bits = bits
+        self.funcoes = funcoes
+        self.tamanho = 0
+        self._array = bytearray((bits + 7) // 8)
+
+    def _posicoes(self, hash_hex):
+        # Double hashing: duas metades do SHA-256 geram as k posições.
+        h1 = int(hash_hex[:16], 16)
+        h2 = int(hash_hex[16:32], 16) | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.funcoes))
+
+    def adicionar(self, hash_hex):
+        for posicao in self._posicoes(hash_hex):
+            self._array[posicao >> 3] |= 1 << (posicao & 7)
+        self.tamanho += 1
+
+    def __contains__(self, hash_hex):
+        return all(self._array[p >> 3] & (1 << (p & 7)) for p in self._posicoes(hash_hex))
+
+
+class RepositorioRevogacoes:
+    """Consulta e registro de revogações com o filtro de Bloom na frente."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        self._filtro = None
+        self._ultimo_id = 0
+        self._geracao = None
+        self._sincronizado_em = 0.0
+
+    def _sincronizar(self):
+        geracao = cache.get(CHAVE_GERACAO, 0)
+        if (
+            self._filtro is not None and geracao == self._geracao
+            and time.monotonic() - self._sincronizado_em < settings.JWT_REVOCATION_SYNC_SECONDS
+        ):
+            return
+        with self._lock:
+            if self._filtro is None or self._filtro.tamanho > settings.JWT_REVOCATION_BLOOM_CAPACITY:
+                # Recria o filtro do zero: descarta os bits de entradas já expiradas.
+                self._filtro = FiltroBloom(
+                    settings.JWT_REVOCATION_BLOOM_BITS, settings.JWT_REVOCATION_BLOOM_HASHES,
+                )
+                self._ultimo_id = 0
+            novos = (
+                TokenRevogado.objects
+                .filter(id__gt=self._ultimo_id, expira_em__gt=timezone.now())
+                .order_by('id')
+                .values_list('id', 'jti_hash')
+            )
+            for id_, jti_hash in novos.iterator():
+                self._filtro.adicionar(jti_hash)
+                self._ultimo_id = id_
+            self._geracao = geracao
+            self._sincronizado_em = time.monotonic()
+
+    def esta_revogado(self, jti):
+        jti_hash = hash_jti(jti)
+        if not settings.CACHE_COMPARTILHADO:
+            return TokenRevogado.objects.filter(jti_hash=jti_hash).exists()
+        self._sincronizar()
+        if jti_hash not in self._filtro:
+            registrar_acesso_cache('jwt_revogacao_bloom', hit=True)
+            return False
+        registrar_acesso_cache('jwt_revogacao_bloom', hit=False)
+        return TokenRevogado.objects.filter(jti_hash=jti_hash).exists()
+
+    def revogar(self, jti, exp):
+        """
+            Revoga o JTI até ``exp`` (timestamp). Retorna False se ele já
+            estava revogado, o que permite usar a revogação como reserva
+            atômica do token em refreshes concorrentes.
+        """
+        jti_hash = hash_jti(jti)
+        try:
+            with transaction.atomic():
+                TokenRevogado.objects.create(
+                    jti_hash=jti_hash,
+                    expira_em=datetime.fromtimestamp(exp, tz=dt_timezone.utc),
+                )
+        except IntegrityError:
+            return False
+
+        if settings.CACHE_COMPARTILHADO:
+            self._sincronizar()
+            self._filtro.adicionar(jti_hash)
+            # Só depois do commit: outro processo que relesse antes não veria a linha.
+            transaction.on_commit(_avancar_geracao)
+        return True
+
+    def purgar_expirados(self):
+        """Remove em lote as revogações de tokens já expirados."""
+        removidos, _ = TokenRevogado.objects.filter(expira_em__lte=timezone.now()).delete()
+        return removidos
+
+
+def _avancar_geracao():
+    cache.add(CHAVE_GERACAO, 0, None)
+    try:
+        cache.incr(CHAVE_GERACAO)
+    except ValueError:  # chave expulsa do cache entre o add e o incr
+        cache.set(CHAVE_GERACAO, 1, None)
+
+
+revogacoes = RepositorioRevogacoes()
+
+
+class RefreshTokenRevogavel(RefreshToken):
+    """
+        Refresh token verificado contra o repositório de revogações. Segue a
+        interface do ``BlacklistMixin`` do simplejwt (``blacklist()``), então o
+        ``TokenRefreshSerializer`` revoga o token antigo ao rotacionar.
+    """
+
+    def verify(self):
+        super().verify()
+        if revogacoes.esta_revogado(self[api_settings.JTI_CLAIM]):
+            raise TokenError('Token is blacklisted')
+
+    def blacklist(self):
+        # Duas requisições com o mesmo refresh token: só a primeira o revoga.
+        if not revogacoes.revogar(self[api_settings.JTI_CLAIM], self['exp']):
+            raise TokenError('Token is blacklisted')
@@ -1,13 +1,13 @@
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User, update_last_login
+from django.contrib.auth.validators import UnicodeUsernameValidator
 from rest_framework import serializers
 from rest_framework.exceptions import AuthenticationFailed
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
 from rest_framework_simplejwt.settings import api_settings
 from django.core.validators import validate_email
 import re
 from urllib.parse import urlencode
-from django.core.mail import send_mail
 from django.conf import settings
 from django.urls import reverse
 from django.utils.http import urlsafe_base64_encode
@@ -15,6 +15,10 @@ from django.utils.encoding import force_bytes
 from django.contrib.auth.tokens import default_token_generator
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
+from django.db import IntegrityError, transaction
+from .models import LoteProvisionamento, usuarios_por_email
+from .outbox import enfileirar_email
+from .revocation import RefreshTokenRevogavel
 
 
 class EmailTokenObtainPairSerializer(TokenObtainPairSerializer):
@@ -34,7 +38,7 @@ class EmailTokenObtainPairSerializer(TokenObtainPairSerializer):
         email = attrs.get('email')
         password = attrs.get('password')
         request = self.context.get('request')
-        user = User.objects.filter(email__iexact=email).first()
+        user = usuarios_por_email(email).first()
 
         if user:
             self.user = authenticate(
@@ -63,9 +67,20 @@ class EmailTokenObtainPairSerializer(TokenObtainPairSerializer):
         return data
 
 
+class RevocableTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+        Refresh que rejeita tokens revogados e, com ``ROTATE_REFRESH_TOKENS``
+        e ``BLACKLIST_AFTER_ROTATION``, revoga o token antigo ao rotacionar.
+    """
+    token_class = RefreshTokenRevogavel
+
+
 class UserSerializer(serializers.ModelSerializer):
     # Campo de confirmação de senha (apenas para escrita)
     password_confirm = serializers.CharField(write_only=True, required=True)
+
+    EMAIL_EM_USO = "Este email já está em uso."
+    verificar_email_em_uso = True
     
     class Meta:
         model = User
@@ -90,9 +105,9 @@ class UserSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Por favor, insira um endereço de email válido.")
         
         # Verifica se o email já está em uso (apenas para criação)
-        if self.instance is None:  # Se é uma criação (não atualização)
-            if User.objects.filter(email=value).exists():
-                raise serializers.ValidationError("Este email já está em uso.")
+        if self.instance is None and self.verificar_email_em_uso:
+            if usuarios_por_email(value).exists():
+                raise serializers.ValidationError(self.EMAIL_EM_USO)
         
         return value.lower()  # Normaliza para minúsculas
 
@@ -175,8 +190,13 @@ class UserSerializer(serializers.ModelSerializer):
         # Remove password_confirm do validated_data
         validated_data.pop('password_confirm', None)
         
-        # Cria o usuário com a senha criptografada
-        user = User.objects.create_user(**validated_data)
+        # Cria o usuário com a senha criptografada; o índice único de emails
+        # barra cadastros concorrentes com o mesmo email.
+        try:
+            with transaction.atomic():
+                user = User.objects.create_user(**validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError({'email': self.EMAIL_EM_USO})
         return user
 
     def update(self, instance, validated_data):
@@ -195,20 +215,49 @@ class UserSerializer(serializers.ModelSerializer):
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         
-        instance.save()
+        try:
+            with transaction.atomic():
+                instance.save()
+        except IntegrityError:
+            raise serializers.ValidationError({'email': self.EMAIL_EM_USO})
         return instance
 
+class LoteProvisionamentoSerializer(serializers.ModelSerializer):
+    """Situação de um lote de provisionamento (sem os registros enviados)."""
+
+    class Meta:
+        model = LoteProvisionamento
+        fields = ['id', 'status', 'criados', 'erros', 'criado_em', 'concluido_em']
+        read_only_fields = fields
+
+
+class UserBulkItemSerializer(UserSerializer):
+    """
+        Validação de um item do provisionamento em lote. Mantém as regras do
+        UserSerializer, mas sem consultas por item: a unicidade de username
+        e email é verificada para o lote inteiro em users.provisioning.
+    """
+    password_confirm = serializers.CharField(write_only=True, required=False)
+    verificar_email_em_uso = False
+
+    class Meta(UserSerializer.Meta):
+        extra_kwargs = {
+            **UserSerializer.Meta.extra_kwargs,
+            'username': {'validators': [UnicodeUsernameValidator()]},
+        }
+
+
 class PasswordResetSerializer(serializers.Serializer):
     email = serializers.EmailField(required=True)
 
     def validate_email(self, value):
-        if not User.objects.filter(email=value).exists():
+        if not usuarios_por_email(value).exists():
             raise serializers.ValidationError("Não existe usuário com este email.")
         return value
 
     def save(self):
         email = self.validated_data['email']
-        user = User.objects.get(email=email)
+        user = usuarios_por_email(email).get()
         
         # Gerar token e uid
         token = default_token_generator.make_token(user)
@@ -234,14 +283,12 @@ class PasswordResetSerializer(serializers.Serializer):
         html_message = render_to_string('emails/password_reset.html', context)
         plain_message = strip_tags(html_message)
         
-        # Enviar email
-        send_mail(
-            subject='Redefinição de Senha - Sua Aplicação',
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[email],
+        # Enfileirar email (entregue pelo comando send_queued_email)
+        enfileirar_email(
+            assunto='Redefinição de Senha - Sua Aplicação',
+            mensagem=plain_message,
+            destinatarios=[email],
             html_message=html_message,
-            fail_silently=False,
         )
 
 class PasswordResetConfirmSerializer(serializers.Serializer):
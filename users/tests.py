@@ -2,6 +2,7 @@ from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.contrib.auth.models import User
+from django.contrib.auth.hashers import identify_hasher, make_password
 from django.core import mail
 from django.utils.http import urlsafe_base64_encode
 from django.utils.encoding import force_bytes
@@ -9,10 +10,34 @@ from django.contrib.auth.tokens import default_token_generator
 from django.test import override_settings
 from html import unescape
 from urllib.parse import parse_qs, urlparse
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.exceptions import AuthenticationFailed
+from datetime import timedelta
+from django.core.management import call_command
+from django.utils import timezone
+from io import StringIO
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from theka.throttling import ArmazemBaldes, ArmazemBaldesCache, baldes
+from users.authentication import CachedJWTAuthentication
+from django.db import IntegrityError, transaction
+import json
+import os
+import tempfile
+from unittest import mock
+from institucional.models import EstatisticasBiblioteca
+from users.models import (
+    EmailPendente, EmailUsuario, LoteProvisionamento, TokenRevogado, chave_usuario, usuarios_por_email,
+    usuarios_por_prefixo,
+)
+from users.outbox import enfileirar_email, entregar_lote
+from users.provisioning import enfileirar_lote, reservar_lote
+from users.revocation import hash_jti, revogacoes
 
 
 class EmailTokenObtainPairTests(APITestCase):
     def setUp(self):
+        baldes.limpar()
         self.user = User.objects.create_user(
             username='testuser',
             email='test@example.com',
@@ -105,6 +130,68 @@ class UserTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('email', response.data)
 
+    def test_duplicate_email_case_insensitive(self):
+        """Test that emails differing only in case are rejected."""
+        User.objects.create_user(username='other', email='Test@Example.com', password='Password123!')
+        response = self.client.post(self.url, self.user_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('email', response.data)
+
+    def test_email_index_enforces_uniqueness(self):
+        """Test the email index rejects a duplicate at the database level."""
+        User.objects.create_user(username='one', email='dup@example.com', password='Password123!')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            User.objects.create_user(username='two', email='DUP@example.com', password='Password123!')
+
+    def test_email_index_follows_email_change(self):
+        """Test changing a user's email updates the index."""
+        user = User.objects.create_user(username='one', email='old@example.com', password='Password123!')
+        user.email = 'New@Example.com'
+        user.save()
+        self.assertEqual(list(usuarios_por_email('new@example.com')), [user])
+        self.assertFalse(usuarios_por_email('old@example.com').exists())
+
+    def test_migrate_backfills_email_index(self):
+        """Test users created before the email index can log in after migrate."""
+        User.objects.bulk_create([User(username='legacy', email='Legacy@Example.com',
+                                       password=make_password('Password123!'))])
+        self.assertFalse(EmailUsuario.objects.filter(email='legacy@example.com').exists())
+        call_command('migrate', verbosity=0)
+        self.assertTrue(EmailUsuario.objects.filter(email='legacy@example.com').exists())
+        response = self.client.post(reverse('token_obtain_pair'),
+                                    {'email': 'legacy@example.com', 'password': 'Password123!'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_unindexed_user_found_by_email(self):
+        """Test users without an index row can still log in and reset the password."""
+        User.objects.bulk_create([User(username='legacy', email='Legacy@Example.com',
+                                       password=make_password('Password123!'))])
+        response = self.client.post(reverse('token_obtain_pair'),
+                                    {'email': 'legacy@example.com', 'password': 'Password123!'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post(reverse('password_reset'), {'email': 'LEGACY@example.com'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_unindexed_user_email_reported_as_taken(self):
+        """Test an email held only by an unindexed user is rejected on signup."""
+        User.objects.bulk_create([User(username='legacy', email='Dup@Example.com',
+                                       password=make_password('Password123!'))])
+        response = self.client.post(reverse('user-list'), {
+            'username': 'novo', 'email': 'dup@example.com',
+            'password': 'Password123!', 'password_confirm': 'Password123!',
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('email', response.data)
+
+    def test_migrate_warns_about_duplicate_emails(self):
+        """Test the backfill logs the users it leaves out of the email index."""
+        User.objects.create_user(username='one', email='dup@example.com', password='Password123!')
+        User.objects.bulk_create([User(username='legacy', email='Dup@Example.com',
+                                       password=make_password('Password123!'))])
+        with self.assertLogs('users.models', 'WARNING') as logs:
+            call_command('migrate', verbosity=0)
+        self.assertIn('dup@example.com', logs.output[0])
+
     def test_list_users(self):
         """Test listing users."""
         User.objects.create_user(username='user1', email='u1@ex.com', password='Pass123!')
@@ -116,6 +203,51 @@ class UserTests(APITestCase):
         else:
             self.assertEqual(len(response.data), 2)
 
+    def test_list_users_cursor_paginated_without_count(self):
+        """Test the listing is cursor paginated and never counts the table."""
+        for i in range(3):
+            User.objects.create_user(username=f'user{i}', email=f'u{i}@ex.com', password='Pass123!')
+        response = self.client.get(self.url, {'page_size': 2})
+        self.assertEqual([u['username'] for u in response.data['results']], ['user0', 'user1'])
+        self.assertNotIn('count', response.data)
+        response = self.client.get(response.data['next'])
+        self.assertEqual([u['username'] for u in response.data['results']], ['user2'])
+
+    def test_list_users_ordering(self):
+        """Test ordering the listing by an indexed column."""
+        User.objects.create_user(username='alpha', email='a@ex.com', password='Pass123!')
+        User.objects.create_user(username='beta', email='b@ex.com', password='Pass123!')
+        response = self.client.get(self.url, {'ordering': '-username'})
+        self.assertEqual([u['username'] for u in response.data['results']], ['beta', 'alpha'])
+
+    def test_search_users_by_prefix(self):
+        """Test search matches a prefix of username, email or any name word."""
+        User.objects.create_user(username='maria', email='maria@ex.com', password='Pass123!',
+                                 first_name='Maria', last_name='da Silva')
+        User.objects.create_user(username='joao', email='joao@ex.com', password='Pass123!',
+                                 first_name='João', last_name='Souza')
+        for termo, esperado in [('SIL', ['maria']), ('joao@', ['joao']), ('s', ['joao', 'maria']),
+                                ('maria sou', []), ('ilva', [])]:
+            response = self.client.get(self.url, {'search': termo})
+            self.assertEqual([u['username'] for u in response.data['results']], esperado, termo)
+
+    def test_search_terms_follow_name_change(self):
+        """Test renaming a user updates the search terms."""
+        user = User.objects.create_user(username='maria', email='maria@ex.com', password='Pass123!',
+                                        last_name='Silva')
+        user.last_name = 'Costa'
+        user.save()
+        self.assertTrue(usuarios_por_prefixo('cos').filter(user_id=user.id).exists())
+        self.assertFalse(usuarios_por_prefixo('sil').exists())
+
+    def test_migrate_backfills_search_terms(self):
+        """Test users created before the search index are found after migrate."""
+        User.objects.bulk_create([User(username='legado', email='legado@ex.com', last_name='Pereira')])
+        self.assertFalse(usuarios_por_prefixo('pere').exists())
+        call_command('migrate', verbosity=0)
+        response = self.client.get(self.url, {'search': 'pere'})
+        self.assertEqual([u['username'] for u in response.data['results']], ['legado'])
+
     def test_retrieve_user(self):
         """Test retrieving a specific user."""
         user = User.objects.create_user(username='testuser', email='test@ex.com', password='Pass123!')
@@ -144,6 +276,7 @@ class UserTests(APITestCase):
 
 class PasswordResetTests(APITestCase):
     def setUp(self):
+        baldes.limpar()
         self.user = User.objects.create_user(
             username='testuser', 
             email='test@example.com', 
@@ -157,6 +290,8 @@ class PasswordResetTests(APITestCase):
         """Test requesting a password reset email."""
         response = self.client.post(self.reset_url, {'email': 'test@example.com'}, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(mail.outbox), 0)
+        call_command('send_queued_email', stdout=StringIO())
         self.assertEqual(len(mail.outbox), 1)
         self.assertIn('test@example.com', mail.outbox[0].to)
         email_body = unescape(mail.outbox[0].body)
@@ -167,6 +302,31 @@ class PasswordResetTests(APITestCase):
         self.assertEqual(query_params['uid'], [urlsafe_base64_encode(force_bytes(self.user.pk))])
         self.assertIn('token', query_params)
 
+    @override_settings(EMAIL_OUTBOX_BACKOFF_SECONDS=60)
+    def test_failed_delivery_is_retried_with_backoff(self):
+        """Test a failed delivery is rescheduled and sent on a later run."""
+        email = enfileirar_email('Assunto', 'Corpo', ['test@example.com'])
+        with mock.patch('django.core.mail.EmailMessage.send', side_effect=OSError('SMTP fora')):
+            self.assertEqual(entregar_lote(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.tentativas, 1)
+        self.assertEqual(email.status, EmailPendente.STATUS_PENDENTE)
+        self.assertGreater(email.proxima_tentativa_em, timezone.now() + timedelta(seconds=50))
+
+        EmailPendente.objects.filter(pk=email.pk).update(proxima_tentativa_em=timezone.now())
+        self.assertEqual(entregar_lote(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=1)
+    def test_delivery_gives_up_after_max_attempts(self):
+        """Test a message is marked as failed after the last attempt."""
+        email = enfileirar_email('Assunto', 'Corpo', ['test@example.com'])
+        with mock.patch('django.core.mail.EmailMessage.send', side_effect=OSError('SMTP fora')):
+            entregar_lote()
+        email.refresh_from_db()
+        self.assertEqual(email.status, EmailPendente.STATUS_FALHOU)
+        self.assertIn('SMTP fora', email.ultimo_erro)
+
     def test_password_reset_request_invalid_email(self):
         """Test requesting a reset for a non-existent email."""
         response = self.client.post(self.reset_url, {'email': 'wrong@example.com'}, format='json')
@@ -202,3 +362,277 @@ class PasswordResetTests(APITestCase):
         }
         response = self.client.post(self.confirm_url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(CACHE_COMPARTILHADO=True)
+class CachedJWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='cached', email='cached@example.com', password='Password123!'
+        )
+        self.token = AccessToken.for_user(self.user)
+        self.auth = CachedJWTAuthentication()
+
+    def test_user_resolved_from_cache(self):
+        """Test the second resolution of the same token does not hit the database."""
+        self.auth.get_user(self.token)
+        with self.assertNumQueries(0):
+            user = self.auth.get_user(self.token)
+        self.assertEqual(user.pk, self.user.pk)
+
+    def test_cache_invalidated_on_password_change(self):
+        """Test changing the password drops the cached user."""
+        self.auth.get_user(self.token)
+        self.user.set_password('Another123!')
+        self.user.save()
+        with self.assertNumQueries(1):
+            self.auth.get_user(self.token)
+
+    def test_inactive_user_rejected_after_deactivation(self):
+        """Test a deactivated user is not served from the cache."""
+        self.auth.get_user(self.token)
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.get_user(self.token)
+
+    @override_settings(CACHE_COMPARTILHADO=False)
+    def test_per_process_cache_not_used(self):
+        """Test the user is read from the database when the cache is not shared across workers."""
+        self.auth.get_user(self.token)
+        with self.assertNumQueries(1):
+            self.auth.get_user(self.token)
+        self.assertIsNone(cache.get(chave_usuario(self.user.id)))
+
+    def test_authenticated_request(self):
+        """Test an API request authenticated with a bearer token."""
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        response = self.client.get(reverse('user-detail', args=[self.user.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class RefreshTokenRevocationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        revogacoes.reiniciar()
+        self.user = User.objects.create_user(
+            username='revoked', email='revoked@example.com', password='Password123!',
+        )
+        self.refresh = str(RefreshToken.for_user(self.user))
+        self.url = reverse('token_refresh')
+
+    def test_rotated_refresh_token_cannot_be_reused(self):
+        """Test a refresh token is revoked once it has been rotated."""
+        response = self.client.post(self.url, {'refresh': self.refresh}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.data['refresh'], self.refresh)
+
+        response = self.client.post(self.url, {'refresh': self.refresh}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(CACHE_COMPARTILHADO=True)
+    def test_bloom_filter_miss_skips_database(self):
+        """Test a token absent from the Bloom filter is checked without queries."""
+        revogacoes.esta_revogado('aquecimento')
+        with self.assertNumQueries(0):
+            self.assertFalse(revogacoes.esta_revogado('jti-nunca-revogado'))
+
+    def _revogar_em_outro_processo(self, jti):
+        # Grava direto na tabela, sem passar pelo filtro nem pela geração deste processo.
+        TokenRevogado.objects.create(jti_hash=hash_jti(jti), expira_em=timezone.now() + timedelta(days=1))
+
+    @override_settings(CACHE_COMPARTILHADO=False)
+    def test_process_local_cache_always_checks_database(self):
+        """Test revocations from other workers are seen when the cache is not shared."""
+        revogacoes.esta_revogado('aquecimento')
+        self._revogar_em_outro_processo('jti-outro-worker')
+        self.assertTrue(revogacoes.esta_revogado('jti-outro-worker'))
+
+    @override_settings(CACHE_COMPARTILHADO=True, JWT_REVOCATION_SYNC_SECONDS=0)
+    def test_bloom_filter_reloads_without_generation_change(self):
+        """Test the Bloom filter picks up new revocations after the sync interval."""
+        revogacoes.esta_revogado('aquecimento')
+        self._revogar_em_outro_processo('jti-outro-worker')
+        self.assertTrue(revogacoes.esta_revogado('jti-outro-worker'))
+
+    def test_revoke_is_atomic_claim(self):
+        """Test only the first revocation of the same jti succeeds."""
+        exp = int((timezone.now() + timedelta(days=1)).timestamp())
+        self.assertTrue(revogacoes.revogar('jti-1', exp))
+        self.assertFalse(revogacoes.revogar('jti-1', exp))
+        self.assertTrue(revogacoes.esta_revogado('jti-1'))
+
+    def test_purge_removes_expired_revocations(self):
+        """Test the purge command deletes only expired revocations."""
+        agora = timezone.now()
+        TokenRevogado.objects.create(jti_hash=hash_jti('velho'), expira_em=agora - timedelta(hours=1))
+        TokenRevogado.objects.create(jti_hash=hash_jti('ativo'), expira_em=agora + timedelta(hours=1))
+        saida = StringIO()
+        call_command('purge_revoked_tokens', stdout=saida)
+        self.assertIn('1 revogações', saida.getvalue())
+        self.assertEqual(
+            list(TokenRevogado.objects.values_list('jti_hash', flat=True)), [hash_jti('ativo')],
+        )
+
+
+class BulkProvisioningTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='Admin123!')
+        self.url = reverse('user-bulk')
+        self.registros = [
+            {'username': f'leitor{i}', 'email': f'Leitor{i}@Escola.com', 'password': 'Password123!',
+             'first_name': 'Leitor', 'last_name': 'Escolar'}
+            for i in range(3)
+        ]
+
+    def test_bulk_requires_admin(self):
+        """Test bulk provisioning is restricted to staff users."""
+        response = self.client.post(self.url, self.registros, format='json')
+        self.assertIn(response.status_code, (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
+
+    def test_bulk_creates_users_and_reports_rejections(self):
+        """Test valid rows are created while duplicates and invalid rows are reported."""
+        User.objects.create_user(username='existente', email='leitor1@escola.com', password='Pass123!')
+        self.registros.append(dict(self.registros[0]))
+        self.registros.append({'username': 'fraco', 'email': 'fraco@escola.com', 'password': 'abc'})
+        self.client.force_authenticate(self.admin)
+
+        response = self.client.post(self.url, self.registros, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], LoteProvisionamento.STATUS_PENDENTE)
+        self.assertFalse(User.objects.filter(username='leitor0').exists())
+
+        call_command('process_user_batches', stdout=StringIO(), stderr=StringIO())
+
+        response = self.client.get(self.url, {'lote': response.data['id']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], LoteProvisionamento.STATUS_CONCLUIDO)
+        self.assertEqual(response.data['criados'], 2)
+        self.assertEqual([erro['indice'] for erro in response.data['erros']], [1, 3, 4])
+        self.assertIsNone(LoteProvisionamento.objects.get().registros)
+        user = usuarios_por_email('LEITOR0@escola.com').get()
+        self.assertTrue(user.check_password('Password123!'))
+        self.assertTrue(usuarios_por_prefixo('escol').filter(user_id=user.id).exists())
+        self.assertEqual(EstatisticasBiblioteca.objects.get(id=1).total_usuarios, User.objects.count())
+
+    def test_queued_batch_stores_only_hashed_passwords(self):
+        """Test a queued batch never stores plaintext passwords."""
+        self.registros.append({'username': 'fraco', 'email': 'fraco@escola.com', 'password': 'abc'})
+        lote = enfileirar_lote(self.registros)
+        lote.refresh_from_db()
+        self.assertNotIn('Password123!', json.dumps(lote.registros))
+        self.assertTrue(all(identify_hasher(registro['password']) for registro in lote.registros))
+        self.assertEqual([erro['indice'] for erro in lote.erros], [3])
+
+    def test_expired_lease_returns_batch_to_queue(self):
+        """Test a batch reserved by a worker that died is processed again after the lease."""
+        lote = enfileirar_lote(self.registros[:1])
+        self.assertEqual(reservar_lote().pk, lote.pk)
+        self.assertIsNone(reservar_lote())
+        LoteProvisionamento.objects.filter(pk=lote.pk).update(reservado_ate=timezone.now())
+        self.assertEqual(reservar_lote().pk, lote.pk)
+
+    @override_settings(USER_BULK_PARALLEL_THRESHOLD=2, USER_BULK_HASH_PROCESSES=2)
+    def test_provision_command_hashes_in_process_pool(self):
+        """Test the command provisions a CSV, hashing passwords across processes."""
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as arquivo:
+            arquivo.write('username,email,password,first_name,last_name\n')
+            for registro in self.registros:
+                arquivo.write(f"{registro['username']},{registro['email']},{registro['password']},Leitor,Escolar\n")
+        self.addCleanup(os.remove, arquivo.name)
+
+        saida = StringIO()
+        call_command('provision_users', arquivo.name, stdout=saida, stderr=StringIO())
+
+        self.assertIn('3 usuários criados', saida.getvalue())
+        self.assertTrue(User.objects.get(username='leitor2').check_password('Password123!'))
+
+
+class ThrottlingTests(APITestCase):
+    def setUp(self):
+        baldes.limpar()
+        self.user = User.objects.create_user(username='alvo', email='alvo@example.com', password='Password123!')
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {
+        **settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], 'login_email': '2/min',
+    }})
+    def test_login_throttled_per_email_before_database(self):
+        """Test login attempts for one email are rejected without touching the database."""
+        url = reverse('token_obtain_pair')
+        for _ in range(2):
+            response = self.client.post(url, {'email': 'ALVO@example.com', 'password': 'errada'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        with self.assertNumQueries(0):
+            response = self.client.post(url, {'email': 'alvo@example.com', 'password': 'Password123!'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+
+        response = self.client.post(url, {'email': 'outro@example.com', 'password': 'errada'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {
+        **settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], 'password_reset_ip': '1/hour',
+    }})
+    def test_password_reset_throttled_per_ip(self):
+        """Test reset requests from one IP are limited across emails."""
+        url = reverse('password_reset')
+        response = self.client.post(url, {'email': 'alvo@example.com'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post(url, {'email': 'outro@example.com'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(EmailPendente.objects.count(), 1)
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {
+        **settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], 'password_reset_ip': '1/hour',
+    }})
+    def test_forged_forwarded_for_does_not_bypass_ip_limit(self):
+        """Test a client cannot get a fresh IP bucket by sending its own X-Forwarded-For."""
+        url = reverse('password_reset')
+        response = self.client.post(url, {'email': 'alvo@example.com'}, format='json',
+                                    HTTP_X_FORWARDED_FOR='10.0.0.1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post(url, {'email': 'outro@example.com'}, format='json',
+                                    HTTP_X_FORWARDED_FOR='10.0.0.2')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_rotating_keys_does_not_evict_draining_bucket(self):
+        """Test flooding new keys past the limit keeps the bucket of a throttled key."""
+        armazem = ArmazemBaldes(max_chaves=2)
+        self.assertEqual(armazem.consumir('login_email:alvo', 1, 60), 0)
+        for i in range(10):
+            armazem.consumir(f'login_email:outro{i}', 1, 60)
+        self.assertGreater(armazem.consumir('login_email:alvo', 1, 60), 0)
+
+    @override_settings(CACHE_COMPARTILHADO=True)
+    def test_shared_cache_store_is_used_across_processes(self):
+        """Test throttling counts in the Django cache when it is shared."""
+        cache.clear()
+        url = reverse('password_reset')
+        with mock.patch('theka.throttling.time.time', return_value=1_000_000.0):
+            for _ in range(3):
+                response = self.client.post(url, {'email': 'alvo@example.com'}, format='json')
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+            # Outro processo veria a mesma contagem: ela está no cache, não no processo.
+            baldes.limpar()
+            response = self.client.post(url, {'email': 'alvo@example.com'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+    def test_shared_cache_window_evicted_before_decrement(self):
+        """Test a rejected request still answers when its window key vanished from the cache."""
+        cache.clear()
+        armazem = ArmazemBaldesCache()
+        with mock.patch('theka.throttling.time.time', return_value=1_000_000.0):
+            self.assertEqual(armazem.consumir('teste', 1, 60), 0)
+            with mock.patch('theka.throttling.cache.decr', side_effect=ValueError):
+                self.assertGreater(armazem.consumir('teste', 1, 60), 0)
+
+    def test_bucket_refills_over_time(self):
+        """Test a drained bucket allows a request again after refilling."""
+        with mock.patch('theka.throttling.time.monotonic', side_effect=[0, 0, 0, 30]):
+            self.assertEqual(baldes.consumir('teste', 2, 60), 0)
+            self.assertEqual(baldes.consumir('teste', 2, 60), 0)
+            self.assertEqual(baldes.consumir('teste', 2, 60), 30)
+            self.assertEqual(baldes.consumir('teste', 2, 60), 0)
@@ -0,0 +1,17 @@
+from theka.throttling import EmailTokenBucketThrottle, IPTokenBucketThrottle
+
+
+class LoginIPThrottle(IPTokenBucketThrottle):
+    scope = 'login_ip'
+
+
+class LoginEmailThrottle(EmailTokenBucketThrottle):
+    scope = 'login_email'
+
+
+class PasswordResetIPThrottle(IPTokenBucketThrottle):
+    scope = 'password_reset_ip'
+
+
+class PasswordResetEmailThrottle(EmailTokenBucketThrottle):
+    scope = 'password_reset_email'
@@ -4,29 +4,52 @@ from rest_framework.decorators import action
 from django.contrib.auth.models import User
 from .serializers import (
     EmailTokenObtainPairSerializer,
+    LoteProvisionamentoSerializer,
+    RevocableTokenRefreshSerializer,
+    UserBulkItemSerializer,
     UserSerializer,
     PasswordResetSerializer,
     PasswordResetConfirmSerializer,
 )
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.permissions import AllowAny
-from drf_spectacular.utils import extend_schema, OpenApiExample
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework.permissions import AllowAny, IsAdminUser
+from django.conf import settings
+from drf_spectacular.utils import extend_schema, OpenApiExample, OpenApiParameter
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from theka.writer import EscritaSerializadaMixin
+from .filters import PrefixoSearchFilter
+from .pagination import UserCursorPagination
+from .models import LoteProvisionamento
+from .provisioning import enfileirar_lote
+from .throttling import (
+    LoginEmailThrottle,
+    LoginIPThrottle,
+    PasswordResetEmailThrottle,
+    PasswordResetIPThrottle,
+)
 
 # Create your views here.
 
 
 class EmailTokenObtainPairView(TokenObtainPairView):
     serializer_class = EmailTokenObtainPairSerializer
+    throttle_classes = [LoginIPThrottle, LoginEmailThrottle]
+
 
+class RevocableTokenRefreshView(TokenRefreshView):
+    serializer_class = RevocableTokenRefreshSerializer
 
-class UserViewSet(viewsets.ModelViewSet):
+
+class UserViewSet(EscritaSerializadaMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
-    filter_backends = (filters.SearchFilter,)
+    pagination_class = UserCursorPagination
+    filter_backends = (PrefixoSearchFilter, filters.OrderingFilter)
     search_fields = ['username', 'email', 'first_name', 'last_name']
-    ordering_fields = ['username', 'email', 'first_name', 'last_name']
+    # Apenas colunas indexadas: ordenar por outra coluna exigiria ordenar
+    # a tabela inteira a cada página.
+    ordering_fields = ['username', 'id']
     ordering = ['username']
     http_method_names = ['get', 'post', 'put', 'patch', 'delete']
 
@@ -63,9 +86,49 @@ class UserViewSet(viewsets.ModelViewSet):
         instance = self.get_object()
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
+
+    @extend_schema(
+        request=UserBulkItemSerializer(many=True),
+        responses={
+            202: LoteProvisionamentoSerializer,
+            400: {'description': 'Corpo não é uma lista ou excede USER_BULK_MAX_ITEMS'}
+        },
+    )
+    @action(detail=False, methods=['post'], url_path='bulk', url_name='bulk',
+            permission_classes=[IsAdminUser])
+    def bulk(self, request):
+        """
+            Enfileira vários usuários para cadastro (lista no corpo). Os
+            registros são validados e as senhas hasheadas aqui; o lote é
+            processado pelo comando process_user_batches; a situação e os
+            registros recusados, com seu índice, saem em GET /users/bulk/?lote=<id>.
+        """
+        if not isinstance(request.data, list):
+            return Response({'detail': 'Envie uma lista de usuários.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > settings.USER_BULK_MAX_ITEMS:
+            return Response(
+                {'detail': f'O lote aceita no máximo {settings.USER_BULK_MAX_ITEMS} usuários.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        lote = enfileirar_lote(request.data, solicitante=request.user)
+        return Response(LoteProvisionamentoSerializer(lote).data, status=status.HTTP_202_ACCEPTED)
+
+    @extend_schema(
+        parameters=[OpenApiParameter('lote', int, required=True, description='Id devolvido pelo POST.')],
+        responses={200: LoteProvisionamentoSerializer, 404: {'description': 'Lote não encontrado'}},
+    )
+    @bulk.mapping.get
+    def bulk_status(self, request):
+        """Situação de um lote enviado a POST /users/bulk/."""
+        lote_id = request.query_params.get('lote', '')
+        lote = LoteProvisionamento.objects.filter(pk=lote_id).first() if lote_id.isdigit() else None
+        if lote is None:
+            return Response({'detail': 'Lote não encontrado.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(LoteProvisionamentoSerializer(lote).data)
     
 class PasswordResetView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [PasswordResetIPThrottle, PasswordResetEmailThrottle]
 
     @extend_schema(
         request=PasswordResetSerializer,